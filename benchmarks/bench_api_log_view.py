@@ -0,0 +1,72 @@
+"""Benchmark: unbounded vs ring-buffer API log view.
+
+Replays synthetic api.exe lines into a ScrolledText the same way log_to_api_tab does and
+reports per-insert latency and process RSS growth for 10k / 100k / 1M line days.
+
+    python benchmarks/bench_api_log_view.py
+    python benchmarks/bench_api_log_view.py --sizes 10000,100000 --max-lines 5000
+"""
+import argparse
+import os
+import sys
+import time
+import tkinter as tk
+from tkinter import scrolledtext
+
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import ApiLogView
+
+
+def make_line(i):
+    return f"{time.strftime('%H:%M:%S')} | 200 |   1.{i % 1000:03d}ms |  127.0.0.1 | GET     | /api/v1/items/{i % 5000} | -\n"
+
+
+def run(root, size, max_lines):
+    text = scrolledtext.ScrolledText(root, wrap=tk.WORD, state='disabled', font=('Consolas', 8))
+    text.pack(fill='both', expand=True)
+    view = ApiLogView(text, max_lines)
+    root.update()
+    proc = psutil.Process()
+    rss_before = proc.memory_info().rss
+    samples = []
+    for i in range(size):
+        line = make_line(i)
+        t0 = time.perf_counter()
+        view.append(line)
+        samples.append(time.perf_counter() - t0)
+        if i % 1000 == 0: root.update()
+    root.update()
+    rss_after = proc.memory_info().rss
+    samples.sort()
+    result = {
+        'mean_us': sum(samples) / len(samples) * 1e6,
+        'p50_us': samples[len(samples) // 2] * 1e6,
+        'p99_us': samples[int(len(samples) * 0.99)] * 1e6,
+        'max_ms': samples[-1] * 1e3,
+        'rss_mb': (rss_after - rss_before) / 1048576,
+        'widget_lines': view.line_count(),
+    }
+    text.destroy()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--max-lines', type=int, default=5000, help='ring-buffer size (ApiLogView max_lines)')
+    args = parser.parse_args()
+
+    root = tk.Tk()
+    root.geometry('430x300')
+    print(f"{'lines':>9} {'mode':>10} {'mean us':>9} {'p50 us':>8} {'p99 us':>8} {'max ms':>8} {'RSS MB':>8} {'widget':>9}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        for mode, max_lines in (('unbounded', 0), ('ring', args.max_lines)):
+            r = run(root, size, max_lines)
+            print(f"{size:>9} {mode:>10} {r['mean_us']:>9.1f} {r['p50_us']:>8.1f} {r['p99_us']:>8.1f} {r['max_ms']:>8.2f} {r['rss_mb']:>8.1f} {r['widget_lines']:>9}")
+    root.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark: per-line text reader vs batched binary reader for api.exe stdout.
+
+Replays a recorded api.exe stream (any saved api_log_*.txt, or a synthetic one) through a
+child process pipe and drains it with both readers into an ApiLogQueue, the way
+read_api_output does. Reports lines/s and the reader process CPU time per million lines.
+
+    python benchmarks/bench_api_reader.py
+    python benchmarks/bench_api_reader.py --recording log/api_log_2026-10-16.txt --repeat 5
+    python benchmarks/bench_api_reader.py --lines 2000000 --chunk-size 262144
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import ApiLogQueue, read_line_batches
+
+# Child process that writes the recording to stdout in pipe-sized pieces, like a chatty api.exe.
+REPLAY = "import sys,shutil; shutil.copyfileobj(open(sys.argv[1],'rb'), sys.stdout.buffer, 4096)"
+
+
+def write_recording(path, lines):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for i in range(lines):
+            s = i * 86400 // lines
+            if i % 3 == 0:
+                f.write(f"[{i % 7}.{i % 1000:03d}ms] [rows:1] SELECT * FROM \"items\" WHERE \"barcode\" = '885{i:07d}'\r\n")
+            else:
+                f.write(f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d} | 200 |   1.{i % 1000:03d}ms |  127.0.0.1 | GET     | /api/v1/items/{i % 5000} | -\r\n")
+
+
+def legacy_reader(path, q):
+    proc = subprocess.Popen([sys.executable, '-c', REPLAY, path], stdout=subprocess.PIPE, text=True, encoding='utf-8', errors='replace')
+    n = 0
+    for line in iter(proc.stdout.readline, ''):
+        q.put(line); n += 1
+    proc.wait()
+    return n
+
+
+def batched_reader(path, chunk_size, q):
+    proc = subprocess.Popen([sys.executable, '-c', REPLAY, path], stdout=subprocess.PIPE, bufsize=0)
+    n = 0
+    for lines in read_line_batches(proc.stdout, chunk_size):
+        q.put_many(lines); n += len(lines)
+    proc.wait()
+    return n
+
+
+def measure(fn, *args):
+    q = ApiLogQueue(maxlen=10 ** 9)
+    wall, cpu = time.perf_counter(), time.process_time()
+    n = fn(*args, q)
+    return n, time.perf_counter() - wall, time.process_time() - cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recording', help='saved api.exe output to replay (default: synthetic)')
+    parser.add_argument('--lines', type=int, default=500000, help='synthetic recording size')
+    parser.add_argument('--chunk-size', type=int, default=65536)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        path = args.recording
+        if not path:
+            path = os.path.join(d, 'api_stream.txt')
+            write_recording(path, args.lines)
+        print(f"recording: {path} ({os.path.getsize(path) / 1048576:.1f} MB)")
+        print(f"{'reader':<10} {'lines':>9} {'lines/s':>12} {'wall ms':>9} {'CPU ms':>9} {'CPU ms/1M':>10}")
+        for name, fn, extra in (('legacy', legacy_reader, ()), ('batched', batched_reader, (args.chunk_size,))):
+            best = None
+            for _ in range(args.repeat):
+                r = measure(fn, path, *extra)
+                if best is None or r[1] < best[1]: best = r
+            n, wall, cpu = best
+            print(f"{name:<10} {n:>9} {n / wall:>12,.0f} {wall * 1000:>9.1f} {cpu * 1000:>9.1f} {cpu * 1e9 / max(n, 1):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Benchmark: thread-per-APK installs vs ApkInstallScheduler for a large drop.
+
+Writes a folder of synthetic APKs (zip archives with a random payload) and installs them
+all on a FakeAdbServer device whose package manager takes --install-ms per package plus
+--commit-ms per install transaction: the old way (one thread per file that parses,
+checks and runs adb install immediately), then through ApkInstallScheduler one adb
+install at a time, then with batched pm install sessions (--batch per session). Parsing uses pyaxmlparser when it is installed and otherwise reads
+every zip entry, which is what APK() costs. Reports total time, when the priority package
+landed, peak threads and CPU.
+
+    python benchmarks/bench_apk_install.py
+    python benchmarks/bench_apk_install.py --apks 40 --size-mb 8 --parse-workers 2 --install-ms 300
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import AdbClient, ApkInstallScheduler, DevicePackageCache
+from fake_adb_server import FakeAdbServer
+
+SERIAL = 'HHT0001'
+
+
+def write_apks(folder, count, size_mb):
+    paths, payload = [], os.urandom(size_mb << 20)
+    for i in range(count):
+        path = os.path.join(folder, f"com.store.app{i:02d}.apk" if i else "com.store.pos.apk")
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as z:
+            z.writestr('AndroidManifest.xml', b'\0' * 4096)
+            z.writestr('classes.dex', payload[i:] + payload[:i])
+        paths.append(path)
+    return paths[1:] + paths[:1]  # the priority app arrives last
+
+
+def parse(path):
+    try:
+        from pyaxmlparser import APK
+        apk = APK(path); return apk.package, int(apk.version_code), None
+    except ImportError:
+        with zipfile.ZipFile(path) as z:
+            for name in z.namelist(): z.read(name)
+        return os.path.basename(path)[:-4], 1, None
+
+
+def install(adb, cache, serial, path, package, version):
+    if cache.version(serial, package) >= version: return "Skipped"
+    out = adb.install(serial, path)
+    if "Success" in out: cache.installed(serial, package, version); return "Success"
+    return "Error: Install Failed"
+
+
+def install_batch(adb, cache, serial, jobs):
+    todo = [job for job in jobs if cache.version(serial, job['package']) < job['version']]
+    results = dict(zip(map(id, todo), adb.install_session(serial, [[job['path']] for job in todo])[0])) if todo else {}
+    return ["Skipped" if id(job) not in results else "Success" if results[id(job)][0] else "Error: Install Failed" for job in jobs]
+
+
+class Run:
+    def __init__(self, srv):
+        srv.packages[SERIAL].clear()
+        self.adb = AdbClient(port=srv.port, timeout=60)
+        self.cache = DevicePackageCache(self.adb)
+        self.done, self.landed, self.peak = {}, {}, threading.active_count()
+        self.lock = threading.Lock()
+
+    def record(self, path, msg):
+        with self.lock:
+            self.done[path] = msg; self.landed[os.path.basename(path)] = time.perf_counter()
+            self.peak = max(self.peak, threading.active_count())
+
+
+def thread_per_apk(srv, paths, args):
+    run = Run(srv)
+
+    def worker(path):
+        try: package, version, _ = parse(path); msg = install(run.adb, run.cache, SERIAL, path, package, version)
+        except Exception as e: msg = f"Error: {e}"
+        run.record(path, msg)
+
+    threads = [threading.Thread(target=worker, args=(p,), daemon=True) for p in paths]
+    for t in threads: t.start()
+    run.peak = max(run.peak, threading.active_count())
+    for t in threads: t.join()
+    return run
+
+
+def scheduled(srv, paths, args, sessions):
+    run, finished = Run(srv), threading.Semaphore(0)
+
+    def on_status(job, msg):
+        if msg.startswith(('Success', 'Skipped', 'Error')): run.record(job['path'], msg); finished.release()
+
+    if sessions: fn = lambda serial, jobs: install_batch(run.adb, run.cache, serial, jobs)
+    else: fn = lambda serial, jobs: [install(run.adb, run.cache, serial, job['path'], job['package'], job['version']) for job in jobs]
+    sched = ApkInstallScheduler(parse, fn, on_status, on_done=lambda job: None, parse_workers=args.parse_workers,
+                                priorities=args.priority.split(','), max_batch=args.batch if sessions else 1)
+    sched.add_device(SERIAL)
+    for p in paths: sched.submit(p, None)
+    for _ in paths: finished.acquire()
+    sched.stop()
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--apks', type=int, default=40)
+    parser.add_argument('--size-mb', type=int, default=4)
+    parser.add_argument('--parse-workers', type=int, default=2)
+    parser.add_argument('--install-ms', type=int, default=200, help='per-package pm install time on the device')
+    parser.add_argument('--commit-ms', type=int, default=150, help='fixed cost of each install transaction on the device')
+    parser.add_argument('--priority', default='com.store.pos*', help='PRIORITY patterns for the scheduler')
+    parser.add_argument('--batch', type=int, default=20, help='BATCH_SIZE for the session run')
+    args = parser.parse_args()
+
+    srv = FakeAdbServer(install_latency=args.install_ms / 1000, commit_latency=args.commit_ms / 1000).start()
+    srv.set_device(SERIAL)
+    srv.apk_info = lambda name, data: (os.path.basename(name)[:-4], 1)
+    with tempfile.TemporaryDirectory() as d:
+        paths = write_apks(d, args.apks, args.size_mb)
+        print(f"{args.apks} APKs x {args.size_mb} MB, pm install {args.install_ms} ms + {args.commit_ms} ms/commit, parse workers {args.parse_workers}")
+        print(f"{'mode':<15} {'total s':>8} {'priority s':>11} {'peak threads':>13} {'CPU s':>7} {'ok':>4}")
+        for name, fn, extra in (('thread-per-apk', thread_per_apk, ()), ('scheduler', scheduled, (False,)), ('sessions', scheduled, (True,))):
+            t0, cpu = time.perf_counter(), time.process_time()
+            run = fn(srv, paths, args, *extra)
+            total, cpu = time.perf_counter() - t0, time.process_time() - cpu
+            prio = run.landed.get('com.store.pos.apk', t0) - t0
+            ok = sum(1 for m in run.done.values() if m == 'Success')
+            print(f"{name:<15} {total:>8.2f} {prio:>11.2f} {run.peak:>13} {cpu:>7.2f} {ok:>4}")
+    srv.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Benchmark: manifest-only APK reader vs pyaxmlparser.APK on large APKs.
+
+Times read_apk_manifest (central directory + AndroidManifest.xml only) against
+pyaxmlparser.APK(path).package / .version_code, which reads the whole file, and reports
+the one-off pyaxmlparser import cost. Without real APKs it writes synthetic ones: a binary
+XML manifest (UTF-8 or UTF-16 string pool, optionally with stripped attribute names)
+plus a stored payload of --size-mb. When pyaxmlparser is not installed the "full read"
+row (read the file, open it as a zip) stands in as a lower bound for APK().
+
+    python benchmarks/bench_apk_manifest.py
+    python benchmarks/bench_apk_manifest.py --size-mb 150 --repeat 5
+    python benchmarks/bench_apk_manifest.py --apk D:/drop/pos-release.apk --apk D:/drop/scanner.apk
+"""
+import argparse
+import io
+import os
+import struct
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import read_apk_manifest
+
+ANDROID_NS = 'http://schemas.android.com/apk/res/android'
+RES_IDS = {'versionCode': 0x0101021b, 'versionName': 0x0101021c, 'compileSdkVersion': 0x01010572}
+
+
+def _string_pool(strings, utf8):
+    offsets, blob = [], bytearray()
+    for s in strings:
+        offsets.append(len(blob))
+        if utf8:
+            b = s.encode('utf-8')
+            for n in (len(s), len(b)): blob += bytes([n]) if n < 0x80 else bytes([0x80 | n >> 8, n & 0xff])
+            blob += b + b'\0'
+        else: blob += struct.pack('<H', len(s)) + s.encode('utf-16-le') + b'\0\0'
+    blob += b'\0' * (-len(blob) % 4)
+    header = 28 + 4 * len(strings)
+    return struct.pack('<HHIIIIII', 0x0001, 28, header + len(blob), len(strings), 0, 0x100 if utf8 else 0, header, 0) \
+        + struct.pack(f'<{len(strings)}I', *offsets) + bytes(blob)
+
+
+def write_manifest(package, code, name, utf8=True, stripped=False):
+    """Binary XML for <manifest package=.. android:versionCode=.. android:versionName=..><application/></manifest>."""
+    attrs = ['versionCode', 'versionName', 'compileSdkVersion']  # resource-mapped names come first, as aapt emits them
+    strings = ['' if stripped else a for a in attrs] + ['android', ANDROID_NS, 'package', package, name, 'manifest', 'application']
+    idx = {s: i for i, s in reversed(list(enumerate(strings)))}
+    resmap = struct.pack('<HHI', 0x0180, 8, 8 + 4 * len(attrs)) + struct.pack(f'<{len(attrs)}I', *(RES_IDS[a] for a in attrs))
+    ns = struct.pack('<HHIIIII', 0x0100, 16, 24, 1, 0xffffffff, idx['android'], idx[ANDROID_NS])
+
+    def attr(ns_i, name_i, raw, vtype, value): return struct.pack('<IIIHBBI', ns_i, name_i, raw, 8, 0, vtype, value)
+
+    body = (attr(idx[ANDROID_NS], 0, 0xffffffff, 0x10, code) + attr(idx[ANDROID_NS], 1, idx[name], 0x03, idx[name])
+            + attr(idx[ANDROID_NS], 2, 0xffffffff, 0x10, 34) + attr(0xffffffff, idx['package'], idx[package], 0x03, idx[package]))
+
+    def start(tag, attrs_blob, count):
+        return struct.pack('<HHIIIIIHHHHHH', 0x0102, 16, 36 + len(attrs_blob), 2, 0xffffffff, 0xffffffff, idx[tag], 20, 20, count, 0, 0, 0) + attrs_blob
+
+    def end(tag): return struct.pack('<HHIIIII', 0x0103, 16, 24, 3, 0xffffffff, 0xffffffff, idx[tag])
+
+    chunks = _string_pool(strings, utf8) + resmap + ns + start('manifest', body, 4) + start('application', b'', 0) + end('application') + end('manifest')
+    return struct.pack('<HHI', 0x0003, 8, 8 + len(chunks)) + chunks
+
+
+def write_apk(path, size_mb, manifest):
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('AndroidManifest.xml', manifest, zipfile.ZIP_DEFLATED)
+        z.writestr('classes.dex', os.urandom(1 << 20), zipfile.ZIP_DEFLATED)
+        for i in range(max(size_mb - 1, 0)):
+            z.writestr(f'assets/blob{i:03d}.bin', os.urandom(1 << 20), zipfile.ZIP_STORED)
+        z.writestr('resources.arsc', b'\0' * 4096, zipfile.ZIP_STORED)
+
+
+def full_read(path):
+    with open(path, 'rb') as f: data = f.read()
+    with zipfile.ZipFile(io.BytesIO(data)) as z: z.read('AndroidManifest.xml')
+    return None
+
+
+def best_of(fn, path, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter(); result = fn(path); took = time.perf_counter() - t0
+        best = took if best is None else min(best, took)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--apk', action='append', help='real APK to read (repeatable); default: synthetic ones')
+    parser.add_argument('--size-mb', type=int, default=120)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    try: from pyaxmlparser import APK
+    except ImportError: APK = None
+    import_ms = (time.perf_counter() - t0) * 1000
+    print(f"pyaxmlparser import: {f'{import_ms:.0f} ms' if APK else 'not installed'}")
+
+    with tempfile.TemporaryDirectory() as d:
+        apks = args.apk or []
+        if not apks:
+            for label, utf8, stripped in (('utf8', True, False), ('utf16', False, False), ('stripped', True, True)):
+                path = os.path.join(d, f"com.store.pos.{label}.apk")
+                write_apk(path, args.size_mb, write_manifest('com.store.pos', 4021, '4.2.1', utf8, stripped))
+                apks.append(path)
+        modes = [('manifest', read_apk_manifest)]
+        if APK: modes.append(('pyaxmlparser', lambda p: (lambda a: (a.package, int(a.version_code), a.version_name))(APK(p))))
+        else: modes.append(('full read', full_read))
+        print(f"{'apk':<28} {'MB':>6} {'mode':<13} {'ms':>9}  result")
+        for path in apks:
+            mb = os.path.getsize(path) / 1048576
+            for name, fn in modes:
+                took, result = best_of(fn, path, args.repeat)
+                print(f"{os.path.basename(path)[:28]:<28} {mb:>6.0f} {name:<13} {took * 1000:>9.2f}  {result or ''}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark: total rollout time of an APK drop per install strategy.
+
+Installs --apks synthetic APKs onto a FakeAdbServer device with a capped USB link
+(--link-mb-s), a package manager that takes --install-ms per package (verify + dexopt) and
+--commit-ms per transaction, using:
+
+    serial        adb install per APK: push to /data/local/tmp, pm install, rm
+    sessions      one pm install session per package, streamed (no multi-package)
+    multi         AdbClient.install_session: one --multi-package transaction
+    pipelined     AdbClient.install_pipelined: next package pushed while this one commits
+
+Then fails --fail packages once under the pipelined strategy and retries them, to show
+that staged files are reused (bytes pushed on the retry).
+
+    python benchmarks/bench_apk_rollout.py
+    python benchmarks/bench_apk_rollout.py --apks 10 --size-mb 40 --link-mb-s 25 --install-ms 1500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import AdbClient
+from fake_adb_server import FakeAdbServer
+
+SERIAL = 'HHT0001'
+
+
+def serial_install(adb, paths):
+    return [("Success" in adb.install(SERIAL, p), '') for p in paths], []
+
+
+STRATEGIES = (
+    ('serial', serial_install),
+    ('sessions', lambda adb, paths: adb.install_session(SERIAL, [[p] for p in paths], multi_package=False)),
+    ('multi', lambda adb, paths: adb.install_session(SERIAL, [[p] for p in paths])),
+    ('pipelined', lambda adb, paths: adb.install_pipelined(SERIAL, [[p] for p in paths])),
+)
+
+
+def run(srv, adb, fn, paths):
+    srv.packages[SERIAL].clear()
+    b0, t0 = srv.bytes_received, time.perf_counter()
+    results, sessions = fn(adb, paths)
+    return time.perf_counter() - t0, sum(ok for ok, _ in results), srv.bytes_received - b0, len(sessions) or len(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--apks', type=int, default=10)
+    parser.add_argument('--size-mb', type=int, default=20)
+    parser.add_argument('--link-mb-s', type=float, default=30.0, help='USB throughput to the device')
+    parser.add_argument('--install-ms', type=int, default=800, help='per-package verify + dexopt time on the device')
+    parser.add_argument('--commit-ms', type=int, default=150, help='fixed cost of each install transaction')
+    parser.add_argument('--fail', type=int, default=3, help='packages whose first pipelined commit fails')
+    args = parser.parse_args()
+
+    srv = FakeAdbServer(install_latency=args.install_ms / 1000, commit_latency=args.commit_ms / 1000, link_mb_s=args.link_mb_s).start()
+    srv.set_device(SERIAL)
+    srv.apk_info = lambda name, data: (os.path.basename(name)[:-4], 1)
+    adb = AdbClient(port=srv.port, timeout=120)
+    with tempfile.TemporaryDirectory() as d:
+        paths = []
+        for i in range(args.apks):
+            paths.append(os.path.join(d, f"com.store.app{i:02d}.apk"))
+            with open(paths[-1], 'wb') as f: f.write(os.urandom(args.size_mb << 20))
+        print(f"{args.apks} APKs x {args.size_mb} MB, link {args.link_mb_s:g} MB/s, pm {args.install_ms} ms/package + {args.commit_ms} ms/commit")
+        print(f"{'strategy':<10} {'total s':>8} {'ok':>4} {'MB pushed':>10} {'transactions':>13}")
+        for name, fn in STRATEGIES:
+            total, ok, pushed, tx = run(srv, adb, fn, paths)
+            print(f"{name:<10} {total:>8.2f} {ok:>4} {pushed / 1048576:>10.0f} {tx:>13}")
+
+        srv.packages[SERIAL].clear()
+        failing = [os.path.basename(p)[:-4] for p in paths[:args.fail]]
+        srv.fail_once.update(failing)
+        results, _ = adb.install_pipelined(SERIAL, [[p] for p in paths])
+        retry = [p for p, (ok, _) in zip(paths, results) if not ok]
+        total, ok, pushed, tx = run(srv, adb, STRATEGIES[3][1], retry)
+        print(f"retry of {len(retry)} failed package(s): {total:.2f} s, {ok} ok, {pushed / 1048576:.0f} MB pushed (staged copies reused)")
+    srv.stop()
+
+
+if __name__ == '__main__':
+    main()
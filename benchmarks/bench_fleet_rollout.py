@@ -0,0 +1,84 @@
+"""Benchmark: fleet rollout throughput (devices/minute) per USB concurrency policy.
+
+Rolls --apks synthetic APKs out to --devices FakeAdbServer devices spread over --hubs USB
+hubs. Each hub shares --hub-mb-s between its active transfers and loses --contention of
+its throughput per extra concurrent transfer; each device's package manager takes
+--install-ms per package. Every policy is a FleetRollout (stage, then commit from the
+staging directory) and differs only in how many pushes a hub may carry at once:
+
+    one-by-one    a single device at a time, the way handhelds are flashed by hand
+    unbounded     every device pushes at once (hub budget = devices x device rate)
+    budget        --budget-mb-s per hub / --device-mb-s per push, as [ROLLOUT] configures it
+
+The budget run fails --fail packages once, to show them retried without a second push.
+
+    python benchmarks/bench_fleet_rollout.py
+    python benchmarks/bench_fleet_rollout.py --devices 16 --hubs 2 --apks 4 --size-mb 30 --contention 0.2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import AdbClient, DevicePackageCache, FleetRollout
+from fake_adb_server import FakeAdbServer
+
+
+def reset(srv):
+    for serial in srv.devices: srv.packages[serial].clear(); srv.files[serial].clear()
+
+
+def rollout(adb, packages, devices, hubs, budget, device_mb_s, retry_delay):
+    r = FleetRollout(adb, DevicePackageCache(adb), packages, devices, hubs, budget, device_mb_s, retry_delay=retry_delay).start()
+    r.wait()
+    return r
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=8)
+    parser.add_argument('--hubs', type=int, default=2)
+    parser.add_argument('--apks', type=int, default=3)
+    parser.add_argument('--size-mb', type=int, default=15)
+    parser.add_argument('--hub-mb-s', type=float, default=35.0, help='throughput a hub shares between its transfers')
+    parser.add_argument('--link-mb-s', type=float, default=20.0, help='throughput of one device link')
+    parser.add_argument('--contention', type=float, default=0.15, help='share of hub throughput lost per extra concurrent transfer')
+    parser.add_argument('--install-ms', type=int, default=800, help='per-package verify + dexopt time on the device')
+    parser.add_argument('--budget-mb-s', type=int, default=40, help='[ROLLOUT] HUB_BUDGET_MB_S')
+    parser.add_argument('--device-mb-s', type=int, default=20, help='[ROLLOUT] DEVICE_MB_S')
+    parser.add_argument('--fail', type=int, default=2, help='packages whose first commit fails in the budget run')
+    args = parser.parse_args()
+
+    srv = FakeAdbServer(install_latency=args.install_ms / 1000, link_mb_s=args.link_mb_s, hub_mb_s=args.hub_mb_s, hub_contention=args.contention).start()
+    devices = [f"HHT{i:04d}" for i in range(1, args.devices + 1)]
+    for i, serial in enumerate(devices): srv.set_device(serial, usb=f"1-{i % args.hubs + 1}.{i // args.hubs + 1}")
+    srv.apk_info = lambda name, data: (os.path.basename(name)[:-4], 1)
+    adb = AdbClient(port=srv.port, timeout=120)
+    hubs = {serial: FleetRollout.hub_of(info) for serial, _, info in adb.devices_long()}
+    with tempfile.TemporaryDirectory() as d:
+        packages = []
+        for i in range(args.apks):
+            path = os.path.join(d, f"com.store.app{i:02d}.apk")
+            with open(path, 'wb') as f: f.write(os.urandom(args.size_mb << 20))
+            packages.append((f"com.store.app{i:02d}", 1, [path]))
+        print(f"{args.devices} devices on {len(set(hubs.values()))} hubs, {args.apks} APKs x {args.size_mb} MB, hub {args.hub_mb_s:g} MB/s "
+              f"(-{args.contention:.0%} per extra transfer), link {args.link_mb_s:g} MB/s, pm {args.install_ms} ms/package")
+        print(f"{'policy':<11} {'per hub':>7} {'total s':>8} {'dev/min':>8} {'ok':>4} {'failed':>6} {'retries':>7} {'MB pushed':>10}")
+        policies = (('one-by-one', None, args.device_mb_s), ('unbounded', args.device_mb_s * args.devices, args.device_mb_s), ('budget', args.budget_mb_s, args.device_mb_s))
+        for name, budget, device_mb_s in policies:
+            reset(srv)
+            if name == 'budget': srv.fail_once.update(p[0] for p in packages[:args.fail])
+            t0 = time.perf_counter()
+            if budget is None: runs = [rollout(adb, packages, [serial], hubs, device_mb_s, device_mb_s, 0.5) for serial in devices]
+            else: runs = [rollout(adb, packages, devices, hubs, budget, device_mb_s, 0.5)]
+            total = time.perf_counter() - t0
+            s = [r.stats() for r in runs]
+            print(f"{name:<11} {runs[0].slots_per_hub if budget else 1:>7} {total:>8.2f} {args.devices * 60 / total:>8.1f} {sum(x['ok'] for x in s):>4} "
+                  f"{sum(x['failed'] for x in s):>6} {sum(x['retried'] for x in s):>7} {sum(x['pushed_mb'] for x in s):>10.0f}")
+    srv.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark: startup load of today's API log, full read vs memory-mapped tail.
+
+Writes a synthetic day's log of each size, then times the old _load_log_for_today path
+(read the whole file, insert it, trim to the view size) against the tail_lines path
+(reverse newline scan over an mmap, insert only the last lines) up to the next idle
+callback, which is when the first paint can happen.
+
+    python benchmarks/bench_log_startup.py
+    python benchmarks/bench_log_startup.py --sizes 100000,1000000 --tail 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tkinter as tk
+from tkinter import scrolledtext
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import ApiLogView, tail_lines
+
+
+def write_log(path, lines):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for i in range(lines):
+            s = i * 86400 // lines
+            f.write(f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d} | 200 |   1.{i % 1000:03d}ms |  127.0.0.1 | GET     | /api/v1/items/{i % 5000} | -\n")
+
+
+def load_full(view, path):
+    with open(path, 'r', encoding='utf-8') as f: c = f.read()
+    view.top_offset = 0
+    view.append(c, [(c.count('\n'), 0)])
+
+
+def load_tail(view, path, count):
+    start, c = tail_lines(path, count)
+    view.top_offset = start
+    view.append(c, [(c.count('\n'), start)])
+
+
+def run(root, path, mode, tail, max_lines):
+    text = scrolledtext.ScrolledText(root, wrap=tk.WORD, state='disabled', font=('Consolas', 8))
+    text.pack(fill='both', expand=True)
+    view = ApiLogView(text, max_lines, lambda: path)
+    root.update()
+    t0 = time.perf_counter()
+    if mode == 'full': load_full(view, path)
+    else: load_tail(view, path, tail)
+    loaded = time.perf_counter() - t0
+    root.update_idletasks()
+    painted = time.perf_counter() - t0
+    lines = view.line_count()
+    text.destroy()
+    return loaded, painted, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--tail', type=int, default=2000, help='lines loaded at startup (App.STARTUP_TAIL_LINES)')
+    parser.add_argument('--max-lines', type=int, default=5000, help='ApiLogView max_lines')
+    args = parser.parse_args()
+
+    root = tk.Tk()
+    root.geometry('430x300')
+    print(f"{'lines':>9} {'MB':>7} {'mode':>5} {'load ms':>9} {'paint ms':>9} {'widget':>8}")
+    with tempfile.TemporaryDirectory() as d:
+        for size in [int(s) for s in args.sizes.split(',')]:
+            path = os.path.join(d, f"api_log_{size}.txt")
+            write_log(path, size)
+            mb = os.path.getsize(path) / 1048576
+            for mode in ('full', 'tail'):
+                loaded, painted, lines = run(root, path, mode, args.tail, args.max_lines)
+                print(f"{size:>9} {mb:>7.1f} {mode:>5} {loaded * 1000:>9.1f} {painted * 1000:>9.1f} {lines:>8}")
+    root.destroy()
+
+
+if __name__ == '__main__':
+    main()
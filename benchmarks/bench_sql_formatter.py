@@ -0,0 +1,111 @@
+"""Benchmark: streaming SqlLogFormatter vs the legacy whole-log _format_sql_log.
+
+Generates a realistic SQL-heavy api.exe log (Fiber access lines interleaved with GORM
+statement lines) and reports MB/s and lines/s for a first pass over raw output and for a
+second pass over already-formatted output. It then simulates a trading day where the
+legacy path re-formats the whole reloaded log on every save, while the streaming path
+formats each appended line once.
+
+    python benchmarks/bench_sql_formatter.py
+    python benchmarks/bench_sql_formatter.py --lines 500000 --sql-ratio 0.6
+    python benchmarks/bench_sql_formatter.py --day-lines 100000 --save-every 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sql_log_formatter import SqlLogFormatter
+
+
+def legacy_format_sql_log(raw_content):
+    # Copy of the original main_a1.App._format_sql_log for comparison.
+    formatted_lines = []
+    sql_keywords = [
+        ' FROM ', ' WHERE ', ' INSERT INTO ', ' UPDATE ', ' SET ', ' VALUES ',
+        ' LEFT JOIN ', ' INNER JOIN ', ' GROUP BY ', ' ORDER BY ', ' DELETE FROM '
+    ]
+    for line in raw_content.splitlines():
+        if 'SELECT ' in line or 'INSERT INTO ' in line or 'UPDATE ' in line or 'DELETE FROM ' in line:
+            formatted_lines.append("--- SQL Query ---")
+            for keyword in sql_keywords:
+                line = line.replace(keyword, f'\n  {keyword.strip()} ')
+            formatted_lines.append(line)
+            formatted_lines.append("-" * 17 + "\n")
+        else:
+            formatted_lines.append(line)
+    return "\n".join(formatted_lines)
+
+
+STATEMENTS = [
+    'SELECT "items"."id","items"."barcode","items"."price" FROM "items" LEFT JOIN "prices" ON "prices"."item_id" = "items"."id" WHERE "items"."barcode" = \'{n}\' AND "items"."deleted_at" IS NULL ORDER BY "items"."id" LIMIT 1',
+    'INSERT INTO "scan_logs" ("device_id","barcode","created_at") VALUES (\'HHT{n}\',\'885{n}\',\'2026-10-17 12:00:00\')',
+    'UPDATE "stock" SET "qty"={n},"updated_at"=\'2026-10-17 12:00:00\' WHERE "item_id" = {n}',
+    'SELECT count(*) FROM "orders" INNER JOIN "order_lines" ON "order_lines"."order_id" = "orders"."id" WHERE "orders"."branch" = 3081 GROUP BY "orders"."id"',
+    'DELETE FROM "sessions" WHERE "expires_at" < \'2026-10-17 12:00:00\'',
+]
+
+
+def make_log(lines, sql_ratio, seed=1):
+    rnd = random.Random(seed)
+    out = []
+    for i in range(lines):
+        if rnd.random() < sql_ratio:
+            out.append(f"[{rnd.random() * 5:.3f}ms] [rows:{rnd.randint(0, 3)}] {rnd.choice(STATEMENTS).format(n=i)}\n")
+        else:
+            out.append(f"12:{i // 60 % 60:02d}:{i % 60:02d} | 200 | {rnd.random() * 9:7.3f}ms | 127.0.0.1 | GET | /api/v1/items/{i} | -\n")
+    return ''.join(out)
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+def report(name, size_mb, lines, seconds):
+    print(f"{name:<34} {seconds * 1000:9.1f} ms {size_mb / seconds:9.1f} MB/s {lines / seconds:12,.0f} lines/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=200000)
+    parser.add_argument('--sql-ratio', type=float, default=0.5)
+    parser.add_argument('--day-lines', type=int, default=50000, help='lines in the simulated day')
+    parser.add_argument('--save-every', type=int, default=1000, help='lines between legacy saves (30 s of output)')
+    args = parser.parse_args()
+
+    raw = make_log(args.lines, args.sql_ratio)
+    size_mb = len(raw.encode('utf-8')) / 1048576
+    print(f"log: {args.lines:,} lines, {size_mb:.1f} MB, {args.sql_ratio:.0%} SQL")
+
+    legacy, t = timed(legacy_format_sql_log, raw)
+    report("legacy, raw log", size_mb, args.lines, t)
+    _, t = timed(legacy_format_sql_log, legacy)
+    report("legacy, re-format own output", size_mb, args.lines, t)
+
+    stream = lambda text: ''.join(SqlLogFormatter().format_lines(text.splitlines(True)))
+    formatted, t = timed(stream, raw)
+    report("streaming, raw log", size_mb, args.lines, t)
+    again, t = timed(stream, formatted)
+    report("streaming, re-format own output", size_mb, args.lines, t)
+    print(f"streaming formatter idempotent: {again == formatted}")
+
+    day = make_log(args.day_lines, args.sql_ratio, seed=2).splitlines(True)
+    saved, t0 = '', time.perf_counter()
+    for i in range(0, len(day), args.save_every):
+        saved = legacy_format_sql_log(saved + ''.join(day[i:i + args.save_every]))
+    legacy_t = time.perf_counter() - t0
+    fmt, out, t0 = SqlLogFormatter(), [], time.perf_counter()
+    for i in range(0, len(day), args.save_every):
+        out.extend(fmt.format_lines(day[i:i + args.save_every]))
+    stream_t = time.perf_counter() - t0
+    print(f"\nsimulated day: {args.day_lines:,} lines, save every {args.save_every:,} lines")
+    print(f"{'legacy (whole log per save)':<34} {legacy_t * 1000:9.1f} ms  final size {len(saved) / 1048576:6.1f} MB")
+    print(f"{'streaming (new lines only)':<34} {stream_t * 1000:9.1f} ms  final size {len(''.join(out)) / 1048576:6.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""In-process stand-in for the adb server's smart-socket protocol, for exercising AdbClient.
+
+Implements host:version, host:devices, host:devices-l, host:track-devices, host:kill, host:transport:<serial>
+and, on a device transport, shell: (dumpsys package, pm list packages --show-versioncode,
+pm install, pm install-create / install-write (from a device path) / install-add-session /
+install-commit / install-abandon, pm path, sha256sum, rm, touch, find (no-op), echo),
+exec:pm install-write -S
+(streamed from the socket), reverse:forward /
+reverse:killforward and sync: (SEND, STAT, QUIT).
+Devices, installed packages and pushed files live in memory; set_device / remove_device
+push changes to track-devices subscribers. Optional per-command latency lets benchmarks
+model a slow handheld, and install_latency holds a per-device lock for each package a pm
+install or session commit installs, since the device's package manager only installs
+one package at a time; commit_latency adds a fixed cost per install transaction (settings
+write, package broadcasts). link_mb_s caps the USB link, shared by all transfers to a
+device. Devices attached with a usb: port path share a hub with the other devices on the
+same parent port; hub_mb_s splits that hub's bandwidth between its active transfers, and
+hub_contention takes a further share per extra concurrent transfer (bulk-transfer and
+adbd overhead). fail_once holds packages whose next commit fails. Set multi_package=False
+to model a device before Android 10.
+
+    python benchmarks/fake_adb_server.py                 # serve on 127.0.0.1:5037 until Ctrl+C
+    python benchmarks/fake_adb_server.py --port 15037 --demo
+"""
+import argparse
+import hashlib
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeAdbServer:
+    def __init__(self, port=0, shell_latency=0.0, install_latency=0.0, commit_latency=0.0, link_mb_s=0.0, hub_mb_s=0.0, hub_contention=0.0):
+        self.devices = {}        # serial -> state
+        self.packages = {}       # serial -> {package: versionCode}
+        self.files = {}          # serial -> {path: bytes}
+        self.mtimes = {}         # (serial, path) -> mtime sent with DONE
+        self.apks = {}           # (serial, package) -> installed base.apk bytes
+        self.reverses = {}       # serial -> {remote: local}
+        self.shell_latency = shell_latency
+        self.install_latency = install_latency
+        self.commit_latency = commit_latency
+        self.link_mb_s = link_mb_s
+        self.hub_mb_s, self.hub_contention = hub_mb_s, hub_contention
+        self.usb_paths = {}      # serial -> usb: port path, e.g. 1-1.3
+        self._hub_active = {}    # hub -> transfers in progress
+        self.bytes_received = 0
+        self.fail_once = set()
+        self._usb_locks = {}     # serial -> Lock, one transfer at a time per cable
+        self._pm_locks = {}      # serial -> Lock, serialises pm install like PackageManagerService
+        self.commands = []       # (serial, service) log, for assertions
+        self.sessions = {}       # session id -> {'files': {name: bytes}, 'children': [ids] or None}
+        self.multi_package = True
+        self._session_ids = iter(range(1000, 10 ** 9))
+        self.apk_info = lambda name, data: (os.path.splitext(os.path.basename(name))[0], 1)
+        self._subscribers = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self): server._handle(self.request)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._srv = socketserver.ThreadingTCPServer(('127.0.0.1', port), Handler)
+        self._srv.daemon_threads = True
+        self.port = self._srv.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self._srv.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._srv.shutdown(); self._srv.server_close()
+        with self._lock:
+            for sock in self._subscribers:
+                try: sock.shutdown(socket.SHUT_RDWR); sock.close()
+                except OSError: pass
+            self._subscribers = []
+
+    # --- device state ---
+    def set_device(self, serial, state='device', usb=None):
+        with self._lock:
+            self.devices[serial] = state
+            if usb: self.usb_paths[serial] = usb
+            self.packages.setdefault(serial, {}); self.files.setdefault(serial, {}); self.reverses.setdefault(serial, {})
+        self._notify()
+
+    def remove_device(self, serial):
+        with self._lock: self.devices.pop(serial, None)
+        self._notify()
+
+    def _device_list(self):
+        return ''.join(f"{s}\t{st}\n" for s, st in self.devices.items())
+
+    def _device_list_long(self):
+        return ''.join(f"{s:<22} {st}" + (f" usb:{self.usb_paths[s]}" if s in self.usb_paths else "") + f" product:fake model:HHT transport_id:{i}\n"
+                       for i, (s, st) in enumerate(self.devices.items(), 1))
+
+    def _notify(self):
+        with self._lock:
+            payload, alive = self._device_list(), []
+            for sock in self._subscribers:
+                try: sock.sendall(self._hex(payload)); alive.append(sock)
+                except OSError: pass
+            self._subscribers = alive
+
+    # --- wire helpers ---
+    @staticmethod
+    def _hex(text):
+        data = text.encode('utf-8')
+        return b'%04x' % len(data) + data
+
+    @staticmethod
+    def _recv(sock, n):
+        buf = b''
+        while len(buf) < n:
+            chunk = sock.recv(n - len(buf))
+            if not chunk: raise ConnectionError
+            buf += chunk
+        return buf
+
+    def _request(self, sock):
+        return self._recv(sock, int(self._recv(sock, 4), 16)).decode('utf-8')
+
+    def _fail(self, sock, msg): sock.sendall(b'FAIL' + self._hex(msg))
+
+    def _handle(self, sock):
+        try:
+            req = self._request(sock)
+            if req == 'host:version': sock.sendall(b'OKAY' + self._hex('%04x' % 41))
+            elif req == 'host:devices': sock.sendall(b'OKAY' + self._hex(self._device_list()))
+            elif req == 'host:devices-l': sock.sendall(b'OKAY' + self._hex(self._device_list_long()))
+            elif req == 'host:kill': sock.sendall(b'OKAY')
+            elif req == 'host:track-devices':
+                with self._lock:
+                    sock.sendall(b'OKAY' + self._hex(self._device_list())); self._subscribers.append(sock)
+                while sock.recv(1): pass  # hold the socket until the client goes away
+            elif req.startswith('host:transport:'):
+                serial = req[len('host:transport:'):]
+                if self.devices.get(serial) != 'device': self._fail(sock, f"device '{serial}' not found"); return
+                sock.sendall(b'OKAY')
+                self._device_service(sock, serial, self._request(sock))
+            else: self._fail(sock, f"unknown host service {req}")
+        except (ConnectionError, OSError, ValueError): pass
+        finally:
+            try: sock.close()
+            except OSError: pass
+
+    def _device_service(self, sock, serial, service):
+        self.commands.append((serial, service))
+        if service.startswith('shell:'):
+            if self.shell_latency: time.sleep(self.shell_latency)
+            sock.sendall(b'OKAY' + self._shell(serial, service[6:]).encode('utf-8'))
+        elif service.startswith('reverse:forward:'):
+            remote, local = service[len('reverse:forward:'):].split(';')
+            self.reverses[serial][remote] = local; sock.sendall(b'OKAYOKAY')
+        elif service.startswith('reverse:killforward:'):
+            remote = service[len('reverse:killforward:'):]
+            if self.reverses[serial].pop(remote, None) is None: sock.sendall(b'OKAYFAIL' + self._hex(f"listener '{remote}' not found"))
+            else: sock.sendall(b'OKAYOKAY')
+        elif service.startswith('exec:'):
+            sock.sendall(b'OKAY')
+            args = [a.strip("'") for a in service[5:].split()]
+            if args[:2] != ['pm', 'install-write']: sock.sendall(f"exec: {' '.join(args)}: not supported\n".encode()); return
+            size, sid, name = int(args[3]), args[4], args[5]
+            data = self._recv(sock, size); self._transfer(serial, size)
+            if sid not in self.sessions: sock.sendall(b"Failure [Invalid session]\n"); return
+            self.sessions[sid]['files'][name] = data
+            sock.sendall(f"Success: streamed {size} bytes\n".encode())
+        elif service == 'sync:':
+            sock.sendall(b'OKAY'); self._sync(sock, serial)
+        else: self._fail(sock, f"unknown device service {service}")
+
+    def _shell(self, serial, cmd):
+        args = [a.strip("'") for a in cmd.split()]
+        pkgs = self.packages[serial]
+        if args[:2] == ['dumpsys', 'package'] and len(args) > 2:
+            v = pkgs.get(args[2])
+            return f"Packages:\n  Package [{args[2]}]\n    versionCode={v} minSdk=21 targetSdk=30\n" if v else ""
+        if args[:3] == ['pm', 'list', 'packages']:
+            return ''.join(f"package:{p} versionCode:{v}\n" if '--show-versioncode' in args else f"package:{p}\n" for p, v in pkgs.items())
+        if args[:2] == ['pm', 'install']:
+            path = args[-1]
+            data = self.files[serial].get(path)
+            if data is None: return "Failure [INSTALL_FAILED_INVALID_URI]\n"
+            self._pm_busy(serial, 1)
+            pkg, ver = self.apk_info(path, data)
+            pkgs[pkg] = ver; self.apks[(serial, pkg)] = data
+            return "Performing Streamed Install\nSuccess\n"
+        if args[:2] == ['pm', 'install-create']:
+            multi = '--multi-package' in args
+            if multi and not self.multi_package: return "Error: Unknown option: --multi-package\n"
+            sid = str(next(self._session_ids))
+            with self._lock: self.sessions[sid] = {'files': {}, 'children': [] if multi else None}
+            return f"Success: created install session [{sid}]\n"
+        if args[:2] == ['pm', 'install-write'] and len(args) == 7:
+            data = self.files[serial].get(args[6])
+            if data is None or args[4] not in self.sessions: return "Failure [INSTALL_FAILED_INVALID_URI]\n"
+            self.sessions[args[4]]['files'][args[5]] = data
+            return f"Success: streamed {len(data)} bytes\n"
+        if args[:2] == ['pm', 'install-add-session']:
+            self.sessions[args[2]]['children'].extend(args[3:]); return "Success\n"
+        if args[:2] == ['pm', 'install-abandon']:
+            return "Success\n" if self.sessions.pop(args[2], None) is not None else "Failure [Invalid session]\n"
+        if args[:2] == ['pm', 'install-commit']:
+            session = self.sessions.pop(args[2], None)
+            if session is None: return "Failure [Invalid session]\n"
+            children = [self.sessions.pop(c) for c in session['children']] if session['children'] is not None else [session]
+            staged = []
+            for child in children:
+                if not child['files']: return "Failure [INSTALL_FAILED_INVALID_APK: no files]\n"
+                name, data = sorted(child['files'].items())[0]
+                staged.append(self.apk_info(name.split('_', 1)[1], data) + (data,))
+            self._pm_busy(serial, len(staged))
+            failed = [pkg for pkg, _, _ in staged if pkg in self.fail_once]
+            if failed:
+                self.fail_once.difference_update(failed)
+                return f"Failure [INSTALL_FAILED_VERIFICATION_FAILURE: {failed[0]}]\n"
+            for pkg, ver, data in staged: pkgs[pkg] = ver; self.apks[(serial, pkg)] = data
+            return "Success\n"
+        if args[:2] == ['pm', 'uninstall'] and len(args) > 2:
+            return "Success\n" if pkgs.pop(args[-1], None) is not None else "Failure [DELETE_FAILED_INTERNAL_ERROR]\n"
+        if args[:2] == ['rm', '-f']:
+            for p in args[2:]: self.files[serial].pop(p, None)
+            return ""
+        if args[:2] == ['pm', 'path'] and len(args) > 2:
+            return f"package:/data/app/{args[2]}-1/base.apk\n" if args[2] in pkgs else ""
+        if args[:1] == ['sha256sum'] and len(args) > 1:
+            data = self.apks.get((serial, args[1].split('/')[3][:-2])) if args[1].startswith('/data/app/') else self.files[serial].get(args[1])
+            if data is None: return f"sha256sum: {args[1]}: No such file or directory\n"
+            return f"{hashlib.sha256(data).hexdigest()}  {args[1]}\n"
+        if args[:1] == ['touch']:
+            for p in args[1:]: self.files[serial].setdefault(p, b'')
+            return ""
+        if args[:1] == ['find']:
+            return ""
+        if args[:1] == ['echo']: return ' '.join(args[1:]) + "\n"
+        return f"/system/bin/sh: {args[0] if args else ''}: not found\n"
+
+    def _transfer(self, serial, n):
+        with self._lock: self.bytes_received += n
+        path = self.usb_paths.get(serial, '')
+        hub = path.rsplit('.', 1)[0] if self.hub_mb_s and path else None
+        if not (self.link_mb_s or hub): return
+        with self._lock: usb = self._usb_locks.setdefault(serial, threading.Lock())
+        with usb:
+            if not hub: time.sleep(n / (self.link_mb_s * 1048576)); return
+            with self._lock: self._hub_active[hub] = k = self._hub_active.get(hub, 0) + 1
+            try:
+                rate = self.hub_mb_s / (k * (1 + self.hub_contention * (k - 1)))
+                time.sleep(n / (min(rate, self.link_mb_s or rate) * 1048576))
+            finally:
+                with self._lock: self._hub_active[hub] -= 1
+
+    def _pm_busy(self, serial, packages):
+        if not (self.install_latency or self.commit_latency): return
+        with self._lock: pm = self._pm_locks.setdefault(serial, threading.Lock())
+        with pm: time.sleep(self.commit_latency + self.install_latency * packages)
+
+    def _sync(self, sock, serial):
+        while True:
+            cmd, n = self._recv(sock, 4), struct.unpack('<I', self._recv(sock, 4))[0]
+            if cmd == b'QUIT': return
+            arg = self._recv(sock, n)
+            if cmd == b'SEND':
+                path = arg.decode('utf-8').rsplit(',', 1)[0]
+                parts = []
+                while True:
+                    sub, m = self._recv(sock, 4), struct.unpack('<I', self._recv(sock, 4))[0]
+                    if sub == b'DONE': break
+                    parts.append(self._recv(sock, m)); self._transfer(serial, m)
+                self.files[serial][path] = b''.join(parts); self.mtimes[(serial, path)] = m
+                sock.sendall(b'OKAY' + struct.pack('<I', 0))
+            elif cmd == b'STAT':
+                path = arg.decode('utf-8'); data = self.files[serial].get(path)
+                sock.sendall(b'STAT' + struct.pack('<III', 0o100644 if data is not None else 0, len(data or b''), self.mtimes.get((serial, path), 0) if data is not None else 0))
+            else: return
+
+
+def demo(port):
+    import tempfile
+    from main import AdbClient
+    srv = FakeAdbServer(port).start()
+    srv.set_device('HHT0001')
+    adb = AdbClient(port=srv.port, timeout=5)
+    t0 = time.perf_counter()
+    for _ in range(200): adb.devices()
+    print(f"host:devices x200: {(time.perf_counter() - t0) * 5:.2f} ms/call -> {adb.devices()}")
+    adb.reverse('HHT0001', 'tcp:8000', 'tcp:8000'); print(f"reverse: {srv.reverses['HHT0001']}")
+    with tempfile.NamedTemporaryFile(suffix='.apk', delete=False) as f: f.write(os.urandom(1 << 20))
+    t0 = time.perf_counter(); out = adb.install('HHT0001', f.name)
+    print(f"install 1 MB: {(time.perf_counter() - t0) * 1000:.1f} ms -> {out.strip().splitlines()[-1]}")
+    print(f"pm list: {adb.shell('HHT0001', 'pm list packages --show-versioncode').strip()}")
+    os.remove(f.name)
+    srv.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=5037)
+    parser.add_argument('--devices', default='HHT0001', help='comma-separated serials to attach')
+    parser.add_argument('--demo', action='store_true', help='run AdbClient against it and exit')
+    args = parser.parse_args()
+    if args.demo: demo(args.port); return
+    srv = FakeAdbServer(args.port).start()
+    for serial in filter(None, args.devices.split(',')): srv.set_device(serial)
+    print(f"fake adb server on 127.0.0.1:{srv.port} with {list(srv.devices)}, Ctrl+C to stop")
+    try:
+        while True: time.sleep(1)
+    except KeyboardInterrupt: srv.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Local stand-in for api.exe's HTTP port, for exercising ApiHealthProber.
+
+Serves keep-alive HTTP/1.1 on 127.0.0.1 with a switchable behaviour: ok, slow (adds
+--slow-ms before responding), hang (accepts but never answers) and down (listener
+closed). Run it alone and point the app's [API_HEALTH] PORT at it, or use --scenario to
+step through the modes with a prober attached and print every status change with the
+time it took to be detected.
+
+    python benchmarks/fake_api_server.py --port 8000 --mode slow --slow-ms 800
+    python benchmarks/fake_api_server.py --scenario --interval-ms 250
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import ApiHealthProber
+
+
+class State:
+    mode = 'ok'
+    slow_ms = 800
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if State.mode == 'down': self.close_connection = True; return  # kept-alive sockets die with the process
+        if State.mode == 'hang': time.sleep(3600)
+        if State.mode == 'slow': time.sleep(State.slow_ms / 1000)
+        body = b'{"status":"ok"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json'); self.send_header('Content-Length', str(len(body)))
+        self.end_headers(); self.wfile.write(body)
+
+    def log_message(self, *args): pass
+
+
+class Server:
+    def __init__(self, port):
+        self.port, self.httpd = port, None
+
+    def up(self):
+        if self.httpd: return
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def down(self):
+        if not self.httpd: return
+        self.httpd.shutdown(); self.httpd.server_close(); self.httpd = None
+
+
+def scenario(server, args):
+    changes = []
+    prober = ApiHealthProber(port=args.port, interval=args.interval_ms / 1000, timeout=1.0, degraded_ms=args.degraded_ms,
+                             on_change=lambda status, detail: changes.append((time.perf_counter(), status, detail)))
+    steps = [('ok', 'Online'), ('slow', 'Degraded'), ('ok', 'Online'), ('hang', 'Offline'), ('ok', 'Online'), ('down', 'Offline'), ('ok', 'Online')]
+    server.up(); prober.start()
+    print(f"{'mode':<6} {'expect':<9} {'got':<9} {'detected ms':>12}  detail")
+    for mode, expect in steps:
+        State.mode = mode
+        if mode == 'down': server.down()
+        else: server.up()
+        t0, deadline, seen = time.perf_counter(), time.perf_counter() + 15, None
+        while time.perf_counter() < deadline and seen is None:
+            seen = next((c for c in changes if c[0] >= t0 and c[1] == expect), None)
+            time.sleep(0.02)
+        got, detail = (seen[1], seen[2]) if seen else (prober.status, prober.detail)
+        took = f"{(seen[0] - t0) * 1000:.0f}" if seen else 'timeout'
+        print(f"{mode:<6} {expect:<9} {got:<9} {took:>12}  {detail}")
+    prober.stop(); server.down()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--mode', choices=('ok', 'slow', 'hang', 'down'), default='ok')
+    parser.add_argument('--slow-ms', type=int, default=800)
+    parser.add_argument('--scenario', action='store_true', help='step through all modes with a prober attached')
+    parser.add_argument('--interval-ms', type=int, default=250, help='probe interval for --scenario')
+    parser.add_argument('--degraded-ms', type=int, default=500, help='Degraded threshold for --scenario')
+    args = parser.parse_args()
+    State.slow_ms = args.slow_ms
+    server = Server(args.port)
+    if args.scenario: scenario(server, args); return
+    State.mode = args.mode
+    if args.mode != 'down': server.up()
+    print(f"serving mode={args.mode} on 127.0.0.1:{args.port}, Ctrl+C to stop")
+    try:
+        while True: time.sleep(1)
+    except KeyboardInterrupt: server.down()
+
+
+if __name__ == '__main__':
+    main()
@@ -6,15 +6,30 @@ import os
 import sys
 import time
 import queue
+import collections
+import codecs
 import zipfile
 import shutil
 import configparser
+import gzip
+import json
+import itertools
+import mmap
+import socket
+import struct
 import datetime
+import fnmatch
+import hashlib
+import http.client
+import re
+import math
+from array import array
 import ctypes
+import sqlite3
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from tkinter import filedialog, messagebox
-from pyaxmlparser import APK
+from sql_log_formatter import SqlLogFormatter
 
 # --- Image Generation for UI ---
 def create_android_icon(color):
@@ -58,9 +73,2257 @@ class ApkFileHandler(FileSystemEventHandler):
     def on_created(self, event): self.process_event(event)
     def on_modified(self, event): self.process_event(event)
 
+# --- Append-only writer for the daily API log ---
+class ApiLogWriter:
+    """Appends api.exe output to api_log_YYYY-MM-DD.txt from a single background thread.
+
+    Lines are batched and flushed (with fsync) every `batch_lines` lines or `flush_interval`
+    seconds, so a crash loses at most one batch. Each chunk is dated when it is received,
+    which lets the writer roll over to a new file at midnight on its own.
+    """
+    def __init__(self, log_dir, batch_lines=500, flush_interval=1.0, on_rollover=None, on_flush=None):
+        self.log_dir = log_dir
+        self.batch_lines = batch_lines
+        self.flush_interval = flush_interval
+        self.on_rollover = on_rollover
+        self.on_flush = on_flush
+        self.current_date = time.strftime("%Y-%m-%d")
+        self.lines_written = 0
+        self._day, self._day_end = self.current_date, self._next_midnight()
+        self._end = self._size(self.current_date)  # where the next write() lands in the day's file
+        self._queue = queue.Queue()
+        self._file = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _next_midnight():
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        return time.mktime(tomorrow.timetuple())
+
+    def path_for(self, date_str): return os.path.join(self.log_dir, f"api_log_{date_str}.txt")
+
+    def _size(self, date_str):
+        path = self.path_for(date_str)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    @property
+    def filepath(self): return self.path_for(self.current_date)
+
+    def write(self, text):
+        """Queues a chunk of one or more newline-terminated lines. Returns (date, byte offset it will be written at).
+
+        Offsets assume a single caller (the api.exe reader thread).
+        """
+        if not text: return None
+        if time.time() >= self._day_end:
+            self._day, self._day_end = time.strftime("%Y-%m-%d"), self._next_midnight()
+            self._end = self._size(self._day)
+        offset = self._end
+        self._end += len(text.encode('utf-8'))
+        self._queue.put((self._day, text))
+        return self._day, offset
+
+    def flush(self, timeout=2, callback=None):
+        """Blocks until everything queued so far has been written to disk.
+
+        With `callback` it returns at once instead, and the writer thread calls callback()
+        once that data is on disk.
+        """
+        if callback: self._queue.put(callback); return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        batch, batch_lines, deadline = [], 0, None
+        while True:
+            try: item = self._queue.get(timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+            except queue.Empty: item = False
+            if isinstance(item, tuple):
+                date_str, text = item
+                if date_str != self.current_date:
+                    self._flush(batch); batch, batch_lines, deadline = [], 0, None
+                    self._rollover(date_str)
+                batch.append(text); batch_lines += text.count('\n')
+                if deadline is None: deadline = time.monotonic() + self.flush_interval
+                if batch_lines < self.batch_lines: continue
+            self._flush(batch); batch, batch_lines, deadline = [], 0, None
+            if isinstance(item, threading.Event): item.set()
+            elif callable(item): item()
+            elif item is None: break
+        if self._file: self._file.close(); self._file = None
+
+    def _flush(self, batch):
+        if not batch: return
+        try:
+            if self._file is None: self._file = open(self.filepath, 'a', encoding='utf-8', newline='')
+            data = ''.join(batch)
+            self._file.write(data); self._file.flush(); os.fsync(self._file.fileno())
+            self.lines_written += data.count('\n')
+            if self.on_flush: self.on_flush()
+        except Exception as e:
+            print(f"Error appending to API log: {e}")
+            if self._file:
+                try: self._file.close()
+                except Exception: pass
+                self._file = None
+
+    def _rollover(self, date_str):
+        old_date = self.current_date
+        if self._file: self._file.close(); self._file = None
+        self.current_date = date_str; self.lines_written = 0
+        print(f"API log rolled over: {old_date} -> {date_str}")
+        if self.on_rollover: self.on_rollover(old_date, date_str)
+
+# --- Bounded view over the API log widget ---
+def read_lines_before(path, offset, count, chunk_size=65536):
+    """Returns (start_offset, text) for the last `count` lines that end at byte `offset` of `path`."""
+    with open(path, 'rb') as f:
+        pos, data = offset, b''
+        while pos > 0 and data.count(b'\n') <= count:
+            step = min(chunk_size, pos); pos -= step
+            f.seek(pos); data = f.read(step) + data
+    if data.count(b'\n') > count:
+        cut = len(data)
+        for _ in range(count + 1): cut = data.rindex(b'\n', 0, cut)
+        data = data[cut + 1:]; pos = offset - len(data)
+    return pos, data.decode('utf-8', errors='replace').replace('\r\n', '\n')
+
+def skip_lines(path, offset, count, chunk_size=65536):
+    """Returns the byte offset just past `count` lines starting at `offset` (clamped to EOF)."""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while count > 0:
+            data = f.read(chunk_size)
+            if not data: break
+            n = data.count(b'\n')
+            if n < count: offset += len(data); count -= n; continue
+            idx = -1
+            for _ in range(count): idx = data.index(b'\n', idx + 1)
+            return offset + idx + 1
+    return offset
+
+def count_lines(path, start, end, chunk_size=1048576):
+    """Counts newlines in bytes [start, end) of `path`."""
+    n = 0
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while start < end:
+            data = f.read(min(chunk_size, end - start))
+            if not data: break
+            n += data.count(b'\n'); start += len(data)
+    return n
+
+def tail_lines(path, count):
+    """Returns (start_offset, text) for the last `count` lines of `path`.
+
+    Memory-maps the file and scans backwards for newlines, so the cost depends on the tail
+    size rather than on how large the day's file has grown.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size: return 0, ''
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = size - 1 if mm[size - 1:size] == b'\n' else size
+            start = end
+            for _ in range(count):
+                start = mm.rfind(b'\n', 0, start)
+                if start == -1: break
+            start += 1
+            return start, mm[start:size].decode('utf-8', errors='replace').replace('\r\n', '\n')
+
+class ApiLogView:
+    """Keeps the API log widget bounded to the last `max_lines` lines (0 = unbounded).
+
+    Trimmed lines stay reachable: `top_offset` is the byte offset in today's log file of the
+    widget's first file-backed line, and scrolling to the top or searching pages older lines
+    back in. The widget need not mirror the file (status messages are not in it, lines the
+    queue dropped are not in the widget), so `segments` records, per inserted chunk,
+    [line count, file offset of its first line or None]. While the user is scrolled up the
+    widget may grow to twice `max_lines` before it is trimmed, with the viewport kept on the
+    same lines. `shift` tracks how far line numbers have moved (trims subtract, page-ins
+    add) and `epoch` changes on clear, so work computed against an older snapshot can be
+    re-based.
+    """
+    PAGE_LINES = 1000
+
+    def __init__(self, text, max_lines=5000, path_getter=None):
+        self.text = text
+        self.max_lines = max_lines
+        self.path_getter = path_getter
+        self.top_offset = None
+        self.segments = collections.deque()
+        self.shift = 0
+        self.epoch = 0
+        self._paging = False
+        if getattr(text, 'vbar', None) is not None:
+            text.config(yscrollcommand=self._on_yscroll)
+            text.bind('<MouseWheel>', self._on_wheel, add='+'); text.bind('<Button-4>', self._on_wheel, add='+')
+
+    def _path(self):
+        path = self.path_getter() if self.path_getter else None
+        return path if path and os.path.exists(path) else None
+
+    def line_count(self): return int(self.text.index('end-1c').split('.')[0])
+    def at_bottom(self): return self.text.yview()[1] >= 0.999
+
+    def append(self, chunk, segments=None):
+        """Inserts `chunk` at the end; `segments` is [(lines, file offset or None)] covering it, default not in the file."""
+        follow = self.at_bottom()
+        first_visible = int(self.text.index('@0,0').split('.')[0])
+        self.text.config(state='normal')
+        self.text.insert('end', chunk)
+        had_file_lines = self._file_lines_above()
+        for n, offset in segments or [(chunk.count('\n'), None)]:
+            if n: self.segments.append([n, offset])
+        if not had_file_lines: self._sync_top()
+        removed = self.trim(0 if follow else self.max_lines)
+        if follow: self.text.see('end')
+        elif removed: self.text.yview(f'{max(1, first_visible - removed)}.0')
+        self.text.config(state='disabled')
+
+    def _file_lines_above(self):
+        return any(offset is not None for _, offset in self.segments)
+
+    def _sync_top(self):
+        top = next((offset for _, offset in self.segments if offset is not None), None)
+        if top is not None: self.top_offset = top
+
+    def trim(self, slack=0):
+        """Deletes lines from the top once more than `slack` + ~10% over max_lines. Returns lines deleted."""
+        # Trim in steps of ~10% so the delete (and the offset scan) is amortised over many inserts.
+        if not self.max_lines: return 0
+        excess = self.line_count() - self.max_lines
+        if excess <= self.max_lines // 10 + slack: return 0
+        path, left, last = self._path(), excess, None
+        while left and self.segments:
+            seg = self.segments[0]
+            if seg[0] <= left:
+                left -= seg[0]; self.segments.popleft()
+                if seg[1] is not None: last = seg
+                continue
+            if seg[1] is not None and path: seg[1] = skip_lines(path, seg[1], left)
+            seg[0] -= left; left = 0
+        if self._file_lines_above(): self._sync_top()
+        elif last and path: self.top_offset = skip_lines(path, last[1], last[0])
+        self.text.delete('1.0', f'{excess + 1}.0')
+        self.shift -= excess
+        return excess
+
+    def line_for_offset(self, offset):
+        """Widget line showing the file line that starts at byte `offset`, or None if it is not in the widget."""
+        path, line, best = self._path(), 1, None
+        if not path: return None
+        for n, start in self.segments:
+            if start is not None and start <= offset: best = (line, n, start)
+            line += n
+        if not best: return None
+        line, n, start = best
+        k = count_lines(path, start, offset)
+        return line + k if k < n else None
+
+    def clear(self, top_offset=None):
+        self.text.config(state='normal'); self.text.delete('1.0', 'end'); self.text.config(state='disabled')
+        self.top_offset = top_offset
+        self.segments.clear()
+        self.epoch += 1
+
+    def page_older(self, count=None):
+        """Inserts up to `count` older lines from disk above the current view. Returns lines added."""
+        path = self._path()
+        if not path or not self.top_offset: return 0
+        start, chunk = read_lines_before(path, self.top_offset, count or self.PAGE_LINES)
+        if not chunk: return 0
+        first_visible = int(self.text.index('@0,0').split('.')[0])
+        added = chunk.count('\n')
+        self.text.config(state='normal'); self.text.insert('1.0', chunk); self.text.config(state='disabled')
+        self.text.yview(f'{first_visible + added}.0')
+        self.segments.appendleft([added, start])
+        self.top_offset = start
+        self.shift += added
+        return added
+
+    def find_older(self, term, context=5, chunk_size=1048576):
+        """Pages in history back to the most recent on-disk match of `term` above the view."""
+        path = self._path()
+        if not path or not self.top_offset or not term: return 0
+        needle = term.lower().encode('utf-8')
+        newlines_after = 0
+        with open(path, 'rb') as f:
+            end = self.top_offset
+            while end > 0:
+                start = max(0, end - chunk_size)
+                f.seek(start); data = f.read(min(self.top_offset, end + len(needle) - 1) - start)
+                idx = data.lower().rfind(needle)
+                if idx != -1:
+                    return self.page_older(newlines_after + data.count(b'\n', idx, end - start) + context)
+                newlines_after += data.count(b'\n', 0, end - start)
+                end = start
+        return 0
+
+    def _on_yscroll(self, first, last):
+        self.text.vbar.set(first, last)
+        if float(first) <= 0.0 and float(last) < 1.0: self._schedule_page_in()
+
+    def _on_wheel(self, event):
+        if getattr(event, 'delta', 0) > 0 or getattr(event, 'num', 0) == 4:
+            if self.text.yview()[0] <= 0.0: self._schedule_page_in()
+
+    def _schedule_page_in(self):
+        if self._paging or not self.top_offset: return
+        self._paging = True
+        self.text.after_idle(self._page_in_idle)
+
+    def _page_in_idle(self):
+        try: self.page_older()
+        except Exception as e: print(f"Error paging in API log history: {e}")
+        finally: self._paging = False
+
+# --- Live search highlighting for the API log widget ---
+class ApiLogHighlighter:
+    """Highlights every match of a plain or regex query in the API log widget off the Tk thread.
+
+    `set_query` snapshots the widget text and hands it to a worker thread, which sends tag
+    ranges back in batches of BATCH; each call bumps a generation number, so typing cancels
+    the previous query and stale batches are ignored. In filter mode the gaps between
+    matching lines get the elided 'filter_hidden' tag. Lines appended later are scanned
+    incrementally (`on_append`). Batches are re-based with ApiLogView.shift, so trims and
+    page-ins while a query runs don't misplace tags.
+    """
+    BATCH = 2000
+
+    def __init__(self, text, view, on_done=None):
+        self.text = text
+        self.view = view
+        self.on_done = on_done
+        self.query = ''
+        self.regex = False
+        self.filter = False
+        self.matches = 0
+        self._gen = 0
+        self.busy = False
+        self._pending_id = None
+        self._refresh_id = None
+        self._done = None  # (epoch, shift, next line to scan)
+        text.tag_config('filter_hidden', elide=True)
+
+    def set_query(self, query, regex=False, filter_=False, delay=200):
+        self._gen += 1
+        self.query, self.regex, self.filter = query, regex, filter_
+        self.matches, self._done, self.busy = 0, None, bool(query)
+        for after_id in (self._pending_id, self._refresh_id):
+            if after_id: self.text.after_cancel(after_id)
+        self._refresh_id = None
+        self.text.tag_remove('search', '1.0', 'end'); self.text.tag_remove('current_search', '1.0', 'end')
+        self.text.tag_remove('filter_hidden', '1.0', 'end')
+        self._pending_id = self.text.after(delay, self._start) if query else None
+        if not query and self.on_done: self.on_done(0, None)
+
+    def pattern(self):
+        return re.compile(self.query if self.regex else re.escape(self.query), re.IGNORECASE | re.MULTILINE)
+
+    def on_append(self):
+        if self.query and self._refresh_id is None: self._refresh_id = self.text.after(300, self._refresh)
+
+    def _refresh(self):
+        self._refresh_id = None
+        if self.busy: self.on_append(); return
+        if not self._done or self._done[0] != self.view.epoch: self._start(); return
+        self._start(max(1, self._done[2] + self.view.shift - self._done[1]))
+
+    def _start(self, from_line=1):
+        self._pending_id = None
+        try: pattern = self.pattern()
+        except re.error as e:
+            self.busy = False
+            if self.on_done: self.on_done(0, str(e))
+            return
+        content = self.text.get(f'{from_line}.0', 'end-1c')
+        base = (self._gen, self.view.epoch, self.view.shift)
+        self.busy = True
+        threading.Thread(target=self._scan, args=(base, pattern, content, from_line), daemon=True).start()
+
+    def _scan(self, base, pattern, content, from_line):
+        gen = base[0]
+        ranges, gaps, count = [], [], 0
+        line, pos, prev = from_line, 0, from_line - 1
+        for m in pattern.finditer(content):
+            if m.start() == m.end(): continue
+            line += content.count('\n', pos, m.start()); pos = m.start()
+            col = m.start() - content.rfind('\n', 0, m.start()) - 1
+            end_line = line + content.count('\n', m.start(), m.end())
+            end_col = m.end() - content.rfind('\n', 0, m.end()) - 1
+            ranges.append((line, col, end_line, end_col)); count += 1
+            if self.filter and line > prev + 1: gaps.append((prev + 1, line))
+            prev = max(prev, end_line)
+            if len(ranges) >= self.BATCH:
+                if gen != self._gen: return
+                self.text.after(0, self._apply, base, ranges, gaps, self._indices(ranges, gaps)); ranges, gaps = [], []
+        last_line = from_line + content.count('\n')
+        if self.filter and last_line > prev + 1: gaps.append((prev + 1, last_line))
+        if gen != self._gen: return
+        self.text.after(0, self._apply, base, ranges, gaps, self._indices(ranges, gaps), count, last_line)
+
+    @staticmethod
+    def _indices(ranges, gaps, off=0):
+        # Tk index strings for tag_add, built on the worker; only rebuilt on the Tk thread if lines moved.
+        idx, hide = [], []
+        for line, col, end_line, end_col in ranges:
+            line, end_line = line + off, end_line + off
+            if end_line >= 1: idx += (f'{line}.{col}' if line >= 1 else '1.0', f'{end_line}.{end_col}')
+        for first, stop in gaps:
+            if stop + off > 1: hide += (f'{max(1, first + off)}.0', f'{stop + off}.0')
+        return idx, hide
+
+    def _apply(self, base, ranges, gaps, indices, count=None, last_line=None):
+        gen, epoch, shift = base
+        if gen != self._gen or epoch != self.view.epoch: return
+        off = self.view.shift - shift
+        idx, hide = self._indices(ranges, gaps, off) if off else indices
+        if idx: self.text.tag_add('search', *idx)
+        if hide: self.text.tag_add('filter_hidden', *hide)
+        if count is None: return
+        self.matches += count; self.busy = False
+        self._done = (epoch, shift, last_line)
+        if self.on_done: self.on_done(self.matches, None)
+
+# --- Inverted index over the retained daily API logs ---
+class ApiLogIndex:
+    """Background-built inverted index over the api_log_*.txt files kept in the log directory.
+
+    Postings map each lower-cased word token to the 32-line blocks of each day's file that
+    contain it, so a search reads and verifies only the candidate blocks. A single index
+    thread picks up new and deleted days and indexes lines as the writer flushes them
+    (see `notify`). Days already compressed by ApiLogArchive load their postings from the
+    archive's index and are read back one compressed block at a time.
+    """
+    BLOCK_LINES = 32
+    TOKEN_RE = re.compile(r'\w+')
+    CLOCK_RE = re.compile(r'\s*(\d{2}:\d{2}:\d{2})')
+
+    def __init__(self, log_dir, rescan_interval=30, archive=None):
+        self.log_dir = log_dir
+        self.rescan_interval = rescan_interval
+        self.archive = archive
+        self.ready = False
+        self._files = {}      # date -> {'kind': 'txt'|'gz', 'path', 'size', 'lines', 'blocks': array of block start offsets, 'meta'}
+        self._postings = {}   # token -> {date: array of block numbers}
+        self._vocab = '\n'   # every token, newline-delimited, for C-speed prefix/suffix/substring lookups
+        self._new_tokens = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def notify(self): self._wake.set()
+
+    def stop(self):
+        self._running = False; self._wake.set()
+
+    def _run(self):
+        while self._running:
+            try:
+                self._update_all()
+                with self._lock: self._fold_vocab()
+            except Exception as e: print(f"Error updating API log index: {e}")
+            self.ready = True
+            self._wake.wait(self.rescan_interval); self._wake.clear()
+
+    @classmethod
+    def line_tokens(cls, raw):
+        return set(cls.TOKEN_RE.findall(raw.decode('utf-8', errors='replace').lower()))
+
+    def _log_files(self):
+        # A finished archive wins over a .txt that is still waiting to be deleted.
+        files = {}
+        for f in os.listdir(self.log_dir):
+            if f.startswith("api_log_") and f.endswith(".txt"): files[f[8:-4]] = ('txt', os.path.join(self.log_dir, f))
+        if self.archive:
+            for date, path in self.archive.days().items(): files[date] = ('gz', path)
+        return files
+
+    def _update_all(self):
+        files = self._log_files()
+        with self._lock:
+            for date in [d for d in self._files if d not in files or self._files[d]['kind'] != files[d][0]]: self._forget(date)
+        for date in sorted(files):
+            if not self._running: return
+            kind, path = files[date]
+            if kind == 'txt': self._index_file(date, path)
+            elif date not in self._files: self._load_archive(date)
+
+    def _load_archive(self, date):
+        meta = self.archive.load_index(date)
+        postings = meta.pop('postings')
+        st = {'kind': 'gz', 'path': self.archive.paths(date)[0], 'size': meta['raw_size'], 'lines': meta['lines'], 'blocks': None, 'meta': meta}
+        with self._lock:
+            for token, blocks in postings.items():
+                if token not in self._postings: self._new_tokens.append(token)
+                self._postings.setdefault(token, {})[date] = array('I', blocks)
+            self._files[date] = st
+
+    def _forget(self, date):
+        del self._files[date]
+        for token in list(self._postings):
+            per_date = self._postings[token]
+            if per_date.pop(date, None) is not None and not per_date: del self._postings[token]
+        self._vocab = '\n' + ''.join(t + '\n' for t in self._postings); self._new_tokens = []
+
+    def _index_file(self, date, path):
+        size = os.path.getsize(path)
+        st = self._files.get(date)
+        if st and size < st['size']:
+            with self._lock: self._forget(date)
+            st = None
+        if st is None:
+            st = {'kind': 'txt', 'path': path, 'size': 0, 'lines': 0, 'blocks': array('Q')}
+            with self._lock: self._files[date] = st
+        with open(path, 'rb') as f:
+            while st['size'] < size:
+                f.seek(st['size'])
+                data = f.read(min(1 << 20, size - st['size']))
+                end = data.rfind(b'\n')
+                if end == -1: break  # only a partial line so far
+                self._index_chunk(date, st, data[:end + 1])
+
+    def _index_chunk(self, date, st, data):
+        offset, line_no, blocks = st['size'], st['lines'], st['blocks']
+        pending = {}
+        for raw in data.split(b'\n')[:-1]:
+            if line_no % self.BLOCK_LINES == 0: blocks.append(offset)
+            block = line_no // self.BLOCK_LINES
+            for token in self.line_tokens(raw):
+                found = pending.setdefault(token, [])
+                if not found or found[-1] != block: found.append(block)
+            offset += len(raw) + 1; line_no += 1
+        with self._lock:
+            for token, found in pending.items():
+                if token not in self._postings: self._new_tokens.append(token)
+                postings = self._postings.setdefault(token, {}).setdefault(date, array('I'))
+                if postings and postings[-1] == found[0]: found = found[1:]
+                postings.extend(found)
+            st['size'], st['lines'] = offset, line_no
+
+    def _fold_vocab(self):
+        if self._new_tokens: self._vocab += ''.join(t + '\n' for t in self._new_tokens); self._new_tokens = []
+
+    def _matching_tokens(self, needle):
+        self._fold_vocab()
+        vocab, keys = self._vocab, set()
+        pos = vocab.find(needle)
+        while pos != -1:
+            start = vocab.rfind('\n', 0, pos + 1) + 1
+            end = vocab.find('\n', pos + 1)
+            keys.add(vocab[start:end]); pos = vocab.find(needle, end)
+        return keys
+
+    def _candidates(self, q):
+        # A query token touching either end of the query may be cut mid-word, so it matches
+        # index tokens by suffix/prefix/substring; interior tokens must match exactly.
+        candidates = None
+        for m in self.TOKEN_RE.finditer(q):
+            token, left, right = m.group(), m.start() == 0, m.end() == len(q)
+            if left and right: keys = self._matching_tokens(token)
+            elif left: keys = self._matching_tokens(token + '\n')
+            elif right: keys = self._matching_tokens('\n' + token)
+            else: keys = [token] if token in self._postings else []
+            union = {}
+            for key in keys:
+                for date, blocks in self._postings[key].items(): union.setdefault(date, set()).update(blocks)
+            candidates = union if candidates is None else {d: candidates[d] & union[d] for d in candidates if d in union}
+            if not candidates: return {}
+        if candidates is None:
+            candidates = {d: set(range(-(-st['lines'] // self.BLOCK_LINES))) for d, st in self._files.items()}
+        return candidates
+
+    def _open(self, st):
+        return open(st['path'], 'rb') if st['kind'] == 'txt' else None
+
+    def _read_block(self, f, st, block):
+        if st['kind'] == 'gz': return self.archive.read_lines(st['meta'], block * self.BLOCK_LINES, self.BLOCK_LINES)
+        blocks = st['blocks']
+        end = blocks[block + 1] if block + 1 < len(blocks) else st['size']
+        f.seek(blocks[block])
+        return f.read(end - blocks[block]).decode('utf-8', errors='replace').split('\n')[:-1]
+
+    def search(self, query, max_hits=500):
+        """Case-insensitive substring search over all indexed days, newest day first.
+
+        Returns a list of (date, line_no, text) with 1-based line numbers.
+        """
+        q = query.lower()
+        if not q: return []
+        with self._lock:
+            candidates = self._candidates(q)
+            files = {d: dict(self._files[d]) for d in candidates if d in self._files}
+        hits = []
+        for date in sorted(files, reverse=True):
+            st = files[date]
+            f = self._open(st)
+            try:
+                for block in sorted(candidates[date]):
+                    for i, line in enumerate(self._read_block(f, st, block)):
+                        if q in line.lower():
+                            hits.append((date, block * self.BLOCK_LINES + i + 1, line.rstrip('\r')))
+                            if len(hits) >= max_hits: return hits
+            finally:
+                if f: f.close()
+        return hits
+
+    def read_lines(self, date, first, last):
+        """Returns [(line_no, text)] for 1-based lines first..last of an indexed day."""
+        with self._lock:
+            st = dict(self._files[date]) if date in self._files else None
+        if not st: return []
+        first, last = max(1, first), min(last, st['lines'])
+        out = []
+        f = self._open(st)
+        try:
+            for block in range((first - 1) // self.BLOCK_LINES, (last - 1) // self.BLOCK_LINES + 1):
+                for i, line in enumerate(self._read_block(f, st, block)):
+                    line_no = block * self.BLOCK_LINES + i + 1
+                    if first <= line_no <= last: out.append((line_no, line.rstrip('\r')))
+        finally:
+            if f: f.close()
+        return out
+
+    def _block_clock(self, f, st, block):
+        for line in self._read_block(f, st, block):
+            m = self.CLOCK_RE.match(line)
+            if m: return m.group(1)
+        return None
+
+    def find_time(self, date, clock):
+        """1-based number of the first line stamped at or after HH:MM[:SS] on an indexed day, or None.
+
+        Binary-searches the 32-line blocks, so an archived day decompresses only a handful of blocks.
+        """
+        with self._lock:
+            st = dict(self._files[date]) if date in self._files else None
+        if not st or not st['lines']: return None
+        clock = clock if clock.count(':') == 2 else clock + ':00'
+        clock = clock.zfill(8)
+        f = self._open(st)
+        try:
+            lo, hi = 0, -(-st['lines'] // self.BLOCK_LINES)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                t = self._block_clock(f, st, mid)
+                if t is None or t < clock: lo = mid + 1
+                else: hi = mid
+            first = max(0, lo - 1)
+            for block in (first, first + 1):
+                for i, line in enumerate(self._read_block(f, st, block) if block * self.BLOCK_LINES < st['lines'] else []):
+                    m = self.CLOCK_RE.match(line)
+                    if m and m.group(1) >= clock: return block * self.BLOCK_LINES + i + 1
+            return min(st['lines'], lo * self.BLOCK_LINES + 1)
+        finally:
+            if f: f.close()
+
+    def line_offset(self, date, line_no):
+        """Byte offset of a 1-based line in the day's file, or None if it is not indexed yet."""
+        with self._lock:
+            st = dict(self._files[date]) if date in self._files else None
+        if not st or st['kind'] != 'txt' or not 1 <= line_no <= st['lines']: return None
+        block = (line_no - 1) // self.BLOCK_LINES
+        return skip_lines(st['path'], st['blocks'][block], (line_no - 1) % self.BLOCK_LINES)
+
+# --- Compressed archive of closed API log days ---
+class ApiLogArchive:
+    """Block-compressed archives of closed api_log days with a size-budget retention.
+
+    A closed day becomes api_log_<date>.txt.gz, a concatenation of independent gzip members
+    of BLOCK_LINES lines each (so plain gzip/zcat still reads it whole), plus
+    api_log_<date>.idx.gz: gzipped JSON with each member's (offset, length) and the day's
+    search postings. Readers decompress only the members they touch; recently used
+    members are kept in a small LRU cache.
+    """
+    BLOCK_LINES = 1024
+
+    def __init__(self, log_dir, budget_bytes=1 << 30, max_age_days=0, cache_blocks=16):
+        self.log_dir = log_dir
+        self.budget_bytes = budget_bytes
+        self.max_age_days = max_age_days
+        self.cache_blocks = cache_blocks
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def paths(self, date):
+        base = os.path.join(self.log_dir, f"api_log_{date}")
+        return base + ".txt.gz", base + ".idx.gz"
+
+    def days(self):
+        """{date: archive path} for every complete archive (the index is written last)."""
+        days = {}
+        for f in os.listdir(self.log_dir):
+            if f.startswith("api_log_") and f.endswith(".idx.gz"):
+                date = f[8:-7]
+                gz = self.paths(date)[0]
+                if os.path.exists(gz): days[date] = gz
+        return days
+
+    def archive_day(self, date, src):
+        """Compresses a closed day's .txt into an archive and removes the .txt. Returns the archive size."""
+        gz, idx = self.paths(date)
+        blocks, postings, lines, raw_size = [], {}, 0, 0
+        index_lines = ApiLogIndex.BLOCK_LINES
+        with open(src, 'rb') as f, open(gz + '.tmp', 'wb') as out:
+            while True:
+                batch = list(itertools.islice(f, self.BLOCK_LINES))
+                if not batch: break
+                for i, raw in enumerate(batch):
+                    block = (lines + i) // index_lines
+                    for token in ApiLogIndex.line_tokens(raw):
+                        found = postings.setdefault(token, [])
+                        if not found or found[-1] != block: found.append(block)
+                data = b''.join(batch)
+                member = gzip.compress(data, compresslevel=6, mtime=0)
+                blocks.append((out.tell(), len(member))); out.write(member)
+                lines += len(batch); raw_size += len(data)
+            out.flush(); os.fsync(out.fileno())
+        meta = {'version': 1, 'date': date, 'lines': lines, 'raw_size': raw_size, 'block_lines': self.BLOCK_LINES, 'blocks': blocks, 'postings': postings}
+        with gzip.open(idx + '.tmp', 'wt', encoding='utf-8') as f: json.dump(meta, f, separators=(',', ':'))
+        os.replace(gz + '.tmp', gz); os.replace(idx + '.tmp', idx)
+        os.remove(src)
+        return os.path.getsize(gz) + os.path.getsize(idx)
+
+    def load_index(self, date):
+        with gzip.open(self.paths(date)[1], 'rt', encoding='utf-8') as f: meta = json.load(f)
+        meta['path'] = self.paths(date)[0]
+        return meta
+
+    def _block(self, meta, k):
+        key = (meta['path'], k)
+        with self._lock:
+            if key in self._cache: self._cache.move_to_end(key); return self._cache[key]
+        offset, length = meta['blocks'][k]
+        with open(meta['path'], 'rb') as f:
+            f.seek(offset)
+            lines = gzip.decompress(f.read(length)).decode('utf-8', errors='replace').split('\n')
+        if lines and lines[-1] == '': lines.pop()
+        with self._lock:
+            self._cache[key] = lines
+            while len(self._cache) > self.cache_blocks: self._cache.popitem(last=False)
+        return lines
+
+    def read_lines(self, meta, first, count):
+        """Lines first..first+count-1 (0-based) of an archived day, decompressing only the members they span."""
+        per, out = meta['block_lines'], []
+        last = min(first + count, meta['lines'])
+        for k in range(first // per, (last - 1) // per + 1 if last > first else first // per):
+            lines = self._block(meta, k)
+            out.extend(lines[max(0, first - k * per):last - k * per])
+        return out
+
+    def maintain(self, today):
+        """Archives every closed .txt day, then drops the oldest archives beyond the size budget or max age."""
+        archived = 0
+        for f in sorted(os.listdir(self.log_dir)):
+            if not (f.startswith("api_log_") and f.endswith(".txt")): continue
+            date = f[8:-4]
+            if date >= today: continue
+            try: self.archive_day(date, os.path.join(self.log_dir, f)); archived += 1
+            except Exception as e: print(f"Error archiving API log {f}: {e}")
+        days = sorted(self.days())
+        sizes = {d: sum(os.path.getsize(p) for p in self.paths(d) if os.path.exists(p)) for d in days}
+        total = sum(sizes.values())
+        cutoff = (datetime.date.fromisoformat(today) - datetime.timedelta(days=self.max_age_days)).isoformat() if self.max_age_days else ''
+        for date in days:
+            if total <= self.budget_bytes and date >= cutoff: break
+            for p in reversed(self.paths(date)):
+                try: os.remove(p)
+                except OSError: pass
+            total -= sizes[date]
+            with self._lock:
+                for key in [k for k in self._cache if k[0] == self.paths(date)[0]]: del self._cache[key]
+        return archived
+
+# --- Structured api.exe access-log records ---
+class FiberLogParser:
+    """Turns Fiber logger lines into (ts, method, route, status, latency_ms, size) records.
+
+    Understands the default `${time} | ${status} | ${latency} | ${ip} | ${method} | ${path} | ${error}`
+    layout (time optional, ANSI colours stripped). A numeric field after the path is taken as the
+    response size. Numeric and UUID path segments are collapsed to ':id' so routes group.
+    Requests to `ignore_paths` (the health probe's) parse to IGNORED and are counted in `ignored`.
+    """
+    IGNORED = False
+    ANSI_RE = re.compile(r'\x1b\[[0-9;]*m')
+    ACCESS_RE = re.compile(r'^\s*(?:(\d{1,2}:\d{2}:\d{2})\s*\|\s*)?(\d{3})\s*\|\s*([0-9.hmsµun]+)\s*\|\s*[^|]*\|\s*([A-Z]{3,7})\s*\|\s*(\S+)\s*(?:\|(.*))?$')
+    DURATION_RE = re.compile(r'([0-9.]+)(h|ms|m|s|µs|us|ns)')
+    ID_SEGMENT_RE = re.compile(r'/(?:\d+|[0-9a-fA-F]{8}-[0-9a-fA-F-]{27}|[0-9a-fA-F]{24,})(?=/|$)')
+    UNIT_MS = {'h': 3600000.0, 'm': 60000.0, 's': 1000.0, 'ms': 1.0, 'µs': 0.001, 'us': 0.001, 'ns': 0.000001}
+
+    def __init__(self, ignore_paths=()):
+        self.ignore_paths = set(ignore_paths)
+        self.ignored = 0
+
+    def parse(self, line, now=None):
+        if '|' not in line: return None
+        if '\x1b' in line: line = self.ANSI_RE.sub('', line)
+        m = self.ACCESS_RE.match(line)
+        if not m: return None
+        clock, status, latency, method, path, rest = m.groups()
+        if self.ignore_paths and path.split('?', 1)[0] in self.ignore_paths: self.ignored += 1; return self.IGNORED
+        latency_ms = sum(float(v) * self.UNIT_MS[u] for v, u in self.DURATION_RE.findall(latency))
+        size = None
+        for field in (rest or '').split('|'):
+            if field.strip().isdigit(): size = int(field); break
+        return (self._timestamp(clock, now), method, self.route(path), int(status), latency_ms, size)
+
+    def route(self, path):
+        return self.ID_SEGMENT_RE.sub('/:id', path.split('?', 1)[0])
+
+    @staticmethod
+    def _timestamp(clock, now=None):
+        now = now or time.time()
+        if not clock: return now
+        h, mi, se = (int(x) for x in clock.split(':'))
+        t = datetime.datetime.fromtimestamp(now).replace(hour=h, minute=mi, second=se, microsecond=0).timestamp()
+        return t - 86400 if t > now + 60 else t
+
+class ApiRequestStore:
+    """SQLite-backed store of parsed api.exe requests with minute-bucket indexes.
+
+    Records are queued from the reader thread and inserted in batches by a single writer
+    thread. Queries open their own short-lived connection, which WAL mode allows
+    alongside the writer.
+    """
+    BUCKET_SECONDS = 60
+
+    def __init__(self, db_path, retention_days=7, flush_interval=1.0):
+        self.db_path = db_path
+        self.retention_days = retention_days
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, record): self._queue.put(record)
+
+    def close(self, timeout=5):
+        self._queue.put(None); self._thread.join(timeout)
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=5)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _run(self):
+        try:
+            db = self._connect()
+            db.execute("CREATE TABLE IF NOT EXISTS requests (ts REAL, bucket INTEGER, method TEXT, route TEXT, status INTEGER, latency_ms REAL, size INTEGER)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_requests_bucket ON requests(bucket)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_requests_route_bucket ON requests(route, bucket)")
+            db.commit()
+        except Exception as e:
+            print(f"Error opening API request store: {e}"); return
+        next_prune, running = 0, True
+        while running:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=60))
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < 5000 and batch[-1] is not None:
+                    batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty: pass
+            if batch and batch[-1] is None: running = False; batch.pop()
+            try:
+                if batch:
+                    db.executemany("INSERT INTO requests VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   [(r[0], int(r[0] // self.BUCKET_SECONDS)) + tuple(r[1:]) for r in batch])
+                if time.time() >= next_prune:
+                    cutoff = (time.time() - self.retention_days * 86400) // self.BUCKET_SECONDS
+                    db.execute("DELETE FROM requests WHERE bucket < ?", (cutoff,))
+                    next_prune = time.time() + 3600
+                db.commit()
+            except Exception as e: print(f"Error writing API request store: {e}")
+        db.close()
+
+    def slowest_endpoints(self, since_seconds=3600, limit=20):
+        """[(method, route, count, avg_ms, max_ms, error_count)] for the last `since_seconds`, slowest first."""
+        bucket = int((time.time() - since_seconds) // self.BUCKET_SECONDS)
+        db = self._connect()
+        try:
+            return db.execute(
+                "SELECT method, route, COUNT(*), AVG(latency_ms), MAX(latency_ms), SUM(status >= 500) FROM requests "
+                "WHERE bucket >= ? GROUP BY method, route ORDER BY AVG(latency_ms) DESC LIMIT ?", (bucket, limit)).fetchall()
+        finally: db.close()
+
+# --- Rolling per-route latency histograms ---
+class LatencyHistograms:
+    """Fixed-memory, log-bucketed latency histograms per route over rolling windows.
+
+    Each window is a ring of time slots holding one bucket-count array; a slot is zeroed when
+    its time comes round again, so nothing grows with traffic. Buckets grow by 15% from
+    0.01 ms to ~10 min, which keeps every percentile within ~7% of the true value.
+    Routes beyond MAX_ROUTES are folded into '(other)'; ALL aggregates every request.
+    """
+    MIN_MS = 0.01
+    GROWTH = 1.15
+    BUCKETS = 128
+    WINDOWS = {'1m': (5, 12), '15m': (60, 15), '24h': (900, 96)}
+    MAX_ROUTES = 64
+    ALL = '*'
+    _LOG_GROWTH = math.log(GROWTH)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def _new_route(self):
+        # window -> [slot ids, slot arrays (allocated on first use)]
+        return {w: [array('q', [-1]) * n, [None] * n] for w, (_, n) in self.WINDOWS.items()}
+
+    def record(self, route, latency_ms, ts=None):
+        ts = ts or time.time()
+        b = int(math.log(latency_ms / self.MIN_MS) / self._LOG_GROWTH) if latency_ms > self.MIN_MS else 0
+        if b >= self.BUCKETS: b = self.BUCKETS - 1
+        with self._lock:
+            if route not in self._routes:
+                if len(self._routes) > self.MAX_ROUTES: route = '(other)'
+                if route not in self._routes: self._routes[route] = self._new_route()
+            if self.ALL not in self._routes: self._routes[self.ALL] = self._new_route()
+            for key in (route, self.ALL):
+                hist = self._routes[key]
+                for w, (slot_s, n) in self.WINDOWS.items():
+                    ids, slots = hist[w]
+                    sid = int(ts // slot_s); i = sid % n
+                    if ids[i] != sid:
+                        ids[i] = sid
+                        if slots[i] is None: slots[i] = array('I', bytes(4 * self.BUCKETS))
+                        else: slots[i][:] = array('I', bytes(4 * self.BUCKETS))
+                    slots[i][b] += 1
+
+    def percentiles(self, route=ALL, window='1m', qs=(0.5, 0.95, 0.99), now=None):
+        """(count, [latency_ms per q]) over the window; latencies are None when there is no data."""
+        slot_s, n = self.WINDOWS[window]
+        oldest = int((now or time.time()) // slot_s) - n + 1
+        merged = [0] * self.BUCKETS
+        with self._lock:
+            hist = self._routes.get(route)
+            if hist:
+                ids, slots = hist[window]
+                for i in range(n):
+                    if ids[i] >= oldest:
+                        for b, c in enumerate(slots[i]):
+                            if c: merged[b] += c
+        total = sum(merged)
+        if not total: return 0, [None] * len(qs)
+        out, seen, b = [], 0, 0
+        for q in qs:
+            target = q * total
+            while b < self.BUCKETS - 1 and seen + merged[b] < target: seen += merged[b]; b += 1
+            out.append(self.MIN_MS * self.GROWTH ** (b + 0.5))
+        return total, out
+
+    def routes(self):
+        with self._lock: return [r for r in self._routes if r != self.ALL]
+
+    def slowest(self, window='1m', q=0.99, now=None):
+        """(route, count, latency_ms) with the highest q-percentile in the window, or None."""
+        best = None
+        for route in self.routes():
+            count, (v,) = self.percentiles(route, window, (q,), now)
+            if count and (best is None or v > best[2]): best = (route, count, v)
+        return best
+
+# --- Batched reader for api.exe stdout ---
+def read_line_batches(stream, chunk_size=65536):
+    """Yields lists of complete lines read from a binary pipe in large chunks.
+
+    Decodes UTF-8 incrementally (split multi-byte sequences are carried over), folds CRLF to
+    LF like a text-mode pipe would, and hands out every complete line of a chunk at once.
+    A trailing partial line is kept until its newline arrives, or yielded at EOF.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    partial = ''
+    while True:
+        data = stream.read(chunk_size)
+        if not data: break
+        buf = partial + decoder.decode(data)
+        cut = buf.rfind('\n') + 1
+        partial = buf[cut:]
+        if cut: yield buf[:cut].replace('\r\n', '\n').splitlines(True)
+    partial += decoder.decode(b'', final=True)
+    if partial: yield [partial]
+
+# --- Duplicate collapsing and overload sampling for api.exe output ---
+class ApiLogThrottle:
+    """Bounds what reaches the API log widget and file when api.exe floods its output.
+
+    Consecutive lines that are identical apart from their clock prefix collapse into one
+    "[previous line repeated N times]" marker (emitted when the run ends, and at least once a
+    second while it lasts). Past `max_rate` lines in a one-second window, only every
+    `sample_every`-th line is kept and the window closes with the exact number dropped.
+    Call tick() on a timer so a due marker or drop report goes out even when api.exe falls
+    silent. Not thread-safe: callers serialise process(), tick() and flush(). Counters cover
+    everything seen, so totals stay accurate; parsing for stats happens before this stage.
+    """
+    CLOCK_RE = re.compile(r'^\s*\d{1,2}:\d{2}:\d{2}(?:\.\d+)?')
+
+    def __init__(self, max_rate=2000, sample_every=100, collapse=True):
+        self.max_rate = max_rate
+        self.sample_every = sample_every
+        self.collapse = collapse
+        self.received = 0
+        self.collapsed = 0
+        self.sampled_out = 0
+        self._key = None
+        self._repeats = 0
+        self._repeat_since = 0
+        self._window = None
+        self._window_in = self._window_out = self._window_dropped = 0
+
+    def process(self, lines, now=None):
+        """Returns the lines (and markers) to pass on for a batch of raw lines."""
+        now = now or time.monotonic()
+        out = []
+        if int(now) != self._window: self._close_window(out); self._window = int(now)
+        for line in lines:
+            self.received += 1
+            if self.collapse:
+                m = self.CLOCK_RE.match(line)
+                key = line[m.end():] if m else line
+                if key == self._key:
+                    if not self._repeats: self._repeat_since = now
+                    self._repeats += 1; self.collapsed += 1
+                    continue
+                self._emit_repeats(out); self._key = key
+            self._window_in += 1
+            if self.max_rate and self._window_out >= self.max_rate and self._window_in % self.sample_every:
+                self._window_dropped += 1; self.sampled_out += 1
+                continue
+            self._window_out += 1; out.append(line)
+        if self._repeats and now - self._repeat_since >= 1.0: self._emit_repeats(out)
+        return out
+
+    def tick(self, now=None):
+        """Returns a repeat marker that is due and the report of an elapsed window, while no lines arrive."""
+        now = now or time.monotonic()
+        out = []
+        if self._window is not None and int(now) != self._window: self._close_window(out); self._window = int(now)
+        if self._repeats and now - self._repeat_since >= 1.0: self._emit_repeats(out)
+        return out
+
+    def flush(self):
+        """Emits any pending repeat marker and drop report (call at end of stream)."""
+        out = []
+        self._emit_repeats(out); self._close_window(out)
+        return out
+
+    def _emit_repeats(self, out):
+        if self._repeats:
+            out.append(f"[previous line repeated {self._repeats} times]\n"); self._window_out += 1
+            self._repeats = 0
+
+    def _close_window(self, out):
+        if self._window_dropped:
+            out.append(f"[log throttle: over {self.max_rate} lines/s, kept 1 in {self.sample_every}, dropped {self._window_dropped} of {self._window_in} lines]\n")
+        self._window_in = self._window_out = self._window_dropped = 0
+
+# --- Hand-off queue between the api.exe reader and the Tk loop ---
+class ApiLogQueue:
+    """Bounded line queue with backpressure counters.
+
+    When the UI falls more than `maxlen` lines behind, the oldest lines are dropped from the
+    view only (the log writer has already received them) and counted in `dropped`.
+    `deferred` is how many lines were left over when the last drain ran out of budget.
+    put_many() can record the log-file offset of its first line; drain_segments() hands
+    those on as [(lines, offset)] so ApiLogView knows where each drained run sits on disk.
+    """
+    def __init__(self, maxlen=50000):
+        self.maxlen = maxlen
+        self.received = 0
+        self.dropped = 0
+        self.deferred = 0
+        self._lines = collections.deque()
+        self._marks = collections.deque()  # [sequence number of a put's first line, its file offset or None]
+        self._head = 0                     # sequence number of _lines[0]
+        self._lock = threading.Lock()
+
+    def put(self, line, offset=None): self.put_many([line], offset)
+
+    def put_many(self, lines, offset=None):
+        if not lines: return
+        with self._lock:
+            self._marks.append([self._head + len(self._lines), offset])
+            self._lines.extend(lines); self.received += len(lines)
+            excess = len(self._lines) - self.maxlen
+            if excess > 0:
+                self._take(excess)
+                self.dropped += excess
+
+    def depth(self): return len(self._lines)
+
+    def _take(self, n):
+        # Pops n lines, moving the first mark past them; a partly taken put keeps the offset of its next line.
+        lines = [self._lines.popleft() for _ in range(n)]
+        segments, pos = [], 0
+        while pos < n:
+            mark = self._marks[0]
+            end = self._marks[1][0] if len(self._marks) > 1 else self._head + n + len(self._lines)
+            k = min(end - self._head, n) - pos
+            segments.append((k, mark[1]))
+            if self._head + pos + k == end: self._marks.popleft()
+            else:
+                mark[0] = self._head + pos + k
+                if mark[1] is not None: mark[1] += sum(len(line.encode('utf-8')) for line in lines[pos:pos + k])
+            pos += k
+        self._head += n
+        return lines, segments
+
+    def drain(self, max_lines): return self.drain_segments(max_lines)[0]
+
+    def drain_segments(self, max_lines):
+        """Returns (lines, [(line count, file offset or None)]) for up to `max_lines` lines."""
+        with self._lock:
+            lines, segments = self._take(min(max_lines, len(self._lines)))
+            self.deferred = len(self._lines)
+        return lines, segments
+
+# --- Active health checks against api.exe ---
+class ApiHealthProber:
+    """Probes api.exe over HTTP on a fixed interval and derives Online / Degraded / Offline.
+
+    Connections are kept alive and reused from a small pool, so a probe normally costs one
+    request; connect time is measured only when a new connection has to be opened. Any
+    HTTP response counts as alive (api.exe may 404 on the probe path). `fail_threshold`
+    consecutive failures mean Offline; a failure below that, or a median TTFB over the last
+    few probes above `degraded_ms`, means Degraded. `on_change(status, detail)` is called
+    from the probe thread whenever the status or its detail changes.
+    """
+    def __init__(self, host='127.0.0.1', port=8000, path='/healthz', interval=2.0, timeout=2.0,
+                 degraded_ms=500, fail_threshold=3, pool_size=2, on_change=None):
+        self.host, self.port, self.path = host, port, path
+        self.interval = interval
+        self.timeout = timeout
+        self.degraded_ms = degraded_ms
+        self.fail_threshold = fail_threshold
+        self.pool_size = pool_size
+        self.on_change = on_change
+        self.status = "Offline"
+        self.detail = ""
+        self.failures = 0
+        self.last_connect_ms = None
+        self.last_ttfb_ms = None
+        self.last_ok_at = 0
+        self.samples = collections.deque(maxlen=300)  # (ts, connect_ms or None, ttfb_ms or None, ok)
+        self._idle = collections.deque()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive(): return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True); self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        while self._idle: self._idle.pop().close()
+
+    def _acquire(self):
+        if self._idle: return self._idle.pop(), None
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        t0 = time.perf_counter(); conn.connect()
+        return conn, (time.perf_counter() - t0) * 1000
+
+    def _release(self, conn, reusable):
+        if reusable and len(self._idle) < self.pool_size: self._idle.append(conn)
+        else: conn.close()
+
+    def probe(self):
+        """Runs one probe; returns (ok, connect_ms, ttfb_ms)."""
+        conn = None
+        try:
+            conn, connect_ms = self._acquire()
+            t0 = time.perf_counter()
+            conn.request('GET', self.path, headers={'Connection': 'keep-alive'})
+            resp = conn.getresponse()
+            ttfb_ms = (time.perf_counter() - t0) * 1000
+            resp.read()
+            self._release(conn, not resp.will_close)
+            return True, connect_ms, ttfb_ms
+        except Exception:
+            if conn: conn.close()
+            return False, None, None
+
+    def _run(self):
+        while not self._stop.is_set():
+            ok, connect_ms, ttfb_ms = self.probe()
+            self.samples.append((time.time(), connect_ms, ttfb_ms, ok))
+            if ok:
+                self.failures = 0; self.last_ttfb_ms = ttfb_ms; self.last_ok_at = time.time()
+                if connect_ms is not None: self.last_connect_ms = connect_ms
+            else: self.failures += 1
+            self._update_status()
+            self._stop.wait(self.interval)
+
+    def _update_status(self):
+        recent = sorted(t for _, _, t, ok in list(self.samples)[-5:] if ok)
+        median = recent[len(recent) // 2] if recent else None
+        if self.failures >= self.fail_threshold: status, detail = "Offline", f"{self.failures} failed probes"
+        elif self.failures and self.status == "Offline": status, detail = "Offline", self.detail  # recovery needs a success
+        elif self.failures: status, detail = "Degraded", f"{self.failures} failed probe{'s' if self.failures > 1 else ''}"
+        elif median is not None and median > self.degraded_ms: status, detail = "Degraded", f"TTFB {median:.0f} ms"
+        else: status, detail = "Online", ""
+        if (status, detail) != (self.status, self.detail):
+            self.status, self.detail = status, detail
+            if self.on_change: self.on_change(status, detail)
+
+# --- Restart supervision for api.exe ---
+class ApiSupervisor:
+    """Keeps api.exe running and records every outage.
+
+    `launch()` starts the process and returns its Popen (or None). The supervisor thread
+    restarts it when it exits, when the prober reports Offline after it had been ready
+    (hung), or when it is not answering `ready_timeout` seconds after launch. Restarts back
+    off exponentially; `crash_limit` restarts within `crash_window` seconds is a crash loop
+    and waits `backoff_max` between attempts. An incident opens at the first failure and
+    closes when a probe succeeds again; each one is appended to `incidents_path` as a JSON
+    line with its time to recovery.
+    """
+    def __init__(self, launch, prober, incidents_path=None, backoff_initial=1.0, backoff_max=60.0,
+                 crash_window=300, crash_limit=5, ready_timeout=30, on_event=None):
+        self.launch = launch
+        self.prober = prober
+        self.incidents_path = incidents_path
+        self.backoff_initial, self.backoff_max = backoff_initial, backoff_max
+        self.crash_window, self.crash_limit = crash_window, crash_limit
+        self.ready_timeout = ready_timeout
+        self.on_event = on_event
+        self.proc = None
+        self.ready = False
+        self.crash_loop = False
+        self.incident = None
+        self.incidents = self._load_incidents()
+        self._backoff = backoff_initial
+        self._restarts = collections.deque()
+        self._next_start = 0
+        self._launched_at = 0
+        self._restart_requested = None
+        self._running = False
+        self._wake = threading.Event()
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self._running = False; self._wake.set()
+        if self.proc and self.proc.poll() is None: self.proc.terminate()
+
+    def restart(self, cause="manual restart"):
+        """Asks the supervisor thread to restart api.exe now, without backoff."""
+        self._restart_requested = cause; self._wake.set()
+
+    def _run(self):
+        while self._running:
+            try: self._tick()
+            except Exception as e: print(f"Error supervising api.exe: {e}")
+            self._wake.wait(0.5); self._wake.clear()
+
+    def _tick(self):
+        now, proc = time.time(), self.proc
+        if self._restart_requested:
+            self._open_incident(self._restart_requested); self._restart_requested = None
+            self._kill(); self._next_start = 0
+        elif proc is not None and proc.poll() is not None:
+            self.proc = None
+            self._open_incident(f"exited with code {proc.returncode}"); self._schedule_restart()
+        elif proc is not None and not self.ready:
+            if self.prober.last_ok_at > self._launched_at: self._on_ready()
+            elif now - self._launched_at > self.ready_timeout:
+                self._open_incident(f"not answering {self.ready_timeout} s after launch"); self._kill(); self._schedule_restart()
+        elif proc is not None and self.prober.status == "Offline":
+            self._open_incident("stopped answering"); self._kill(); self._schedule_restart()
+        if self.proc is None and self._running and time.time() >= self._next_start: self._launch()
+
+    def _launch(self):
+        self._launched_at, self.ready = time.time(), False
+        if self.incident: self.incident['restarts'] += 1
+        self.proc = self.launch()
+        if self.proc is None: self._open_incident("failed to start"); self._schedule_restart()
+
+    def _kill(self):
+        proc, self.proc, self.ready = self.proc, None, False
+        if not proc or proc.poll() is not None: return
+        proc.terminate()
+        try: proc.wait(5)
+        except subprocess.TimeoutExpired: proc.kill()
+
+    def _schedule_restart(self):
+        now = time.time()
+        self._restarts.append(now)
+        while self._restarts and self._restarts[0] < now - self.crash_window: self._restarts.popleft()
+        if len(self._restarts) >= self.crash_limit:
+            delay = self.backoff_max
+            if not self.crash_loop: print(f"api.exe crash loop: {len(self._restarts)} restarts in {self.crash_window} s")
+            self.crash_loop = True
+        else: delay, self._backoff = self._backoff, min(self._backoff * 2, self.backoff_max)
+        self._next_start = now + delay
+        self._emit("Offline", f"{'crash loop, ' if self.crash_loop else ''}restart in {delay:.0f} s")
+
+    def _on_ready(self):
+        self.ready, self.crash_loop, self._backoff = True, False, self.backoff_initial
+        self._emit(self.prober.status, self.prober.detail)
+        if not self.incident: return
+        inc, self.incident = self.incident, None
+        inc['end'] = time.time(); inc['ttr_s'] = round(inc['end'] - inc['start'], 3)
+        self.incidents.append(inc)
+        print(f"api.exe recovered after {inc['ttr_s']:.1f} s ({inc['cause']}, {inc['restarts']} restarts)")
+        if self.incidents_path:
+            try:
+                with open(self.incidents_path, 'a', encoding='utf-8') as f: f.write(json.dumps(inc) + "\n")
+            except Exception as e: print(f"Error writing API incident log: {e}")
+
+    def _open_incident(self, cause):
+        if self.incident is None:
+            self.incident = {'start': time.time(), 'cause': cause, 'restarts': 0}
+            print(f"api.exe incident: {cause}")
+        self._emit("Offline", cause)
+
+    def _emit(self, status, detail):
+        if self.on_event: self.on_event(status, detail)
+
+    def _load_incidents(self):
+        if not self.incidents_path or not os.path.exists(self.incidents_path): return []
+        try:
+            with open(self.incidents_path, 'r', encoding='utf-8') as f: return [json.loads(l) for l in f if l.strip()]
+        except Exception: return []
+
+    def downtime(self, since):
+        """(incident count, seconds of downtime) since a unix time, counting an open incident up to now."""
+        spans = [(i['start'], i['end']) for i in self.incidents if i['end'] >= since]
+        if self.incident: spans.append((self.incident['start'], time.time()))
+        return len(spans), sum(end - max(start, since) for start, end in spans)
+
+# --- ADB smart-socket client ---
+class AdbError(Exception):
+    """Raised when the adb server answers FAIL or breaks the protocol."""
+
+def adb_quote(arg):
+    return "'" + str(arg).replace("'", "'\\''") + "'"
+
+class AdbClient:
+    """Talks to the adb server's smart-socket protocol on 127.0.0.1:5037 instead of spawning adb.exe.
+
+    Requests are a 4-hex-digit length plus the service name; the server answers OKAY or
+    FAIL plus a length-prefixed message. Device services first switch the socket to the
+    device with host:transport:<serial>. The server serves one service per socket, so
+    one-shot calls open a fresh local connection (cheap, and bounded by `timeout`); the
+    long-lived connections are the ones reused: a track-devices stream and a sync
+    session that carries any number of file transfers (`sync`).
+    """
+    STAGING_DIR = "/data/local/tmp/hhtconnect"
+
+    def __init__(self, host='127.0.0.1', port=5037, timeout=10):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.no_multi_package = set()  # serials whose pm refused --multi-package
+
+    def _connect(self, timeout=None):
+        return socket.create_connection((self.host, self.port), timeout or self.timeout)
+
+    @staticmethod
+    def _send(sock, request):
+        data = request.encode('utf-8')
+        sock.sendall(b'%04x' % len(data) + data)
+
+    @staticmethod
+    def _recv(sock, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = sock.recv(n - len(buf))
+            if not chunk: raise AdbError("adb server closed the connection")
+            buf += chunk
+        return bytes(buf)
+
+    @classmethod
+    def _block(cls, sock):
+        return cls._recv(sock, int(cls._recv(sock, 4), 16)).decode('utf-8', errors='replace')
+
+    @classmethod
+    def _status(cls, sock):
+        status = cls._recv(sock, 4)
+        if status == b'OKAY': return
+        if status == b'FAIL': raise AdbError(cls._block(sock))
+        raise AdbError(f"unexpected adb reply {status!r}")
+
+    @staticmethod
+    def _read_all(sock):
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk: return b''.join(chunks)
+            chunks.append(chunk)
+
+    def _host(self, request, reply=True):
+        with self._connect() as sock:
+            self._send(sock, request); self._status(sock)
+            return self._block(sock) if reply else None
+
+    def _transport(self, serial, service, timeout=None):
+        sock = self._connect(timeout)
+        try:
+            self._send(sock, f"host:transport:{serial}"); self._status(sock)
+            self._send(sock, service); self._status(sock)
+            return sock
+        except Exception:
+            sock.close(); raise
+
+    @staticmethod
+    def parse_devices(text):
+        """[(serial, state)] from a host:devices payload."""
+        return [tuple(line.split('\t')[:2]) for line in text.splitlines() if '\t' in line]
+
+    def version(self): return int(self._host("host:version"), 16)
+    def devices(self): return self.parse_devices(self._host("host:devices"))
+    def kill_server(self): self._host("host:kill", reply=False)
+
+    def devices_long(self):
+        """[(serial, state, {usb, product, model, transport_id, ...})] from host:devices-l."""
+        out = []
+        for line in self._host("host:devices-l").splitlines():
+            parts = line.split()
+            if len(parts) >= 2: out.append((parts[0], parts[1], dict(p.split(':', 1) for p in parts[2:] if ':' in p)))
+        return out
+
+    def track_devices(self):
+        """Yields the full [(serial, state)] list on subscribe and on every change, until closed."""
+        sock = self._connect()
+        try:
+            self._send(sock, "host:track-devices"); self._status(sock)
+            sock.settimeout(None)
+            while True: yield self.parse_devices(self._block(sock))
+        finally: sock.close()
+
+    def shell(self, serial, command, timeout=None):
+        with self._transport(serial, f"shell:{command}", timeout) as sock:
+            return self._read_all(sock).decode('utf-8', errors='replace').replace('\r\n', '\n')
+
+    def reverse(self, serial, remote, local):
+        with self._transport(serial, f"reverse:forward:{remote};{local}") as sock: self._status(sock)
+
+    def reverse_remove(self, serial, remote):
+        with self._transport(serial, f"reverse:killforward:{remote}") as sock: self._status(sock)
+
+    def sync(self, serial, timeout=None):
+        return AdbSync(self._transport(serial, "sync:", timeout))
+
+    def push(self, serial, local, remote, mode=0o644):
+        with self.sync(serial) as sync: sync.push(local, remote, mode)
+
+    def install(self, serial, apk_path, args="-r"):
+        """Pushes the APK to /data/local/tmp, runs pm install and removes it. Returns pm's output."""
+        remote = "/data/local/tmp/" + os.path.basename(apk_path)
+        self.push(serial, apk_path, remote)
+        try: return self.shell(serial, f"pm install {args} {adb_quote(remote)}", timeout=300)
+        finally:
+            try: self.shell(serial, f"rm -f {adb_quote(remote)}")
+            except Exception: pass
+
+    def install_session(self, serial, groups, args="-r", multi_package=True):
+        """Installs [[base.apk, split.apk, ...], ...] through pm install sessions.
+
+        Each inner list is one package (an install-multiple set); its files are streamed
+        once into the session with exec:pm install-write, with no staging copy to remove.
+        Several packages become children of one --multi-package session and commit as a
+        single transaction (Android 10+). If the device refuses that, or the atomic commit
+        fails, every package gets its own session so one bad APK cannot block the rest.
+        Returns ([(ok, output)] per group, [timings per session]) where each timings dict
+        has packages, files, bytes, create_s, push_s and commit_s.
+        """
+        sessions = []
+        if multi_package and len(groups) > 1 and serial not in self.no_multi_package:
+            try:
+                out = self._install_in_session(serial, groups, args, sessions, multi=True)
+                if "Success" in out: return [(True, out)] * len(groups), sessions
+                print(f"Multi-package commit on {serial} failed, retrying per package: {out.strip()}")
+            except (AdbError, OSError) as e:
+                if "--multi-package" in str(e): self.no_multi_package.add(serial)
+                print(f"Multi-package session on {serial} failed: {e}")
+        results = []
+        for group in groups:
+            try: out = self._install_in_session(serial, [group], args, sessions)
+            except (AdbError, OSError) as e: out = f"Failure [{e}]"
+            results.append(("Success" in out, out))
+        return results, sessions
+
+    def install_pipelined(self, serial, groups, args="-r", ahead=1):
+        """install_session's per-package path with pushing overlapped with committing.
+
+        A stager thread pushes each package's files into STAGING_DIR (see stage) up to
+        `ahead` packages in front, while this thread has pm read the previous package from
+        there and commit it, so USB transfers run while the device verifies and dexopts.
+        Staged files are removed once installed and kept after a failure, so a retry of the
+        same files pushes nothing. Returns the same shape as install_session; a session's
+        bytes are what was actually pushed and push_s includes staging.
+        """
+        staged = queue.Queue(maxsize=max(1, ahead))
+
+        def stager():
+            for group in groups:
+                t0, remotes, pushed, error = time.perf_counter(), [], 0, None
+                try:
+                    for path in group:
+                        remote, n = self.stage(serial, path); remotes.append((remote, os.path.getsize(path))); pushed += n
+                except (AdbError, OSError) as e: error = e
+                staged.put((remotes, pushed, time.perf_counter() - t0, error))
+
+        threading.Thread(target=stager, daemon=True).start()
+        results, sessions = [], []
+        for _ in groups:
+            remotes, pushed, push_s, error = staged.get()
+            if error: results.append((False, f"Failure [{error}]")); continue
+            count = len(sessions)
+            try: out = self.install_staged(serial, remotes, args, sessions)
+            except (AdbError, OSError) as e: out = f"Failure [{e}]"
+            if len(sessions) > count: sessions[-1].update(bytes=pushed, push_s=push_s + sessions[-1]['push_s'])
+            results.append(("Success" in out, out))
+        return results, sessions
+
+    def install_staged(self, serial, remotes, args="-r", sessions=None):
+        """Installs one package from files already staged ([(remote path, size)]) and removes them on success. Returns pm's output."""
+        sizes = dict(remotes)
+        write = lambda sid, remote, name: self.shell(serial, f"pm install-write -S {sizes[remote]} {sid} {adb_quote(name)} {adb_quote(remote)}")
+        out = self._install_in_session(serial, [list(sizes)], args, [] if sessions is None else sessions, write=write)
+        if "Success" in out:
+            try: self.shell(serial, "rm -f " + ' '.join(f"{adb_quote(r)} {adb_quote(r + '.staged')}" for r in sizes))
+            except (AdbError, OSError): pass
+        return out
+
+    def stage(self, serial, local, staging_dir=None):
+        """Pushes `local` into `staging_dir` (STAGING_DIR) unless a copy with the same size and mtime is there. Returns (remote path, bytes pushed)."""
+        st = os.stat(local)
+        remote = f"{staging_dir or self.STAGING_DIR}/{os.path.basename(local)}"
+        with self.sync(serial) as sync:
+            _, size, mtime = sync.stat(remote)
+            if size == st.st_size and mtime == int(st.st_mtime): return remote, 0
+            sync.push(local, remote, mtime=int(st.st_mtime))
+        self.shell(serial, f"touch {adb_quote(remote + '.staged')}")  # when it was staged, for clean_staging
+        return remote, st.st_size
+
+    def clean_staging(self, serial, max_age_days=1):
+        """Removes staged APKs left behind by failed installs once they were staged over `max_age_days` ago.
+
+        A staged copy carries the local file's mtime (stage compares it), so the age comes from
+        the .staged marker touched when it was pushed.
+        """
+        self.shell(serial, f"find {self.STAGING_DIR} -type f -name '*.staged' -mtime +{max_age_days} | "
+                           "while read -r m; do rm -f \"$m\" \"${m%.staged}\"; done")
+
+    def _create_session(self, serial, args):
+        out = self.shell(serial, f"pm install-create {args}")
+        m = re.search(r'\[(\d+)\]', out)
+        if not m: raise AdbError(out.strip() or "pm install-create failed")
+        return m.group(1)
+
+    def _install_in_session(self, serial, groups, args, sessions, multi=False, write=None):
+        t = {'packages': len(groups), 'files': sum(len(g) for g in groups), 'bytes': 0, 'create_s': 0.0, 'push_s': 0.0, 'commit_s': 0.0}
+        t0 = time.perf_counter()
+        created = []
+        try:
+            parent = self._create_session(serial, f"--multi-package {args}") if multi else None
+            if parent: created.append(parent)
+            children = []
+            for _ in groups: children.append(self._create_session(serial, args)); created.append(children[-1])
+            t1 = time.perf_counter(); t['create_s'] = t1 - t0
+            sessions.append(t)
+            for sid, paths in zip(children, groups):
+                for i, path in enumerate(paths):
+                    name = f"{i}_{os.path.basename(path)}"
+                    if write: self._check_write(write(sid, path, name), name)
+                    else: t['bytes'] += self._write_session(serial, sid, path, name)
+            if parent: self.shell(serial, f"pm install-add-session {parent} {' '.join(children)}")
+            t2 = time.perf_counter(); t['push_s'] = t2 - t1
+            out = self.shell(serial, f"pm install-commit {parent or children[0]}", timeout=300)
+            t['commit_s'] = time.perf_counter() - t2
+            if "Success" in out: created = []
+            return out
+        finally:
+            for sid in reversed(created):
+                try: self.shell(serial, f"pm install-abandon {sid}")
+                except (AdbError, OSError): pass
+
+    def _write_session(self, serial, session, path, name):
+        size = os.path.getsize(path)
+        with self._transport(serial, f"exec:pm install-write -S {size} {session} {adb_quote(name)} -", timeout=300) as sock:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(AdbSync.CHUNK)
+                    if not chunk: break
+                    sock.sendall(chunk)
+            self._check_write(self._read_all(sock).decode('utf-8', errors='replace'), name)
+        return size
+
+    @staticmethod
+    def _check_write(out, name):
+        if "Success" not in out: raise AdbError(out.strip() or f"install-write of {name} failed")
+
+class AdbSync:
+    """One sync: session; file operations reuse the connection until close()."""
+    CHUNK = 65536
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+    def _request(self, cmd, payload):
+        self.sock.sendall(cmd + struct.pack('<I', len(payload)) + payload)
+
+    def push(self, local, remote, mode=0o644, mtime=None):
+        self._request(b'SEND', f"{remote},{mode}".encode('utf-8'))
+        with open(local, 'rb') as f:
+            while True:
+                chunk = f.read(self.CHUNK)
+                if not chunk: break
+                self._request(b'DATA', chunk)
+        self.sock.sendall(b'DONE' + struct.pack('<I', int(mtime if mtime is not None else os.path.getmtime(local))))
+        reply = AdbClient._recv(self.sock, 8)
+        if reply[:4] == b'FAIL': raise AdbError(AdbClient._recv(self.sock, struct.unpack('<I', reply[4:])[0]).decode('utf-8', errors='replace'))
+        if reply[:4] != b'OKAY': raise AdbError(f"unexpected sync reply {reply[:4]!r}")
+
+    def stat(self, remote):
+        """(mode, size, mtime) of a device path; all zero if it does not exist."""
+        self._request(b'STAT', remote.encode('utf-8'))
+        reply = AdbClient._recv(self.sock, 16)
+        if reply[:4] != b'STAT': raise AdbError(f"unexpected sync reply {reply[:4]!r}")
+        return struct.unpack('<III', reply[4:])
+
+    def close(self):
+        try: self._request(b'QUIT', b'')
+        except OSError: pass
+        self.sock.close()
+
+# --- Installed package versions per device ---
+class DevicePackageCache:
+    """Per-serial {package: versionCode} filled by one `pm list packages --show-versioncode`.
+
+    Concurrent lookups for the same device share a single fetch. Entries are updated on
+    install and uninstall, and the whole device is invalidated after a failed install, on
+    (re)connect or after `max_age` seconds, which also covers changes made on the device
+    itself. Devices whose pm lacks --show-versioncode (before Android 9) fall back to one
+    `dumpsys package` per package, cached the same way. base_hash() adds the SHA-256 of an
+    installed base.apk, computed on the device and cached per (package, versionCode).
+    """
+    LINE_RE = re.compile(r'^package:(\S+)\s+versionCode:(\d+)', re.M)
+    DUMPSYS_RE = re.compile(r'versionCode=(\d+)')
+
+    def __init__(self, adb, max_age=300):
+        self.adb = adb
+        self.max_age = max_age
+        self.fetches = 0
+        self._versions = {}  # serial -> (fetched_at, {package: versionCode}, batched)
+        self._hashes = {}    # (serial, package, versionCode) -> sha256 of the installed base.apk
+        self._locks = collections.defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+
+    def _entry(self, serial):
+        with self._lock: lock = self._locks[serial]
+        with lock:
+            entry = self._versions.get(serial)
+            if entry and time.monotonic() - entry[0] < self.max_age: return entry
+            out = self.adb.shell(serial, "pm list packages --show-versioncode")
+            self.fetches += 1
+            versions = {p: int(v) for p, v in self.LINE_RE.findall(out)}
+            entry = (time.monotonic(), versions, bool(versions) or not out.strip())
+            self._versions[serial] = entry
+            return entry
+
+    def prime(self, serial):
+        """Fetches the device's package list ahead of its first lookup."""
+        self._entry(serial)
+
+    def version(self, serial, package):
+        """Installed versionCode of `package` on the device, 0 if it is not installed."""
+        _, versions, batched = self._entry(serial)
+        if package in versions: return versions[package]
+        if batched: return 0
+        m = self.DUMPSYS_RE.search(self.adb.shell(serial, f"dumpsys package {adb_quote(package)}"))
+        versions[package] = int(m.group(1)) if m else 0
+        return versions[package]
+
+    def base_hash(self, serial, package):
+        """SHA-256 (hex) of the package's installed base.apk via `pm path` and `sha256sum`, or None."""
+        key = (serial, package, self.version(serial, package))
+        with self._lock: digest = self._hashes.get(key)
+        if digest or not key[2]: return digest
+        paths = [l[8:].strip() for l in self.adb.shell(serial, f"pm path {adb_quote(package)}").splitlines() if l.startswith("package:")]
+        base = next((p for p in paths if p.endswith("/base.apk")), paths[0] if paths else None)
+        if not base: return None
+        m = re.match(r'([0-9a-f]{64})\s', self.adb.shell(serial, f"sha256sum {adb_quote(base)}", timeout=120))
+        if not m: return None
+        with self._lock: self._hashes[key] = m.group(1)
+        return m.group(1)
+
+    def installed(self, serial, package, version_code, sha256=None):
+        with self._lock:
+            entry = self._versions.get(serial)
+            if sha256: self._hashes[(serial, package, version_code)] = sha256
+        if entry: entry[1][package] = version_code
+
+    def uninstalled(self, serial, package):
+        with self._lock: entry = self._versions.get(serial)
+        if entry: entry[1][package] = 0
+
+    def invalidate(self, serial=None):
+        with self._lock:
+            if serial is None: self._versions.clear(); self._hashes.clear()
+            else:
+                self._versions.pop(serial, None)
+                for key in [k for k in self._hashes if k[0] == serial]: del self._hashes[key]
+
+# --- APK manifest (binary XML) ---
+AXML_STRING_POOL, AXML_RESOURCE_MAP, AXML_START_ELEMENT = 0x0001, 0x0180, 0x0102
+AXML_VERSION_CODE_ID, AXML_VERSION_NAME_ID = 0x0101021b, 0x0101021c
+
+def _axml_string(data, pool, index):
+    count, flags, strings_start, base = pool
+    if not 0 <= index < count: return None
+    pos = base + strings_start + struct.unpack_from('<I', data, base + 28 + index * 4)[0]
+    if flags & 0x100:  # UTF-8: utf-16 length, then byte length, each 1 or 2 bytes
+        pos += 2 if data[pos] & 0x80 else 1
+        n = data[pos]
+        if n & 0x80: n = (n & 0x7f) << 8 | data[pos + 1]; pos += 1
+        return data[pos + 1:pos + 1 + n].decode('utf-8', 'replace')
+    n = struct.unpack_from('<H', data, pos)[0]
+    if n & 0x8000: n = (n & 0x7fff) << 16 | struct.unpack_from('<H', data, pos + 2)[0]; pos += 2
+    return data[pos + 2:pos + 2 + n * 2].decode('utf-16-le', 'replace')
+
+def read_apk_manifest(path):
+    """(package, versionCode, versionName, split) from an APK without loading the rest of it.
+
+    zipfile locates AndroidManifest.xml through the central directory and inflates only
+    that entry; the binary XML is then walked chunk by chunk until the first start tag
+    (<manifest>), decoding just the strings its attributes use. Attributes are matched by
+    name or, for stripped manifests, by their android: resource id. versionName is None
+    when it is a resource reference; split is the split name of a split APK, None for a
+    base APK. Raises ValueError on anything malformed.
+    """
+    with zipfile.ZipFile(path) as z: data = z.read('AndroidManifest.xml')
+    try:
+        kind, header, size = struct.unpack_from('<HHI', data, 0)
+        if kind != 0x0003: raise ValueError("not a binary XML manifest")
+        pool, res_ids, pos, end = None, (), header, min(size, len(data))
+        while pos + 8 <= end:
+            kind, header, size = struct.unpack_from('<HHI', data, pos)
+            if size < 8: break
+            if kind == AXML_STRING_POOL:
+                count, _, flags, strings_start = struct.unpack_from('<IIII', data, pos + 8)
+                pool = (count, flags, strings_start, pos)
+            elif kind == AXML_RESOURCE_MAP:
+                res_ids = struct.unpack_from(f'<{(size - header) // 4}I', data, pos + header)
+            elif kind == AXML_START_ELEMENT:
+                if pool is None: break
+                attr_start, attr_size, attr_count = struct.unpack_from('<HHH', data, pos + header + 8)
+                found = {}
+                for i in range(attr_count):
+                    _, name, raw, _, _, vtype, value = struct.unpack_from('<IIIHBBI', data, pos + header + attr_start + i * attr_size)
+                    rid = res_ids[name] if name < len(res_ids) else 0
+                    key = {AXML_VERSION_CODE_ID: 'versionCode', AXML_VERSION_NAME_ID: 'versionName'}.get(rid) or _axml_string(data, pool, name)
+                    if vtype == 0x03: found[key] = _axml_string(data, pool, value)
+                    elif vtype in (0x10, 0x11): found[key] = value
+                    elif raw != 0xffffffff: found[key] = _axml_string(data, pool, raw)
+                    else: found[key] = None
+                package, code = found.get('package'), found.get('versionCode')
+                if not package: raise ValueError("manifest has no package")
+                if isinstance(code, str): code = int(code, 0)
+                if not isinstance(code, int): raise ValueError("manifest has no versionCode")
+                name, split = found.get('versionName'), found.get('split')
+                return package, code, name if isinstance(name, str) else None, split if isinstance(split, str) and split else None
+            pos += size
+    except (struct.error, IndexError) as e: raise ValueError(f"truncated manifest: {e}")
+    raise ValueError("manifest has no start tag")
+
+def _der_element(data, pos):
+    # (content_start, content_end) of the DER element at pos (definite lengths only).
+    n = data[pos + 1]; pos += 2
+    if n & 0x80:
+        k = n & 0x7f; n = int.from_bytes(data[pos:pos + k], 'big'); pos += k
+    return pos, pos + n
+
+def _zip_central_directory_offset(f):
+    f.seek(0, os.SEEK_END); size = f.tell()
+    f.seek(max(0, size - 65557)); tail = f.read()
+    eocd = tail.rfind(b'PK\x05\x06')
+    if eocd < 0 or eocd + 22 > len(tail): raise ValueError("no end of central directory")
+    return struct.unpack_from('<I', tail, eocd + 16)[0]
+
+def apk_signer_digest(path):
+    """SHA-256 (hex) of the APK's first signing certificate, or None if it is unsigned.
+
+    Reads the v3/v2 APK Signing Block just before the central directory when there is one,
+    otherwise the PKCS#7 block of the v1 (JAR) signature under META-INF/.
+    """
+    with open(path, 'rb') as f:
+        cd = _zip_central_directory_offset(f)
+        if cd >= 24:
+            f.seek(cd - 24); footer = f.read(24)
+            if footer[8:] == b'APK Sig Block 42':
+                size = struct.unpack_from('<Q', footer)[0]
+                f.seek(cd - size - 8); block = f.read(size - 16)
+                pairs, pos = {}, 8
+                while pos + 12 <= len(block):
+                    n, pid = struct.unpack_from('<QI', block, pos)
+                    pairs[pid] = block[pos + 12:pos + 8 + n]; pos += 8 + n
+                value = pairs.get(0xf05368c0) or pairs.get(0x7109871a)  # v3, then v2
+                if value:
+                    # signers -> signers[0] -> signed data -> digests (skipped) -> certificates -> certificates[0], each u32-length-prefixed
+                    d = struct.unpack_from('<I', value, 12)[0]
+                    n = struct.unpack_from('<I', value, 20 + d)[0]
+                    return hashlib.sha256(value[24 + d:24 + d + n]).hexdigest()
+    with zipfile.ZipFile(path) as z:
+        name = next((n for n in z.namelist() if n.upper().startswith('META-INF/') and n.upper().endswith(('.RSA', '.DSA', '.EC'))), None)
+        if name is None: return None
+        data = z.read(name)
+    # ContentInfo { oid, [0] SignedData { version, digestAlgorithms, contentInfo, [0] certificates { cert, ... } } }
+    pos = _der_element(data, 0)[0]
+    pos = _der_element(data, pos)[1]                      # skip contentType
+    pos = _der_element(data, pos)[0]                      # into [0] and SignedData
+    pos = _der_element(data, pos)[0]
+    for _ in range(3): pos = _der_element(data, pos)[1]  # skip version, digestAlgorithms, contentInfo
+    if data[pos] != 0xa0: return None
+    pos = _der_element(data, pos)[0]
+    return hashlib.sha256(data[pos:_der_element(data, pos)[1]]).hexdigest()
+
+# --- Parsed APK metadata cache ---
+class ApkMetadataIndex:
+    """SQLite cache of parsed APK metadata keyed by path, size and mtime.
+
+    lookup() returns the stored row while the file's size and mtime are unchanged, so
+    rescans on reconnect or restart skip parsing. With `hash_content`, a miss is retried
+    by SHA-256 so a re-copied but identical file still hits. Each call opens its own
+    short-lived connection, like ApiRequestStore's queries.
+    """
+    FIELDS = ('package', 'version_code', 'version_name', 'signer', 'sha256', 'split')
+
+    def __init__(self, db_path, hash_content=False):
+        self.db_path = db_path
+        self.hash_content = hash_content
+        self.hits = self.misses = 0
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        db = self._connect()
+        try:
+            columns = [row[1] for row in db.execute("PRAGMA table_info(apks)")]
+            if columns and 'split' not in columns: db.execute("DROP TABLE apks")  # rows from before split names were kept; reparse
+            db.execute("CREATE TABLE IF NOT EXISTS apks (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT, "
+                       "package TEXT, version_code INTEGER, version_name TEXT, signer TEXT, indexed_at REAL, split TEXT)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_apks_sha256 ON apks(sha256)")
+            gone = [(p,) for p, in db.execute("SELECT path FROM apks") if not os.path.exists(p)]
+            db.executemany("DELETE FROM apks WHERE path = ?", gone)
+            db.commit()
+        finally: db.close()
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=5)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    @staticmethod
+    def file_sha256(path):
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''): h.update(chunk)
+        return h.hexdigest()
+
+    def lookup(self, path):
+        """Stored metadata dict for an unchanged file, else None."""
+        st = os.stat(path)
+        db = self._connect()
+        try:
+            row = db.execute(f"SELECT {', '.join(self.FIELDS)} FROM apks WHERE path = ? AND size = ? AND mtime_ns = ?",
+                             (path, st.st_size, st.st_mtime_ns)).fetchone()
+            if row is None and self.hash_content:
+                sha = self.file_sha256(path)
+                row = db.execute(f"SELECT {', '.join(self.FIELDS)} FROM apks WHERE sha256 = ? AND size = ?", (sha, st.st_size)).fetchone()
+                if row: self._store(db, path, st, dict(zip(self.FIELDS, row)))
+        finally: db.close()
+        if row is None: self.misses += 1; return None
+        self.hits += 1
+        return dict(zip(self.FIELDS, row))
+
+    def content_hash(self, path):
+        """SHA-256 of the file, from the index while it is unchanged; computed and saved otherwise."""
+        st = os.stat(path)
+        db = self._connect()
+        try:
+            row = db.execute("SELECT sha256 FROM apks WHERE path = ? AND size = ? AND mtime_ns = ?", (path, st.st_size, st.st_mtime_ns)).fetchone()
+            if row and row[0]: return row[0]
+            sha = self.file_sha256(path)
+            if row: db.execute("UPDATE apks SET sha256 = ? WHERE path = ?", (sha, path)); db.commit()
+            return sha
+        finally: db.close()
+
+    def store(self, path, meta):
+        st = os.stat(path)
+        if self.hash_content and not meta.get('sha256'): meta = dict(meta, sha256=self.file_sha256(path))
+        db = self._connect()
+        try: self._store(db, path, st, meta)
+        finally: db.close()
+
+    def _store(self, db, path, st, meta):
+        db.execute("INSERT OR REPLACE INTO apks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                   (path, st.st_size, st.st_mtime_ns, meta.get('sha256'), meta['package'], meta['version_code'],
+                    meta.get('version_name'), meta.get('signer'), time.time(), meta.get('split')))
+        db.commit()
+
+# --- APK install scheduling ---
+class ApkInstallScheduler:
+    """Parses dropped APKs on a small pool and installs them through one lane per device.
+
+    submit() queues a file. `parse(path)` -> (package, versionCode, split) runs on `parse_workers`
+    threads and raises with a short reason on failure. A parsed job fans out to the install
+    lane of every connected device (add_device / remove_device), or only to the serials it
+    was submitted for. A lane takes everything queued at the same priority, up to
+    `max_batch` jobs and waiting up to `batch_window` seconds while files are still being
+    parsed, and calls `install(serial, jobs)` -> [final status per job], one batch at a
+    time; lanes of different devices run in parallel. Jobs with no device wait in a single
+    holding queue for up to `device_wait` seconds. Every queue is ordered by priority: the
+    index of the first `priorities` pattern (fnmatch, case-insensitive) matching the file
+    name or, once parsed, the package. `on_status(job, msg)` and `on_done(job)` are called
+    from the worker threads with the submitted job; with several devices msg summarises them.
+    """
+    SAMPLES = 200
+
+    def __init__(self, parse, install, on_status, on_done, parse_workers=2, priorities=(), device_wait=10, max_batch=20, batch_window=1.0):
+        self.parse, self.install, self.on_status, self.on_done = parse, install, on_status, on_done
+        self.priorities = [p.strip().lower() for p in priorities if p.strip()]
+        self.device_wait = device_wait
+        self.max_batch, self.batch_window = max(1, max_batch), batch_window
+        self.parsing = 0
+        self.devices = []
+        self.running = True
+        self.generation = 0
+        self.in_flight = 0
+        self.parse_waits = collections.deque(maxlen=self.SAMPLES)    # submit -> parse start, seconds
+        self.install_waits = collections.deque(maxlen=self.SAMPLES)  # lane enqueue -> install start
+        self.install_times = collections.deque(maxlen=self.SAMPLES)
+        self._batch = None  # (started_at, jobs) while anything is in flight
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._parse_q = queue.PriorityQueue()
+        self._lanes = {}   # serial -> PriorityQueue
+        self._active = {}  # serial -> jobs in the running install batch
+        self._paused = set()
+        self._holding = collections.deque()
+        self._workers = [threading.Thread(target=self._parse_loop, daemon=True) for _ in range(max(1, parse_workers))]
+        self._workers.append(threading.Thread(target=self._hold_loop, daemon=True))
+        for t in self._workers: t.start()
+
+    def priority(self, *names):
+        for i, pat in enumerate(self.priorities):
+            if any(n and fnmatch.fnmatch(n.lower(), pat) for n in names): return i
+        return len(self.priorities)
+
+    def submit(self, path, iid, devices=None):
+        # Without `devices` the job targets the devices connected now; a device joining later queues its own job.
+        job = {'path': path, 'iid': iid, 'package': None, 'version': None, 'gen': self.generation, 'submitted': time.monotonic(),
+               'targets': list(devices) if devices else None, 'results': {}, 'pending': 0}
+        job['priority'] = self.priority(os.path.basename(path))
+        with self._cond:
+            if not job['targets']: job['targets'] = list(self.devices) or None
+            self.in_flight += 1
+            if self._batch is None: self._batch = [job['submitted'], 0]
+            self._batch[1] += 1
+        self._parse_q.put((job['priority'], next(self._seq), job))
+        return job
+
+    def add_device(self, serial):
+        with self._cond:
+            if serial not in self.devices: self.devices.append(serial)
+            self._cond.notify_all()
+
+    def remove_device(self, serial):
+        with self._cond:
+            if serial in self.devices: self.devices.remove(serial)
+
+    def pause(self, serials):
+        """Holds the lanes of `serials` (another installer is using the devices) and waits for their running batches."""
+        with self._cond:
+            self._paused.update(serials)
+            while any(s in self._active for s in serials): self._cond.wait()
+
+    def resume(self, serials):
+        with self._cond: self._paused.difference_update(serials); self._cond.notify_all()
+
+    def cancel_all(self):
+        """Drops every queued job (the monitor list was cleared); running installs finish."""
+        with self._cond: self.generation += 1; self._cond.notify_all()
+
+    def stop(self):
+        self.running = False
+        self.cancel_all()
+        for _ in self._workers: self._parse_q.put((-1, -1, None))
+        for lane in list(self._lanes.values()): lane.put((-1, -1, None))
+
+    def stats(self):
+        with self._cond:
+            return {'parse_queue': self._parse_q.qsize(), 'holding': len(self._holding), 'in_flight': self.in_flight,
+                    'lanes': {serial: lane.qsize() for serial, lane in self._lanes.items()}, 'active': dict(self._active),
+                    'parse_wait_p50': self._p50(self.parse_waits), 'install_wait_p50': self._p50(self.install_waits),
+                    'install_wait_max': max(self.install_waits, default=0.0), 'install_p50': self._p50(self.install_times)}
+
+    @staticmethod
+    def _p50(samples):
+        return sorted(samples)[len(samples) // 2] if samples else 0.0
+
+    @staticmethod
+    def summary(job):
+        """Status text for a job installed on several devices."""
+        results, n = job['results'], len(job['results']) + job['pending']
+        if job['pending']: return f"Installing... ({len(results)}/{n} devices)"
+        errors = [(s, m) for s, m in results.items() if m.startswith("Error")]
+        if errors: return f"Error: {len(errors)}/{n} failed ({errors[0][0]}: {errors[0][1][7:]})"
+        installed = sum(1 for m in results.values() if m.startswith("Success"))
+        return f"Success ({installed}/{n} devices)" if installed else f"Skipped (up to date on {n} devices)"
+
+    def summary_of(self, jobs):
+        """Status text for several jobs of one file (queued again for devices that joined), merged per device."""
+        merged = {'results': {}, 'pending': 0}
+        with self._cond:
+            for job in jobs: merged['results'].update(job['results']); merged['pending'] += job['pending']
+        return self.summary(merged)
+
+    def _live(self, job):
+        return self.running and job['gen'] == self.generation
+
+    def _finish(self, job, msg=None):
+        if msg and self._live(job): self.on_status(job, msg)
+        with self._cond:
+            self.in_flight -= 1
+            batch = self._batch if self.in_flight == 0 else None
+            if batch: self._batch = None
+        if self._live(job): self.on_done(job)
+        if batch:
+            s = self.stats()
+            print(f"APK batch: {batch[1]} file(s) in {time.monotonic() - batch[0]:.1f}s, parse wait p50 {s['parse_wait_p50']:.2f}s, "
+                  f"install wait p50 {s['install_wait_p50']:.2f}s / max {s['install_wait_max']:.1f}s, install p50 {s['install_p50']:.2f}s")
+
+    def _finish_on(self, child, msg):
+        # One device's result; the job finishes with the last of its devices.
+        job = child['job']
+        with self._cond:
+            job['results'][child['serial']] = msg or "Error: Cancelled"
+            job['pending'] -= 1
+            done, multi = job['pending'] == 0, len(job['results']) + job['pending'] > 1
+        if not done:
+            if self._live(job): self.on_status(job, self.summary(job))
+        else: self._finish(job, self.summary(job) if multi else msg)
+
+    def _parse_loop(self):
+        while True:
+            _, _, job = self._parse_q.get()
+            if job is None: return
+            if not self._live(job): self._finish(job); continue
+            self.parse_waits.append(time.monotonic() - job['submitted'])
+            self.on_status(job, "Checking...")
+            with self._cond: self.parsing += 1
+            try:
+                try: job['package'], job['version'], job['split'] = self.parse(job['path'])
+                except Exception as e: self._finish(job, f"Error: {e}"); continue
+                job['priority'] = self.priority(os.path.basename(job['path']), job['package'])
+                self._route(job)
+            finally:
+                with self._cond: self.parsing -= 1
+
+    def _route(self, job, hold=True):
+        with self._cond:
+            targets = [s for s in (job['targets'] or self.devices) if s in self.devices]
+            if not targets and hold and not job['targets']:
+                job['deadline'] = time.monotonic() + self.device_wait
+                self._holding.append(job); self._cond.notify_all()
+            if targets: job['targets'] = targets
+            job['pending'] = len(targets)
+            now = time.monotonic()
+            for serial in targets:
+                self._lane(serial).put((job['priority'], next(self._seq), {'job': job, 'serial': serial, 'queued': now}))
+        if targets: self.on_status(job, "Queued" if len(targets) == 1 else f"Queued on {len(targets)} devices")
+        elif job['targets'] or not hold: self._finish(job, "Error: No device")
+        else: self.on_status(job, "Waiting for device...")
+
+    def _lane(self, serial):
+        lane = self._lanes.get(serial)
+        if lane is None:
+            lane = self._lanes[serial] = queue.PriorityQueue()
+            threading.Thread(target=self._lane_loop, args=(serial, lane), daemon=True).start()
+        return lane
+
+    def _hold_loop(self):
+        # Jobs enter holding in deadline order, so waiting on the oldest one is enough.
+        while True:
+            with self._cond:
+                while self.running and not self._holding: self._cond.wait()
+                if not self.running: return
+                job = self._holding[0]
+                while self._live(job) and not self.devices:
+                    left = job['deadline'] - time.monotonic()
+                    if left <= 0: break
+                    self._cond.wait(left)
+                self._holding.popleft()
+            if not self._live(job): self._finish(job)
+            else: self._route(job, hold=False)
+
+    def _gather(self, lane, first):
+        # Same-priority jobs already queued join the batch; while parsing is still feeding the
+        # lane, wait up to batch_window for more.
+        items, deadline = [first], time.monotonic() + self.batch_window
+        while len(items) < self.max_batch:
+            try:
+                left = deadline - time.monotonic()
+                item = lane.get(timeout=left) if left > 0 and (self.parsing or self._parse_q.qsize()) else lane.get_nowait()
+            except queue.Empty: break
+            if item[2] is None or item[0] != first[0]: lane.put(item); break
+            items.append(item)
+        return [item[2] for item in items]
+
+    def _lane_loop(self, serial, lane):
+        while True:
+            item = lane.get()
+            if item[2] is None: return
+            children = self._gather(lane, item)
+            with self._cond:
+                # A paused lane waits here; marking it active under the same lock lets pause() wait for running batches.
+                while self.running and serial in self._paused: self._cond.wait()
+                self._active[serial] = len(children)
+            batch = []
+            for child in children:
+                if not self._live(child['job']): self._finish_on(child, None)
+                elif serial not in self.devices: self._finish_on(child, "Error: Device disconnected")  # unplugged while queued
+                else: batch.append(child)
+            if not batch:
+                with self._cond: self._active.pop(serial, None); self._cond.notify_all()
+                continue
+            start = time.monotonic()
+            with self._cond: self._active[serial] = len(batch)
+            for child in batch: self.install_waits.append(start - child['queued'])
+            try: msgs = self.install(serial, [child['job'] for child in batch])
+            except Exception as e: msgs = [f"Error: {e}"] * len(batch)
+            with self._cond: self._active.pop(serial, None); self._cond.notify_all()
+            self.install_times.append((time.monotonic() - start) / len(batch))
+            for child, msg in zip(batch, msgs): self._finish_on(child, msg)
+
+# --- Fleet rollout ---
+class FleetRollout:
+    """Installs one set of packages onto many devices at once, within a USB bandwidth budget.
+
+    `packages` is [(package, versionCode, [apk paths])]. Every device gets a worker that
+    skips packages already at that version (DevicePackageCache) and installs the rest one
+    at a time: the files are pushed into STAGING_DIR (AdbClient.stage), then committed from
+    there. STAGING_DIR is a subdirectory of the scheduler's, so neither removes the other's
+    staged files; the App also pauses the scheduler's lanes for the devices while a rollout
+    runs. Only the push uses the bus, so only the push takes a slot on the device's hub:
+    `hubs` maps serial -> hub (see hub_of) and a hub has max(1, hub_mb_s // device_mb_s)
+    slots. A hub is kept full without every transfer on it slowing down, and commits run
+    beside other devices' pushes. A failed package is retried up to `retries` times, after
+    `retry_delay` seconds times the attempt; its staged files are kept, so a retry does not
+    push again. Progress is in `cells[(serial, index)]` (checking, queued, push, commit,
+    retry N, ok, skip, failed, cancelled), `errors` and stats().
+    """
+    DONE = ('ok', 'skip', 'failed', 'cancelled')
+    STAGING_DIR = AdbClient.STAGING_DIR + "/rollout"  # clean_staging's find covers it
+
+    def __init__(self, adb, cache, packages, devices, hubs=None, hub_mb_s=40, device_mb_s=20, retries=2, retry_delay=2.0, args="-r"):
+        self.adb, self.cache, self.args = adb, cache, args
+        self.packages, self.devices, self.hubs = list(packages), list(devices), dict(hubs or {})
+        self.slots_per_hub = max(1, int(hub_mb_s // max(device_mb_s, 1)))
+        self.retries, self.retry_delay = retries, retry_delay
+        self.cells = {(s, i): 'checking' for s in self.devices for i in range(len(self.packages))}
+        self.errors = {}     # (serial, index) -> last failure
+        self.finished = {}   # serial -> seconds from start until its last package was done
+        self.pushed = 0
+        self.retried = 0
+        self.cancelled = False
+        self.started = None
+        self._slots = {hub: threading.BoundedSemaphore(self.slots_per_hub) for hub in {self.hubs.get(s, 'usb') for s in self.devices}}
+        self._threads = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def hub_of(info):
+        """Hub of a devices_long() entry: its usb: port path minus the last port (the bus for a root port), 'usb' if unknown."""
+        usb = info.get('usb', '')
+        if not usb: return 'usb'  # adb on Windows reports no port path; all devices share one budget
+        return usb.rsplit('.', 1)[0] if '.' in usb else usb.split('-')[0]
+
+    @property
+    def running(self): return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        self.started = time.monotonic()
+        for serial in self.devices:
+            t = threading.Thread(target=self._device, args=(serial,), daemon=True); t.start(); self._threads.append(t)
+        return self
+
+    def wait(self, timeout=None):
+        for t in self._threads: t.join(timeout)
+
+    def cancel(self): self.cancelled = True
+
+    def stats(self):
+        with self._lock: finished = dict(self.finished)
+        states = list(self.cells.values())
+        if not self.started: elapsed = 0.0
+        elif len(finished) == len(self.devices): elapsed = max(finished.values(), default=0.0)
+        else: elapsed = time.monotonic() - self.started
+        return {'devices': len(self.devices), 'done': len(finished), 'elapsed': elapsed,
+                'devices_per_min': len(finished) * 60 / elapsed if elapsed else 0.0,
+                'pushing': states.count('push'), 'ok': states.count('ok'), 'skipped': states.count('skip'),
+                'failed': states.count('failed'), 'pushed_mb': self.pushed / 1048576, 'retried': self.retried}
+
+    def _device(self, serial):
+        slot = self._slots[self.hubs.get(serial, 'usb')]
+        todo = []
+        for i, (pkg, ver, _) in enumerate(self.packages):
+            try: installed = self.cache.version(serial, pkg)
+            except (AdbError, OSError): installed = 0
+            if installed >= ver: self.cells[(serial, i)] = 'skip'
+            else: self.cells[(serial, i)] = 'queued'; todo.append(i)
+        failed = []
+        for attempt in range(self.retries + 1):
+            failed = []
+            for i in todo:
+                if self.cancelled: self.cells[(serial, i)] = 'cancelled'
+                elif not self._install(serial, i, slot): failed.append(i)
+            if not failed or attempt == self.retries: break
+            with self._lock: self.retried += len(failed)
+            for i in failed: self.cells[(serial, i)] = f"retry {attempt + 1}"
+            time.sleep(self.retry_delay * (attempt + 1))
+            todo = failed
+        for i in failed: self.cells[(serial, i)] = 'failed'
+        with self._lock: self.finished[serial] = time.monotonic() - self.started
+
+    def _install(self, serial, i, slot):
+        pkg, ver, paths = self.packages[i]
+        try:
+            remotes = []
+            with slot:
+                self.cells[(serial, i)] = 'push'
+                for path in paths:
+                    remote, n = self.adb.stage(serial, path, self.STAGING_DIR); remotes.append((remote, os.path.getsize(path)))
+                    with self._lock: self.pushed += n
+            self.cells[(serial, i)] = 'commit'
+            out = self.adb.install_staged(serial, remotes, self.args)
+        except (AdbError, OSError) as e: out = f"Failure [{e}]"
+        if "Success" in out:
+            self.cache.installed(serial, pkg, ver); self.cells[(serial, i)] = 'ok'; self.errors.pop((serial, i), None)
+            return True
+        self.cache.invalidate(serial)
+        m = re.search(r'Failure \[(.*)\]', out)
+        self.errors[(serial, i)] = m.group(1) if m else (out.strip() or "Install Failed")
+        return False
+
 class App:
     
     APP_VERSION = "1.0.7" 
+    STARTUP_TAIL_LINES = 2000
+    STATS_WINDOWS = {'15 min': 900, '1 hour': 3600, '24 hours': 86400}
 
     def __init__(self, master, lock_file_path):
         import tkinter as tk
@@ -70,11 +2333,22 @@ class App:
         self.master = master
         self.tray_icon = None
         self.is_running = True
-        self.is_connecting = False # Flag to prevent spamming connections
+        self.connecting_devices = set() # Serials with a connect in progress (prevents spamming connections)
         self.api_process = None
         self.last_search_term = ""
         self.last_search_pos = "1.0"
         self.api_status = "Offline"
+        self.api_status_detail = ""
+        self.api_prober = None
+        self.api_supervisor = None
+        self.api_probe_port = 8000
+        self.api_probe_path = "/healthz"
+        self.api_probe_interval_ms = 2000
+        self.api_probe_degraded_ms = 500
+        self.api_probe_fail_threshold = 3
+        self.api_ready_timeout_s = 30
+        self._startup_t0 = time.perf_counter()
+        self.startup_marks = []
         self.lock_file_path = lock_file_path
         self.known_devices = set()
 
@@ -85,6 +2359,33 @@ class App:
         self.log_filepath = None
         self.log_dir = None
         self.current_log_date = None
+        self.api_log_writer = None
+        self.api_log_view = None
+        self.api_log_index = None
+        self.api_log_archive = None
+        self.api_log_archive_budget_mb = 1024
+        self.api_log_retention_days = 0
+        self.api_request_store = None
+        self.api_log_parser = FiberLogParser()
+        self.api_latency = LatencyHistograms()
+        self.history_window = None
+        self._stats_refresh_id = None
+        self.api_log_view_lines = 5000
+        self.api_log_frame_budget_ms = 12
+        self.api_log_format_sql = False
+        self.api_log_max_rate = 2000
+        self.api_log_collapse_repeats = True
+        self.api_log_throttle = None
+        self.api_log_queue = ApiLogQueue()
+        self._api_log_tick_id = None
+        self._api_log_tick_delay = 100
+        self._api_dispatch_lock = threading.Lock()  # throttle -> writer -> queue in order, from the reader and the tick
+        self._api_log_line_cost = 0.0005
+        self._api_log_rate = 0.0        # lines/s put into the view queue (counted at put time, before any drop)
+        self._api_log_shown_rate = 0.0  # lines/s drained into the widget
+        self._api_log_received = 0
+        self._api_log_tick_at = time.monotonic()
+        self._api_queue_label_at = 0
         self.zip_monitor_path = None
         self.zip_filename_prefix = "" 
         self.apk_monitor_path = None
@@ -98,7 +2399,25 @@ class App:
         
         self.apk_processed_count = 0
         self.apk_file_map = {}
+        self.apk_row_jobs = {}  # tree iid -> scheduler jobs queued for that row
         self.apk_processing_files = set()
+        self.apk_parse_workers = 2
+        self.apk_priorities = ""
+        self.apk_device_wait_s = 10
+        self.apk_scheduler = None
+        self.apk_hash_content = False
+        self.apk_batch_size = 20
+        self.apk_batch_window_ms = 1000
+        self.apk_install_mode = "session"
+        self.apk_compare_hash = False
+        self.apk_install_sessions = collections.deque(maxlen=50)
+        self.apk_index = None
+        self.rollout = None
+        self.rollout_busy = False  # set from the click until the rollout thread ends, so a second click can't start another
+        self.rollout_window = None
+        self.rollout_hub_mb_s = 40
+        self.rollout_device_mb_s = 20
+        self.rollout_retries = 2
         
         self.current_tab = "device"
         
@@ -152,6 +2471,11 @@ class App:
         self.style.map('Raised.TButton', background=[('active', self.COLOR_SHADOW_DARK)])
 
         self.ADB_PATH = self.get_adb_path()
+        self.adb = AdbClient()
+        self.device_packages = DevicePackageCache(self.adb)
+        self.device_states = {}
+        self._device_seen_at = {}
+        self.device_connect_times = collections.deque(maxlen=50)
         
         if not self.check_adb():
             messagebox.showerror("ADB Error", "Android Debug Bridge (ADB) not found.")
@@ -159,21 +2483,48 @@ class App:
             return
             
         self.start_adb_server()
-        self.connected_device = None
+        self.connected_devices = {} # serial -> connected at (monotonic); each has its own reverse tunnel and install lane
+        self.max_parallel_connects = 4
+        self._devices_lock = threading.Lock()
+        self.config_loaded = self._load_configs()
+        self._connect_slots = threading.Semaphore(max(1, self.max_parallel_connects))
+        self._mark_startup("configs")
+        self.apk_scheduler = ApkInstallScheduler(self._parse_apk, self._install_apks,
+                                                 on_status=lambda job, msg: self.master.after(0, self._update_apk_job_status, job, msg),
+                                                 on_done=lambda job: self.master.after(0, self._apk_job_done, job),
+                                                 parse_workers=self.apk_parse_workers, priorities=self.apk_priorities.split(','), device_wait=self.apk_device_wait_s,
+                                                 max_batch=self.apk_batch_size, batch_window=self.apk_batch_window_ms / 1000.0)
+        try: self.apk_index = ApkMetadataIndex(os.path.join(self.base_path, "log", "apk_index.db"), self.apk_hash_content)
+        except Exception as e: print(f"Error opening APK index: {e}")
 
         self.create_widgets()
         self.refresh_devices()
         self.update_tray_status()
+        self._mark_startup("widgets")
 
         self.monitor_thread = threading.Thread(target=self.device_monitor_loop, daemon=True)
         self.monitor_thread.start()
-        self.start_api_exe()
         self._setup_log_file()
-        self._periodic_log_save()
+        self._mark_startup("api log")
+        self.api_log_parser.ignore_paths = {self.api_probe_path}
+        self.api_prober = ApiHealthProber(port=self.api_probe_port, path=self.api_probe_path, interval=self.api_probe_interval_ms / 1000.0,
+                                          degraded_ms=self.api_probe_degraded_ms, fail_threshold=self.api_probe_fail_threshold,
+                                          on_change=lambda status, detail: self.master.after(0, self.set_api_status, status, detail))
+        self.api_prober.start()
+        self.api_supervisor = ApiSupervisor(self.start_api_exe, self.api_prober, os.path.join(self.log_dir, "api_incidents.jsonl") if self.log_dir else None,
+                                            ready_timeout=self.api_ready_timeout_s, on_event=lambda status, detail: self.master.after(0, self.set_api_status, status, detail))
+        self.api_supervisor.start()
         self._start_monitoring_services()
         self._scan_existing_apk_files()
         
         self.switch_tab('device')
+        self._mark_startup("init done")
+        self.master.after_idle(self._mark_startup, "first paint")
+
+    def _mark_startup(self, label, detail=""):
+        ms = (time.perf_counter() - self._startup_t0) * 1000
+        self.startup_marks.append((label, ms))
+        print(f"Startup: {label:<11} +{ms:7.1f} ms {detail}".rstrip())
 
     # ... (Notifications & Helper Methods) ...
     def show_notification(self, message, is_connected):
@@ -235,7 +2586,9 @@ class App:
         self.side_btn_zip.pack(fill='x')
         self.side_btn_apk = self.create_side_button(sidebar, "APK Monitor", lambda: self.switch_tab('apk'))
         self.side_btn_apk.pack(fill='x')
-        self.all_side_buttons = [self.side_btn_device, self.side_btn_api, self.side_btn_zip, self.side_btn_apk]
+        self.side_btn_stats = self.create_side_button(sidebar, "API Stats", lambda: self.switch_tab('stats'))
+        self.side_btn_stats.pack(fill='x')
+        self.all_side_buttons = [self.side_btn_device, self.side_btn_api, self.side_btn_zip, self.side_btn_apk, self.side_btn_stats]
 
         # Content Area
         self.content_area = tk.Frame(self.master, bg=self.COLOR_BG, width=430)
@@ -267,6 +2620,15 @@ class App:
         self.api_frame = tk.Frame(self.content_area, bg=self.COLOR_BG, **pad_cfg)
         self.api_frame.place(relwidth=1, relheight=1)
         self.api_frame.grid_rowconfigure(1, weight=1); self.api_frame.grid_columnconfigure(0, weight=1)
+        af = tk.Frame(self.api_frame, bg=self.COLOR_BG); af.grid(row=2, column=0, sticky='ew', pady=(4, 0))
+        self.api_queue_label = tk.Label(af, text="Queue: 0", font=('Segoe UI', 8), bg=self.COLOR_BG, fg=self.COLOR_TEXT, anchor='w'); self.api_queue_label.pack(side='left')
+        self.api_latency_label = tk.Label(self.api_frame, text="Latency: no requests yet", font=('Consolas', 8), bg=self.COLOR_BG, fg=self.COLOR_TEXT, anchor='w', justify='left')
+        self.api_latency_label.grid(row=3, column=0, sticky='ew', pady=(2, 0))
+        self.create_neumorphic_button(af, "History", self.open_log_history_search).pack(side='right')
+        self.search_regex_var = tk.BooleanVar(value=False); self.search_filter_var = tk.BooleanVar(value=False)
+        for text, var in (("Filter", self.search_filter_var), ("Regex", self.search_regex_var)):
+            tk.Checkbutton(af, text=text, variable=var, command=lambda: self._on_search_typed(0), font=('Segoe UI', 8), bg=self.COLOR_BG, fg=self.COLOR_TEXT, activebackground=self.COLOR_BG, selectcolor=self.COLOR_BG, bd=0).pack(side='right', padx=(0, 4))
+        self.search_match_label = tk.Label(af, text="", font=('Segoe UI', 8), bg=self.COLOR_BG, fg=self.COLOR_TEXT); self.search_match_label.pack(side='right', padx=(0, 6))
         ah = tk.Frame(self.api_frame, bg=self.COLOR_BG); ah.grid(row=0, column=0, sticky='ew', pady=(0, 10))
         ah.grid_columnconfigure(1, weight=1)
         self.api_status_dot = tk.Canvas(ah, width=10, height=10, bg=self.COLOR_BG, highlightthickness=0); self.api_status_dot.grid(row=0, column=0, sticky='w', pady=4)
@@ -279,6 +2641,11 @@ class App:
         self.api_log_text.pack(fill='both', expand=True, padx=2, pady=2)
         self.api_log_text.tag_config('search', background=self.COLOR_ACCENT, foreground='white')
         self.api_log_text.tag_config('current_search', background=self.COLOR_WARNING, foreground='black')
+        self.api_log_view = ApiLogView(self.api_log_text, self.api_log_view_lines, lambda: self.log_filepath)
+        self.api_log_highlighter = ApiLogHighlighter(self.api_log_text, self.api_log_view, on_done=lambda n, err: self.search_match_label.config(text=err or (f"{n} matches" if self.api_log_highlighter.query else "")))
+        search_input = self.search_entry.winfo_children()[0]
+        search_input.bind('<KeyRelease>', lambda e: self._on_search_typed() if e.keysym != 'Return' else None)
+        search_input.bind('<Return>', lambda e: self.search_api_logs())
 
         # Zip Frame
         self.zip_frame = tk.Frame(self.content_area, bg=self.COLOR_BG, **pad_cfg)
@@ -301,6 +2668,8 @@ class App:
         self.apk_frame.grid_rowconfigure(1, weight=1); self.apk_frame.grid_columnconfigure(0, weight=1)
         ah = tk.Frame(self.apk_frame, bg=self.COLOR_BG); ah.grid(row=0, column=0, sticky='ew', pady=(0, 10))
         self.apk_count_label = tk.Label(ah, text="Total APKs Processed: 0", font=('Segoe UI', 9, 'bold'), bg=self.COLOR_BG, fg=self.COLOR_TEXT); self.apk_count_label.pack(side='left')
+        self.create_neumorphic_button(ah, "Roll Out", self.start_fleet_rollout).pack(side='right', padx=(5, 0))
+        self.apk_queue_label = tk.Label(ah, text="", font=('Segoe UI', 8), bg=self.COLOR_BG, fg=self.COLOR_TEXT); self.apk_queue_label.pack(side='right')
         self.apk_tree = ttk.Treeview(self.apk_frame, columns=('filename', 'status'), show='headings')
         self.apk_tree.heading('filename', text='FILENAME', anchor='w'); self.apk_tree.column('filename', width=240)
         self.apk_tree.heading('status', text='STATUS', anchor='w'); self.apk_tree.column('status', width=100)
@@ -311,6 +2680,21 @@ class App:
         self.apk_tree.tag_configure('error', foreground=self.COLOR_DANGER, font=('Segoe UI', 9, 'bold'))
         self.apk_tree.tag_configure('skipped', foreground=self.COLOR_TEXT, font=('Segoe UI', 9, 'italic'))
 
+        # API Stats Frame
+        self.stats_frame = tk.Frame(self.content_area, bg=self.COLOR_BG, **pad_cfg)
+        self.stats_frame.place(relwidth=1, relheight=1)
+        self.stats_frame.grid_rowconfigure(1, weight=1); self.stats_frame.grid_columnconfigure(0, weight=1)
+        sh = tk.Frame(self.stats_frame, bg=self.COLOR_BG); sh.grid(row=0, column=0, sticky='ew', pady=(0, 10))
+        tk.Label(sh, text="Slowest endpoints, last", font=('Segoe UI', 9, 'bold'), bg=self.COLOR_BG, fg=self.COLOR_TEXT).pack(side='left')
+        self.stats_window = ttk.Combobox(sh, values=list(self.STATS_WINDOWS), state='readonly', width=8); self.stats_window.set('1 hour'); self.stats_window.pack(side='left', padx=5)
+        self.stats_window.bind('<<ComboboxSelected>>', lambda e: self.refresh_api_stats())
+        self.stats_tree = ttk.Treeview(self.stats_frame, columns=('route', 'count', 'avg', 'max'), show='headings')
+        self.stats_tree.heading('route', text='ENDPOINT', anchor='w'); self.stats_tree.column('route', width=200)
+        for col, title in (('count', 'REQS'), ('avg', 'AVG MS'), ('max', 'MAX MS')):
+            self.stats_tree.heading(col, text=title, anchor='e'); self.stats_tree.column(col, width=60, anchor='e')
+        self.stats_tree.grid(row=1, column=0, sticky='nsew')
+        self.stats_tree.tag_configure('errors', foreground=self.COLOR_DANGER)
+
     def switch_tab(self, tab_name):
         self.current_tab = tab_name
         for btn in self.all_side_buttons: btn.config(bg=self.COLOR_SIDEBAR_BTN_INACTIVE, fg=self.COLOR_SIDEBAR_TEXT_INACTIVE)
@@ -318,6 +2702,24 @@ class App:
         elif tab_name == 'api': self.api_frame.tkraise(); self.side_btn_api.config(bg=self.COLOR_SIDEBAR_BTN_ACTIVE, fg=self.COLOR_SIDEBAR_TEXT_ACTIVE)
         elif tab_name == 'zip': self.zip_frame.tkraise(); self.side_btn_zip.config(bg=self.COLOR_SIDEBAR_BTN_ACTIVE, fg=self.COLOR_SIDEBAR_TEXT_ACTIVE)
         elif tab_name == 'apk': self.apk_frame.tkraise(); self.side_btn_apk.config(bg=self.COLOR_SIDEBAR_BTN_ACTIVE, fg=self.COLOR_SIDEBAR_TEXT_ACTIVE)
+        elif tab_name == 'stats': self.stats_frame.tkraise(); self.side_btn_stats.config(bg=self.COLOR_SIDEBAR_BTN_ACTIVE, fg=self.COLOR_SIDEBAR_TEXT_ACTIVE); self.refresh_api_stats()
+
+    def refresh_api_stats(self):
+        # Runs the query off the Tk thread; re-arms itself every 5 s while the tab is visible.
+        if self.current_tab != 'stats' or not self.api_request_store: return
+        since = self.STATS_WINDOWS.get(self.stats_window.get(), 3600)
+        def worker():
+            try: rows = self.api_request_store.slowest_endpoints(since)
+            except Exception as e: print(f"Error querying API stats: {e}"); rows = []
+            self.master.after(0, self._update_stats_ui, rows)
+        threading.Thread(target=worker, daemon=True).start()
+        if self._stats_refresh_id: self.master.after_cancel(self._stats_refresh_id)
+        self._stats_refresh_id = self.master.after(5000, self.refresh_api_stats)
+
+    def _update_stats_ui(self, rows):
+        self.stats_tree.delete(*self.stats_tree.get_children())
+        for method, route, count, avg_ms, max_ms, errors in rows:
+            self.stats_tree.insert('', 'end', values=(f"{method} {route}", count, f"{avg_ms:.1f}", f"{max_ms:.1f}"), tags=('errors',) if errors else ())
 
     # --- Config & Monitoring ---
     def _load_configs(self):
@@ -330,115 +2732,280 @@ class App:
             self.apk_monitor_path = config['APK_INSTALLER']['MONITOR_PATH']
             try: self.zip_filename_prefix = config['SETTING']['ZIP_FILENAME_PREFIX']
             except KeyError: self.zip_filename_prefix = ""
+            self.api_log_view_lines = config.getint('API_LOG', 'VIEW_MAX_LINES', fallback=self.api_log_view_lines)
+            self.api_log_frame_budget_ms = config.getint('API_LOG', 'FRAME_BUDGET_MS', fallback=self.api_log_frame_budget_ms)
+            self.api_log_format_sql = config.getboolean('API_LOG', 'FORMAT_SQL', fallback=self.api_log_format_sql)
+            self.api_log_max_rate = config.getint('API_LOG', 'MAX_LINES_PER_SEC', fallback=self.api_log_max_rate)
+            self.api_log_collapse_repeats = config.getboolean('API_LOG', 'COLLAPSE_REPEATS', fallback=self.api_log_collapse_repeats)
+            self.api_log_archive_budget_mb = config.getint('API_LOG', 'ARCHIVE_BUDGET_MB', fallback=self.api_log_archive_budget_mb)
+            self.api_log_retention_days = config.getint('API_LOG', 'RETENTION_DAYS', fallback=self.api_log_retention_days)
+            self.api_probe_port = config.getint('API_HEALTH', 'PORT', fallback=self.api_probe_port)
+            self.api_probe_path = config.get('API_HEALTH', 'PATH', fallback=self.api_probe_path)
+            self.api_probe_interval_ms = config.getint('API_HEALTH', 'INTERVAL_MS', fallback=self.api_probe_interval_ms)
+            self.api_probe_degraded_ms = config.getint('API_HEALTH', 'DEGRADED_MS', fallback=self.api_probe_degraded_ms)
+            self.api_probe_fail_threshold = config.getint('API_HEALTH', 'FAIL_THRESHOLD', fallback=self.api_probe_fail_threshold)
+            self.api_ready_timeout_s = config.getint('API_HEALTH', 'READY_TIMEOUT_S', fallback=self.api_ready_timeout_s)
+            self.apk_parse_workers = config.getint('APK_INSTALLER', 'PARSE_WORKERS', fallback=self.apk_parse_workers)
+            self.apk_priorities = config.get('APK_INSTALLER', 'PRIORITY', fallback=self.apk_priorities)
+            self.apk_device_wait_s = config.getint('APK_INSTALLER', 'DEVICE_WAIT_S', fallback=self.apk_device_wait_s)
+            self.apk_hash_content = config.getboolean('APK_INSTALLER', 'HASH_APKS', fallback=self.apk_hash_content)
+            self.apk_batch_size = config.getint('APK_INSTALLER', 'BATCH_SIZE', fallback=self.apk_batch_size)
+            self.apk_batch_window_ms = config.getint('APK_INSTALLER', 'BATCH_WINDOW_MS', fallback=self.apk_batch_window_ms)
+            self.apk_install_mode = config.get('APK_INSTALLER', 'INSTALL_MODE', fallback=self.apk_install_mode).strip().lower()
+            self.apk_compare_hash = config.getboolean('APK_INSTALLER', 'COMPARE_HASH', fallback=self.apk_compare_hash)
+            self.max_parallel_connects = config.getint('DEVICE', 'MAX_PARALLEL_CONNECT', fallback=self.max_parallel_connects)
+            self.rollout_hub_mb_s = config.getint('ROLLOUT', 'HUB_BUDGET_MB_S', fallback=self.rollout_hub_mb_s)
+            self.rollout_device_mb_s = config.getint('ROLLOUT', 'DEVICE_MB_S', fallback=self.rollout_device_mb_s)
+            self.rollout_retries = config.getint('ROLLOUT', 'RETRIES', fallback=self.rollout_retries)
             return True
         except: return False
 
     # ... (Other Methods: Log, ADB, etc. - Standard) ...
-    def set_api_status(self, status):
-        self.api_status = status
-        if status == "Online": self.api_status_dot.config(bg=self.COLOR_SUCCESS); self.api_status_label.config(text="API Status: Online", fg=self.COLOR_SUCCESS)
-        else: self.api_status_dot.config(bg=self.COLOR_DANGER); self.api_status_label.config(text="API Status: Offline", fg=self.COLOR_DANGER)
+    def set_api_status(self, status, detail=""):
+        self.api_status, self.api_status_detail = status, detail
+        color = {"Online": self.COLOR_SUCCESS, "Degraded": self.COLOR_WARNING}.get(status, self.COLOR_DANGER)
+        self.api_status_dot.config(bg=color); self.api_status_label.config(text=f"API Status: {status}" + (f" ({detail})" if detail else ""), fg=color)
         self.update_tray_status()
+    def _on_search_typed(self, delay=200):
+        # Every keystroke restarts the live highlight; the highlighter cancels the previous query.
+        term = self.search_entry.winfo_children()[0].get()
+        regex, filter_ = self.search_regex_var.get(), self.search_filter_var.get()
+        hl = self.api_log_highlighter
+        if (term, regex, filter_) == (hl.query, hl.regex, hl.filter): return
+        self.last_search_term, self.last_search_pos = term, "1.0"
+        hl.set_query(term, regex, filter_, delay)
     def search_api_logs(self):
+        # Steps through the live highlight ranges; falls back to Tk's search (and older history) until they arrive.
         import tkinter as tk
         search_term = self.search_entry.winfo_children()[0].get()
-        self.api_log_text.config(state='normal')
-        if search_term != self.last_search_term:
-            self.last_search_term = search_term
-            self.api_log_text.tag_remove('search', '1.0', tk.END); self.api_log_text.tag_remove('current_search', '1.0', tk.END)
-        if search_term:
-            start_pos = self.api_log_text.search(search_term, self.last_search_pos, stopindex=tk.END, nocase=True)
-            if not start_pos:
-                self.last_search_pos = "1.0"
-                self.api_log_text.tag_remove('current_search', '1.0', tk.END)
-                start_pos = self.api_log_text.search(search_term, self.last_search_pos, stopindex=tk.END, nocase=True)
-            if start_pos:
-                end_pos = f"{start_pos}+{len(search_term)}c"
-                self.api_log_text.tag_add('search', start_pos, end_pos)
-                self.api_log_text.tag_remove('current_search', '1.0', tk.END)
-                self.api_log_text.tag_add('current_search', start_pos, end_pos)
-                self.api_log_text.see(start_pos)
-                self.last_search_pos = end_pos
-        self.api_log_text.config(state='disabled')
+        self._on_search_typed(0)
+        if not search_term: return
+        text, regex = self.api_log_text, self.search_regex_var.get()
+        hl = self.api_log_highlighter
+        rng = text.tag_nextrange('search', self.last_search_pos)
+        if not rng and not hl.busy:
+            # Past the last match: page in the previous on-disk match (plain text only) and wrap to the top.
+            if not regex and self.api_log_view.find_older(search_term): hl.set_query(search_term, regex, self.search_filter_var.get(), 0)
+            self.last_search_pos = "1.0"
+            rng = text.tag_nextrange('search', '1.0')
+        if not rng:
+            count = tk.IntVar()
+            start_pos = text.search(search_term, self.last_search_pos, stopindex=tk.END, nocase=True, regexp=regex, count=count)
+            if not start_pos: return
+            rng = (start_pos, f"{start_pos}+{count.get()}c")
+        text.tag_remove('current_search', '1.0', tk.END)
+        text.tag_add('current_search', *rng)
+        text.see(rng[0])
+        self.last_search_pos = text.index(rng[1])
+    def open_log_history_search(self):
+        import tkinter as tk
+        from tkinter import ttk, scrolledtext
+        if not self.api_log_index: return
+        if self.history_window and self.history_window.winfo_exists(): self.history_window.deiconify(); self.history_window.lift(); return
+        win = tk.Toplevel(self.master); win.title("API Log History"); win.geometry("760x480"); win.configure(bg=self.COLOR_BG)
+        self.history_window = win
+        top = tk.Frame(win, bg=self.COLOR_BG); top.pack(fill='x', padx=10, pady=(10, 5))
+        ef = self.create_neumorphic_entry(top); ef.pack(side='left')
+        entry = ef.winfo_children()[0]; entry.insert(0, self.search_entry.winfo_children()[0].get())
+        status = tk.Label(top, text="", font=('Segoe UI', 9), bg=self.COLOR_BG, fg=self.COLOR_TEXT)
+        tree = ttk.Treeview(win, columns=('date', 'line', 'text'), show='headings', height=9)
+        tree.heading('date', text='DATE', anchor='w'); tree.column('date', width=90, stretch=False)
+        tree.heading('line', text='LINE', anchor='e'); tree.column('line', width=60, anchor='e', stretch=False)
+        tree.heading('text', text='TEXT', anchor='w'); tree.column('text', width=580)
+        tree.pack(fill='both', expand=True, padx=10)
+        ctx = scrolledtext.ScrolledText(win, height=10, wrap=tk.NONE, state='disabled', bg=self.COLOR_BG, fg=self.COLOR_TEXT, font=('Consolas', 8), relief='flat')
+        ctx.pack(fill='both', expand=True, padx=10, pady=10)
+        ctx.tag_config('current_search', background=self.COLOR_WARNING, foreground='black')
+        hits = {}
+        def run(event=None):
+            term = entry.get()
+            tree.delete(*tree.get_children()); hits.clear()
+            if not term: return
+            t0 = time.perf_counter()
+            m = re.fullmatch(r'\s*(\d{4}-\d{2}-\d{2})?\s*(\d{1,2}:\d{2}(?::\d{2})?)\s*', term)
+            if m:
+                # "[YYYY-MM-DD] HH:MM[:SS]" jumps to that time instead of searching for the text.
+                date = m.group(1) or self.current_log_date
+                line_no = self.api_log_index.find_time(date, m.group(2))
+                results = [(date, n, text) for n, text in self.api_log_index.read_lines(date, line_no, line_no)] if line_no else []
+            else: results = self.api_log_index.search(term)
+            for date, line_no, text in results: hits[tree.insert('', 'end', values=(date, line_no, text[:300]))] = (date, line_no)
+            note = "" if self.api_log_index.ready else " (index still building)"
+            status.config(text=f"{len(results)} hits in {(time.perf_counter() - t0) * 1000:.0f} ms{note}")
+        def show(event=None):
+            sel = tree.focus()
+            if sel not in hits: return
+            date, line_no = hits[sel]
+            ctx.config(state='normal'); ctx.delete('1.0', 'end')
+            for n, text in self.api_log_index.read_lines(date, line_no - 20, line_no + 20):
+                ctx.insert('end', f"{n:>7}  {text}\n", ('current_search',) if n == line_no else ())
+            ctx.see('current_search.first'); ctx.config(state='disabled')
+            self._jump_to_log_line(date, line_no)
+        ttk.Button(top, text="Search", style='Raised.TButton', command=run).pack(side='left', padx=5)
+        status.pack(side='left', padx=5)
+        entry.bind('<Return>', run)
+        tree.bind('<<TreeviewSelect>>', show)
+        run()
+    def _jump_to_log_line(self, date, line_no):
+        # Only today's file backs the live widget; older days are shown in the history window.
+        view = self.api_log_view
+        if date != self.current_log_date or view.top_offset is None: return
+        try:
+            off = self.api_log_index.line_offset(date, line_no)
+            if off is None: return
+            if off < view.top_offset: view.page_older(count_lines(self.log_filepath, off, view.top_offset) + 5)
+            target = view.line_for_offset(off)
+            if target is None: return  # dropped from the view under load
+            self.api_log_text.tag_remove('current_search', '1.0', 'end')
+            self.api_log_text.tag_add('current_search', f'{target}.0', f'{target}.end')
+            self.api_log_text.see(f'{target}.0')
+        except Exception as e: print(f"Error jumping to log line: {e}")
     def start_api_exe(self):
-        self.api_log_queue = queue.Queue()
+        # Launch callable for ApiSupervisor (runs on its thread); returns the Popen or None.
         api_path = os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), "api.exe")
-        if not os.path.exists(api_path): self.log_to_api_tab("Error: api.exe not found."); self.set_api_status("Offline"); return
+        if not os.path.exists(api_path): self.master.after(0, self.log_to_api_tab, "Error: api.exe not found.\n"); return None
         try:
-            self.api_process = subprocess.Popen([api_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, creationflags=subprocess.CREATE_NO_WINDOW, encoding='utf-8', errors='replace')
-            threading.Thread(target=self.read_api_output, daemon=True).start()
-            self.master.after(100, self.process_api_log_queue)
-        except Exception as e: self.log_to_api_tab(f"Failed to start api: {e}"); self.set_api_status("Offline")
+            self.api_process = subprocess.Popen([api_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0, creationflags=subprocess.CREATE_NO_WINDOW)
+            threading.Thread(target=self.read_api_output, args=(self.api_process,), daemon=True).start()
+            if self._api_log_tick_id is None: self._api_log_tick_id = self.master.after(100, self.process_api_log_queue)
+            return self.api_process
+        except Exception as e: self.master.after(0, self.log_to_api_tab, f"Failed to start api: {e}\n"); return None
     def refresh_api_exe(self):
-        if self.api_process: self.api_process.terminate(); self.api_process = None
-        self.api_log_text.config(state='normal'); self.api_log_text.delete('1.0', 'end'); self.api_log_text.config(state='disabled')
-        self.set_api_status("Offline"); self.start_api_exe()
-    def read_api_output(self):
-        for line in iter(self.api_process.stdout.readline, ''): self.api_log_queue.put(line)
-        self.api_process.stdout.close(); self.master.after(0, self.set_api_status, "Offline")
+        self._clear_api_log_widget(keep_history=True)
+        self.set_api_status("Offline", "restarting")
+        if self.api_supervisor: self.api_supervisor.restart()
+    def read_api_output(self, proc):
+        # Every line but the health probe's feeds the request stats; the throttle then bounds what reaches the view and the file.
+        # One queue put and one writer chunk per pipe read, however many lines it carried.
+        formatter = SqlLogFormatter() if self.api_log_format_sql else None
+        throttle = self.api_log_throttle = ApiLogThrottle(self.api_log_max_rate, collapse=self.api_log_collapse_repeats)
+        for lines in read_line_batches(proc.stdout):
+            kept = []  # health-probe requests go no further: not in the log, the store or the percentiles
+            for line in lines:
+                record = self.api_log_parser.parse(line)
+                if record is FiberLogParser.IGNORED: continue
+                kept.append(line)
+                if not record: continue
+                self.api_latency.record(f"{record[1]} {record[2]}", record[4], record[0])
+                if self.api_request_store: self.api_request_store.add(record)
+            with self._api_dispatch_lock: self._dispatch_api_lines(throttle.process(kept), formatter)
+        with self._api_dispatch_lock: self._dispatch_api_lines(throttle.flush(), formatter)
+        proc.stdout.close(); self.master.after(0, self.set_api_status, "Offline")
+    def _dispatch_api_lines(self, lines, formatter=None):
+        if not lines: return
+        if formatter: lines = list(formatter.format_lines(lines))
+        written = self.api_log_writer.write(''.join(lines)) if self.api_log_writer else None
+        self.api_log_queue.put_many(lines, written[1] if written and written[0] == self.current_log_date else None)
     def process_api_log_queue(self):
-        import tkinter as tk
+        # One coalesced insert per tick, sized from the measured per-line cost to fit the frame budget.
+        self._api_log_tick_id = None
         try:
-            while True:
-                line = self.api_log_queue.get_nowait()
-                self.log_to_api_tab(line)
-        except queue.Empty: pass
+            throttle = self.api_log_throttle
+            if throttle:
+                # The reader only runs when api.exe writes; markers held back by a quiet pipe go out from here.
+                with self._api_dispatch_lock: self._dispatch_api_lines(throttle.tick())
+            budget = self.api_log_frame_budget_ms / 1000.0
+            lines, segments = self.api_log_queue.drain_segments(max(50, int(budget / self._api_log_line_cost)))
+            if lines:
+                t0 = time.perf_counter()
+                chunk = ''.join(lines)
+                self.api_log_view.append(chunk, segments)
+                self.api_log_highlighter.on_append()
+                self._api_log_line_cost = max(1e-6, 0.8 * self._api_log_line_cost + 0.2 * (time.perf_counter() - t0) / len(lines))
+            # Adaptive tick: every frame while backlogged, otherwise sized so a tick carries ~200 lines
+            # at the current inbound rate (16..250 ms).
+            now = time.monotonic()
+            elapsed = max(now - self._api_log_tick_at, 0.001); self._api_log_tick_at = now
+            received = self.api_log_queue.received
+            self._api_log_rate = 0.7 * self._api_log_rate + 0.3 * (received - self._api_log_received) / elapsed
+            self._api_log_shown_rate = 0.7 * self._api_log_shown_rate + 0.3 * len(lines) / elapsed
+            self._api_log_received = received
+            if self.api_log_queue.deferred: self._api_log_tick_delay = 16
+            else: self._api_log_tick_delay = int(min(250, max(16, 200000 / max(self._api_log_rate, 1))))
+            self._update_api_queue_label()
+        except Exception as e: print(f"Error processing API log queue: {e}")
         finally:
-            if self.is_running: self.master.after(100, self.process_api_log_queue)
+            if self.is_running: self._api_log_tick_id = self.master.after(self._api_log_tick_delay, self.process_api_log_queue)
+    def _update_api_queue_label(self):
+        now = time.monotonic()
+        if now - self._api_queue_label_at < 1: return
+        self._api_queue_label_at = now
+        q = self.api_log_queue
+        text = f"Queue: {q.depth()}  |  Deferred: {q.deferred}  |  Dropped: {q.dropped}  |  In: {self._api_log_rate:.0f} lines/s  |  Shown: {self._api_log_shown_rate:.0f} lines/s"
+        t = self.api_log_throttle
+        if t and (t.collapsed or t.sampled_out): text += f"  |  Collapsed: {t.collapsed}  |  Sampled out: {t.sampled_out}"
+        self.api_queue_label.config(text=text)
+        self._update_api_latency_label()
+    def _format_latency(self, ms):
+        if ms is None: return "-"
+        return f"{ms:.0f}" if ms >= 10 else f"{ms:.1f}"
+    def _update_api_latency_label(self):
+        # api.exe's own handling time; if these stay low while a handheld is slow, look at the USB reverse tunnel.
+        rows = []
+        for w in LatencyHistograms.WINDOWS:
+            n, (p50, p95, p99) = self.api_latency.percentiles(window=w)
+            rows.append(f"{w:>3}  p50 {self._format_latency(p50):>5}  p95 {self._format_latency(p95):>5}  p99 {self._format_latency(p99):>5} ms  ({n} reqs)")
+        worst = self.api_latency.slowest('1m')
+        if worst: rows.append(f"slowest 1m p99: {worst[0]} {self._format_latency(worst[2])} ms")
+        if self.api_supervisor:
+            midnight = datetime.datetime.combine(datetime.date.today(), datetime.time()).timestamp()
+            n, down = self.api_supervisor.downtime(midnight)
+            if n: rows.append(f"incidents today: {n}, downtime {down:.0f} s")
+        self.api_latency_label.config(text="\n".join(rows))
+        if self.tray_icon: self.update_tray_status()
     def log_to_api_tab(self, message):
         import tkinter as tk
-        self.api_log_text.config(state='normal'); self.api_log_text.insert(tk.END, message); self.api_log_text.see(tk.END); self.api_log_text.config(state='disabled')
-        if "fiber" in message.lower() and self.api_status != "Online": self.set_api_status("Online")
+        self.api_log_view.append(message)
+        self.api_log_highlighter.on_append()
     def _setup_log_file(self):
         try:
             self.log_dir = os.path.join(self.base_path, "log"); os.makedirs(self.log_dir, exist_ok=True)
+            self.api_log_archive = ApiLogArchive(self.log_dir, self.api_log_archive_budget_mb << 20, self.api_log_retention_days)
+            self.api_log_index = ApiLogIndex(self.log_dir, archive=self.api_log_archive)
             threading.Thread(target=self._cleanup_old_logs, daemon=True).start()
-            self.current_log_date = time.strftime("%Y-%m-%d")
-            filename = f"api_log_{self.current_log_date}.txt"
-            self.log_filepath = os.path.join(self.log_dir, filename)
+            self.api_request_store = ApiRequestStore(os.path.join(self.log_dir, "api_requests.db"))
+            self.api_log_writer = ApiLogWriter(self.log_dir, on_rollover=lambda old, new: self.master.after(0, self._on_log_rollover), on_flush=self.api_log_index.notify)
+            self.current_log_date = self.api_log_writer.current_date
+            self.log_filepath = self.api_log_writer.filepath
+            self.api_log_view.top_offset = 0
             self._load_log_for_today()
         except: pass
+    def _on_log_rollover(self):
+        self.current_log_date = self.api_log_writer.current_date
+        self.log_filepath = self.api_log_writer.filepath
+        self._clear_api_log_widget()
+        threading.Thread(target=self._cleanup_old_logs, daemon=True).start()
     def _cleanup_old_logs(self):
-        if not self.log_dir: return
-        try:
-            cutoff = datetime.datetime.now() - datetime.timedelta(days=7)
-            for f in os.listdir(self.log_dir):
-                if f.startswith("api_log_") and f.endswith(".txt"):
-                    try:
-                        fd = datetime.datetime.strptime(f.replace("api_log_", "").replace(".txt", ""), "%Y-%m-%d")
-                        if fd < cutoff: os.remove(os.path.join(self.log_dir, f))
-                    except: pass
-        except: pass
+        # Closed days are compressed rather than deleted; retention is by ARCHIVE_BUDGET_MB (and RETENTION_DAYS if set).
+        if not self.log_dir or not self.api_log_archive: return
+        try:
+            self.api_log_archive.maintain(datetime.date.today().isoformat())
+            if self.api_log_index: self.api_log_index.notify()
+        except Exception as e: print(f"Error archiving old logs: {e}")
     def _load_log_for_today(self):
+        # Only the tail goes into the widget; ApiLogView pages older lines in from top_offset on scroll-up.
         if self.log_filepath and os.path.exists(self.log_filepath):
             try:
-                with open(self.log_filepath, 'r', encoding='utf-8') as f: c = f.read()
-                if c: self.api_log_text.config(state='normal'); self.api_log_text.insert('1.0', c); self.api_log_text.see('end'); self.api_log_text.config(state='disabled')
+                t0 = time.perf_counter()
+                count = min(self.STARTUP_TAIL_LINES, self.api_log_view.max_lines or self.STARTUP_TAIL_LINES)
+                start, c = tail_lines(self.log_filepath, count)
+                self.api_log_view.top_offset = start
+                if c: self.api_log_view.append(c, [(c.count('\n'), start)])
+                size, lines = os.path.getsize(self.log_filepath), c.count('\n')
+                print(f"Loaded API log tail: {lines} lines, {size - start} of {size} bytes in {(time.perf_counter() - t0) * 1000:.1f} ms")
             except: pass
-    def _auto_save_log(self):
-        if not self.log_filepath: return
-        try: c = self.api_log_text.get("1.0", "end-1c"); threading.Thread(target=self._save_log_to_file_worker, args=(c,), daemon=True).start()
-        except: pass
-    def _clear_api_log_widget(self):
-        try: self.api_log_text.config(state='normal'); self.api_log_text.delete('1.0', 'end'); self.api_log_text.config(state='disabled')
-        except: pass
-    def _save_log_to_file_worker(self, content):
-        try:
-            td = time.strftime("%Y-%m-%d")
-            if td != self.current_log_date:
-                if content.strip():
-                    fc = self._format_sql_log(content)
-                    with open(self.log_filepath, 'w', encoding='utf-8') as f: f.write(fc)
-                self.current_log_date = td; self.log_filepath = os.path.join(self.log_dir, f"api_log_{td}.txt")
-                self.master.after(0, self._clear_api_log_widget)
-            else:
-                if content.strip():
-                    fc = self._format_sql_log(content)
-                    with open(self.log_filepath, 'w', encoding='utf-8') as f: f.write(fc)
+    def _clear_api_log_widget(self, keep_history=False, flushed=False):
+        # keep_history leaves today's file reachable by scrolling up; otherwise the view starts a fresh file.
+        try:
+            top = 0
+            if keep_history and self.log_filepath and os.path.exists(self.log_filepath):
+                if self.api_log_writer and not flushed:
+                    # The file size only counts once pending lines are written; the writer thread hands back when they are.
+                    self.api_log_writer.flush(callback=lambda: self.master.after(0, self._clear_api_log_widget, True, True))
+                    return
+                top = os.path.getsize(self.log_filepath)
+            self.api_log_view.clear(top)
         except: pass
-    def _periodic_log_save(self):
-        if self.is_running: self._auto_save_log(); self.master.after(30000, self._periodic_log_save)
-    def _format_sql_log(self, raw): return raw
     def hide_window(self): self.master.withdraw()
     def show_window(self, icon=None, item=None): self.master.deiconify(); self.master.lift(); self.master.focus_force()
     def get_adb_path(self):
@@ -449,122 +3016,233 @@ class App:
         try: subprocess.run([self.ADB_PATH, "version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=subprocess.CREATE_NO_WINDOW); return True
         except: return False
     def start_adb_server(self):
+        # Only the server itself needs adb.exe; everything else goes through self.adb.
+        try: self.adb.version(); return
+        except: pass
         try: subprocess.run([self.ADB_PATH, "start-server"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=subprocess.CREATE_NO_WINDOW)
         except: pass
     def refresh_devices(self): threading.Thread(target=self._refresh_devices_worker, daemon=True).start()
     def _refresh_devices_worker(self):
         try:
-            res = subprocess.run([self.ADB_PATH, "devices"], capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW)
-            devs = []
-            for line in res.stdout.splitlines()[1:]:
-                if line.strip():
-                    p = line.split('\t')
-                    if len(p) >= 2 and p[1] == 'device': devs.append(p[0])
+            devs = [serial for serial, state in self.adb.devices() if state == 'device']
             self.master.after(0, self._update_device_ui, devs)
         except: pass
     def _update_device_ui(self, devs):
-        for i in self.device_tree.get_children(): self.device_tree.delete(i)
-        all_devs = set(devs)
-        if self.connected_device: all_devs.add(self.connected_device)
-        for d in sorted(list(all_devs)):
-            status = "Connected" if d == self.connected_device else "Available"
-            tag = "connected" if status == "Connected" else "disconnected"
-            self.device_tree.insert('', 'end', values=(d, status), tags=(tag,))
+        # Rows are keyed by serial so selection survives refreshes.
+        all_devs = set(devs) | set(self.connected_devices) | set(self.connecting_devices)
+        for i in self.device_tree.get_children():
+            if i not in all_devs: self.device_tree.delete(i)
+        for d in sorted(all_devs):
+            status = self._device_status(d)
+            tag = "connected" if d in self.connected_devices else "disconnected"
+            if self.device_tree.exists(d): self.device_tree.item(d, values=(d, status), tags=(tag,))
+            else: self.device_tree.insert('', 'end', iid=d, values=(d, status), tags=(tag,))
+        self.disconnect_button.config(state='normal' if self.connected_devices else 'disabled')
+    def _device_status(self, serial, stats=None):
+        if serial in self.connecting_devices: return "Connecting..."
+        if serial not in self.connected_devices: return "Available"
+        s = stats or self.apk_scheduler.stats()
+        pending = s['lanes'].get(serial, 0) + s['active'].get(serial, 0)
+        return f"Installing ({pending})" if pending else "Connected"
     def parse_device_list(self, out): return [] 
     def connect_device(self):
         sel = self.device_tree.focus()
         if not sel: messagebox.showwarning("Select", "Select a device"); return
-        dev = self.device_tree.item(sel)['values'][0]
-        if self.connected_device == dev: messagebox.showinfo("Info", "Connected"); return
-        if self.connected_device: messagebox.showwarning("Warn", "Disconnect first"); return
+        dev = sel  # rows are keyed by serial
+        if dev in self.connected_devices: messagebox.showinfo("Info", "Connected"); return
         threading.Thread(target=self._connect_worker, args=(dev,), daemon=True).start()
     def _connect_worker(self, dev):
-        if self.is_connecting: return
-        self.is_connecting = True
+        with self._devices_lock:
+            if dev in self.connecting_devices or dev in self.connected_devices: return
+            self.connecting_devices.add(dev)
+        self.master.after(0, self.refresh_devices)
         try:
-            res = subprocess.run([self.ADB_PATH, "-s", dev, "reverse", "tcp:8000", "tcp:8000"], creationflags=subprocess.CREATE_NO_WINDOW)
-            if res.returncode == 0:
-                self.connected_device = dev; self.is_disconnecting = False
+            # At most MAX_PARALLEL_CONNECT devices provision at once; the rest queue here.
+            with self._connect_slots:
+                try: self.adb.reverse(dev, "tcp:8000", "tcp:8000"); ok = True
+                except (AdbError, OSError) as e: print(f"adb reverse failed for {dev}: {e}"); ok = False
+                if ok:
+                    self.device_packages.invalidate(dev)
+                    try: self.device_packages.prime(dev)  # fetch the package list before the lane needs it
+                    except (AdbError, OSError): pass
+                    if self.apk_install_mode == "pipelined":
+                        try: self.adb.clean_staging(dev)
+                        except (AdbError, OSError): pass
+            if ok:
+                with self._devices_lock:
+                    first = not self.connected_devices
+                    self.connected_devices[dev] = time.monotonic()
+                self.apk_scheduler.add_device(dev)
+                seen = self._device_seen_at.pop(dev, None)
+                if seen is not None:
+                    secs = time.monotonic() - seen; self.device_connect_times.append(secs)
+                    print(f"Device {dev}: plug-in to connected in {secs * 1000:.0f} ms")
                 self.master.after(0, self.show_notification, f"Connected: {dev}", True)
-                self.master.after(0, self.refresh_devices); self.master.after(0, self.update_tray_status)
-                self.master.after(0, self._clear_apk_monitor); self.master.after(100, self._scan_existing_apk_files)
-                self.master.after(0, self.disconnect_button.config, {'state':'normal'})
-            else: self.master.after(0, lambda: messagebox.showerror("Error", "Failed"))
+                self.master.after(0, self.update_tray_status)
+                # The first device restarts the APK monitor; later ones get the current files queued for them alone.
+                if first: self.master.after(0, self._clear_apk_monitor); self.master.after(100, self._scan_existing_apk_files)
+                else: self.master.after(100, self._scan_existing_apk_files, [dev])
+            else:
+                self.master.after(0, lambda: messagebox.showerror("Error", f"Failed: {dev}"))
+                self.master.after(3000, self._retry_auto_connect)
         except: pass
         finally: 
-            self.is_connecting = False
+            with self._devices_lock: self.connecting_devices.discard(dev)
+            self.master.after(0, self.refresh_devices)
             self.master.after(0, self.connect_button.config, {'state':'normal'})
+    def _retry_auto_connect(self):
+        # track-devices only fires on changes, so a failed auto-connect is retried here while the device stays attached.
+        if not self.is_running: return
+        for serial, state in self.device_states.items():
+            if state == 'device' and serial not in self.connected_devices and serial not in self.connecting_devices:
+                threading.Thread(target=self._connect_worker, args=(serial,), daemon=True).start()
     def disconnect_device(self):
-        if not self.connected_device: return
-        threading.Thread(target=self._disconnect_worker, daemon=True).start()
-    def _disconnect_worker(self):
-        try:
-            subprocess.run([self.ADB_PATH, "-s", self.connected_device, "reverse", "--remove", "tcp:8000"], creationflags=subprocess.CREATE_NO_WINDOW)
-            dev = self.connected_device; self.connected_device = None
-            self.master.after(0, self.refresh_devices); self.master.after(0, self.update_tray_status)
-            self.master.after(0, self.show_notification, f"Disconnected: {dev}", False)
-            self.master.after(0, self._clear_apk_monitor)
-            self.master.after(0, self.disconnect_button.config, {'state':'disabled'})
-        except: pass
+        dev = self.device_tree.focus()
+        if dev not in self.connected_devices:
+            if len(self.connected_devices) != 1: messagebox.showwarning("Select", "Select a connected device"); return
+            dev = next(iter(self.connected_devices))
+        threading.Thread(target=self._disconnect_worker, args=(dev,), daemon=True).start()
+    def _disconnect_worker(self, dev):
+        try: self.adb.reverse_remove(dev, "tcp:8000")
+        except (AdbError, OSError): pass
+        self._drop_device(dev, f"Disconnected: {dev}")
+    def _drop_device(self, dev, message):
+        # Called from worker threads when a device is disconnected or lost.
+        with self._devices_lock:
+            if self.connected_devices.pop(dev, None) is None: return
+            last = not self.connected_devices
+        self.device_packages.invalidate(dev); self.apk_scheduler.remove_device(dev)
+        self.master.after(0, self.show_notification, message, False)
+        self.master.after(0, self.refresh_devices); self.master.after(0, self.update_tray_status)
+        if last: self.master.after(0, self._clear_apk_monitor)
     def _start_monitoring_services(self):
-        if self._load_configs():
+        if self.config_loaded:
             if self.zip_monitor_path and os.path.exists(self.zip_monitor_path):
                 self.zip_file_observer = Observer(); self.zip_file_observer.schedule(ZipFileHandler(self), self.zip_monitor_path, recursive=False); self.zip_file_observer.start()
             if self.apk_monitor_path and os.path.exists(self.apk_monitor_path):
                 self.apk_file_observer = Observer(); self.apk_file_observer.schedule(ApkFileHandler(self), self.apk_monitor_path, recursive=False); self.apk_file_observer.start()
-    def _scan_existing_apk_files(self):
+    def _scan_existing_apk_files(self, devices=None):
+        # devices: queue every file for just these serials (a device joining), even if already listed.
         if not self.apk_monitor_path or not os.path.exists(self.apk_monitor_path): return
         try:
             for f in os.listdir(self.apk_monitor_path):
                 if f.endswith(".apk"):
                     fp = os.path.join(self.apk_monitor_path, f)
-                    if fp not in self.apk_file_map and fp not in self.apk_processing_files: self._add_apk_to_monitor(fp)
+                    if devices or (fp not in self.apk_file_map and fp not in self.apk_processing_files): self._add_apk_to_monitor(fp, devices)
         except: pass
     def _clear_apk_monitor(self):
         try:
             for i in self.apk_tree.get_children(): self.apk_tree.delete(i)
         except: pass
-        self.apk_processed_count=0; self.apk_file_map.clear(); self.apk_processing_files.clear()
+        if self.apk_scheduler: self.apk_scheduler.cancel_all()
+        self.apk_processed_count=0; self.apk_file_map.clear(); self.apk_row_jobs.clear(); self.apk_processing_files.clear()
         try: self.apk_count_label.config(text="Total APKs Processed: 0")
         except: pass
-    def _add_apk_to_monitor(self, fp):
+    def _add_apk_to_monitor(self, fp, devices=None):
         import tkinter as tk
-        if fp in self.apk_file_map: return
+        if fp in self.apk_file_map and not devices: return
         self.apk_processing_files.add(fp)
-        iid = self.apk_tree.insert('', 'end', values=(os.path.basename(fp), 'Pending'), tags=('pending',))
+        iid = self.apk_file_map.get(fp)
+        if iid is None or not self.apk_tree.exists(iid):
+            iid = self.apk_tree.insert('', 'end', values=(os.path.basename(fp), 'Pending'), tags=('pending',))
         self.apk_file_map[fp] = iid
-        threading.Thread(target=self._run_apk_install, args=(fp, iid), daemon=True).start()
-    def _run_apk_install(self, fp, iid):
-        self.master.after(0, self._update_apk_status, iid, "Checking...")
+        jobs = self.apk_row_jobs.setdefault(iid, [])
+        if devices:
+            # Skip devices an unfinished job already covers (a full scan started just before they joined); None = not routed yet.
+            live = [j for j in jobs if not j.get('done') and j['gen'] == self.apk_scheduler.generation]
+            devices = [d for d in devices if not any(j['targets'] is None or d in j['targets'] for j in live)]
+            if not devices: return
+        jobs.append(self.apk_scheduler.submit(fp, iid, devices))
+    def _parse_apk(self, fp):
+        # Runs on the scheduler's parse pool.
         for _ in range(5):
             try: 
                 with open(fp, 'rb'): pass
                 break
             except: time.sleep(1)
-        else: self.master.after(0, self._update_apk_status, iid, "Error: File locked"); return
-        try: apk = APK(fp); pkg = apk.package; ver = int(apk.version_code)
-        except: self.master.after(0, self._update_apk_status, iid, "Error: Invalid APK"); return
-        wait = 0
-        while not self.connected_device and self.is_running and wait < 10:
-            self.master.after(0, self._update_apk_status, iid, "Waiting for device..."); time.sleep(1); wait+=1
-        if not self.connected_device: self.master.after(0, self._update_apk_status, iid, "Error: No device"); return
-        dev_ver = 0
-        try:
-            res = subprocess.run([self.ADB_PATH, "-s", self.connected_device, "shell", "dumpsys", "package", pkg], capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW)
-            for l in res.stdout.splitlines():
-                if "versionCode=" in l: dev_ver = int(l.strip().split("versionCode=")[1].split(" ")[0]); break
-        except: pass
-        msg = ""
-        if dev_ver == 0: msg = "Installing..."
-        elif ver > dev_ver: msg = "Upgrading..."
-        else: self.master.after(0, self._update_apk_status, iid, f"Skipped (v{dev_ver} installed)"); return
-        self.master.after(0, self._update_apk_status, iid, msg)
-        try:
-            res = subprocess.run([self.ADB_PATH, "-s", self.connected_device, "install", "-r", fp], capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW)
-            if "Success" in res.stdout: self.master.after(0, self._update_apk_status, iid, "Success")
-            else: self.master.after(0, self._update_apk_status, iid, "Error: Install Failed")
-        except Exception as e: self.master.after(0, self._update_apk_status, iid, f"Error: {e}")
-        finally: self.master.after(0, self._remove_from_apk_processing_list, fp)
+        else: raise OSError("File locked")
+        meta = None
+        if self.apk_index:
+            try: meta = self.apk_index.lookup(fp)
+            except Exception as e: print(f"APK index lookup failed: {e}")
+        if meta: return meta['package'], meta['version_code'], meta['split']
+        try: pkg, ver, name, split = read_apk_manifest(fp)
+        except (ValueError, KeyError, zipfile.BadZipFile) as e:
+            print(f"Manifest reader failed for {os.path.basename(fp)}: {e}; using pyaxmlparser")
+            try:
+                from pyaxmlparser import APK  # heavy import, only needed when the fast reader gives up
+                apk = APK(fp); pkg, ver, name = apk.package, int(apk.version_code), apk.version_name
+                split = apk.get_element('manifest', 'split') or None
+            except: raise ValueError("Invalid APK")
+        if self.apk_index:
+            try: signer = apk_signer_digest(fp)
+            except (ValueError, OSError, IndexError, struct.error, zipfile.BadZipFile): signer = None
+            try: self.apk_index.store(fp, {'package': pkg, 'version_code': ver, 'version_name': name, 'signer': signer, 'split': split})
+            except Exception as e: print(f"APK index update failed: {e}")
+        return pkg, ver, split
+    def _install_apks(self, dev, jobs):
+        # Runs on the device's install lane; a package's base APK and its splits go in one session. Returns a status per job.
+        msgs, groups, first, newest, bases, identical = {}, {}, {}, {}, {}, {}
+        for job in jobs:
+            # The same file queued twice for this device (rescan while joining) installs once.
+            if first.setdefault(job['path'], job) is job: newest[job['package']] = max(newest.get(job['package'], 0), job['version'])
+        for job in first.values():
+            if job['version'] == newest[job['package']] and not job.get('split'): bases.setdefault(job['package'], job)
+        for job in first.values():
+            # One full APK per package per session: older builds and duplicate copies in the batch are skipped.
+            top = newest[job['package']]
+            if job['version'] < top: msgs[id(job)] = f"Skipped (v{top} in same drop)"; continue
+            if not job.get('split') and bases[job['package']] is not job:
+                msgs[id(job)] = f"Skipped (same as {os.path.basename(bases[job['package']]['path'])})"; continue
+            dev_ver = 0
+            try: dev_ver = self.device_packages.version(dev, job['package'])
+            except: pass
+            if dev_ver == 0: msg = "Installing..."
+            elif job['version'] > dev_ver: msg = "Upgrading..."
+            elif job['version'] == dev_ver and self.apk_compare_hash:
+                # Same versionCode: the base and its splits are skipped together if the base is byte-identical to the installed base.apk.
+                if job['package'] not in identical: identical[job['package']] = self._same_base_apk(dev, bases.get(job['package']))
+                if identical[job['package']]: msgs[id(job)] = f"Skipped (identical v{dev_ver})"; continue
+                msg = "Reinstalling..."
+            else: msgs[id(job)] = f"Skipped (v{dev_ver} installed)"; continue
+            if self.apk_compare_hash and not job.get('split') and 'sha256' not in job and self.apk_index:
+                # Known after install, so dropping the same file again is skipped without hashing on the device.
+                try: job['sha256'] = self.apk_index.content_hash(job['path'])
+                except (OSError, sqlite3.Error): pass
+            if len(self.connected_devices) > 1: msg = f"{msg} [{dev}]"
+            self.master.after(0, self._update_apk_status, job['iid'], msg)
+            groups.setdefault(job['package'], []).append(job)
+        if groups:
+            # session: one multi-package transaction; pipelined: per package, pushing the next one while this one commits.
+            install = self.adb.install_pipelined if self.apk_install_mode == "pipelined" else self.adb.install_session
+            results, sessions = install(dev, [[job['path'] for job in group] for group in groups.values()])
+            for (pkg, group), (ok, out) in zip(groups.items(), results):
+                base = next((job for job in group if not job.get('split')), None)
+                if ok: self.device_packages.installed(dev, pkg, group[0]['version'], base.get('sha256') if base else None)
+                else: self.device_packages.invalidate(dev)
+                m = re.search(r'Failure \[(.*)\]', out)
+                for job in group: msgs[id(job)] = "Success" if ok else f"Error: {m.group(1) if m else 'Install Failed'}"
+            for t in sessions:
+                self.apk_install_sessions.append(t)
+                print(f"Install session on {dev}: {t['packages']} package(s), {t['files']} file(s), {t['bytes'] / 1048576:.1f} MB, "
+                      f"create {t['create_s']:.2f}s, push {t['push_s']:.2f}s ({t['bytes'] / 1048576 / max(t['push_s'], 1e-6):.1f} MB/s), "
+                      f"verify+commit {t['commit_s']:.2f}s")
+        return [msgs[id(first[job['path']])] for job in jobs]
+    def _same_base_apk(self, dev, job):
+        # True if the base APK `job` is byte-identical to the installed base.apk; splits dropped without their base never match.
+        if job is None: return False
+        try:
+            job['sha256'] = self.apk_index.content_hash(job['path']) if self.apk_index else ApkMetadataIndex.file_sha256(job['path'])
+            return job['sha256'] == self.device_packages.base_hash(dev, job['package'])
+        except (AdbError, OSError, sqlite3.Error) as e: print(f"Hash compare failed for {job['package']}: {e}"); return False
+    def _update_apk_job_status(self, job, msg):
+        # Once a row has several jobs with devices, it shows their merged per-device summary instead of the last writer's.
+        jobs = self.apk_row_jobs.get(job['iid'], ())
+        if len(jobs) > 1 and (job['results'] or job['pending']): msg = self.apk_scheduler.summary_of(jobs)
+        self._update_apk_status(job['iid'], msg)
+    def _apk_job_done(self, job):
+        job['done'] = True
+        self._remove_from_apk_processing_list(job['path'])
     def _update_apk_status(self, iid, msg):
         try:
             if not self.apk_tree.exists(iid): return
@@ -572,9 +3250,105 @@ class App:
             tag = 'error'
             if 'Success' in msg: tag='done'
             elif 'Skipped' in msg: tag='skipped'
-            elif 'Installing' in msg or 'Upgrading' in msg or 'Waiting' in msg: tag='processing'
+            elif 'Installing' in msg or 'Upgrading' in msg or 'Reinstalling' in msg or 'Waiting' in msg: tag='processing'
+            elif 'Queued' in msg or 'Checking' in msg: tag='pending'
             self.apk_tree.item(iid, values=(fn, msg), tags=(tag,))
         except: pass
+        self._update_apk_queue_label()
+    def _update_apk_queue_label(self):
+        s = self.apk_scheduler.stats()
+        queued = s['parse_queue'] + s['holding'] + sum(s['lanes'].values())
+        text = f"Queue: {queued} | wait p50 {s['install_wait_p50']:.1f}s" if s['in_flight'] else ""
+        try:
+            self.apk_queue_label.config(text=text)
+            for serial in list(self.connected_devices):
+                if self.device_tree.exists(serial): self.device_tree.set(serial, 'status', self._device_status(serial, s))
+        except: pass
+    def start_fleet_rollout(self):
+        # Installs everything in MONITOR_PATH onto every attached handheld within the [ROLLOUT] USB budget.
+        if self.rollout_busy:
+            if self.rollout and self.rollout.running: self._open_rollout_window()
+            return
+        devices = [serial for serial, state in self.device_states.items() if state == 'device']
+        if not devices: messagebox.showwarning("Rollout", "No handhelds attached."); return
+        if not self.apk_monitor_path or not os.path.exists(self.apk_monitor_path): messagebox.showwarning("Rollout", "APK folder not found."); return
+        self.rollout_busy = True
+        threading.Thread(target=self._run_fleet_rollout, args=(devices,), daemon=True).start()
+    def _run_fleet_rollout(self, devices):
+        try:
+            found = {}  # package -> [versionCode, base path, [split paths]]; the newest version in the folder wins
+            for f in sorted(os.listdir(self.apk_monitor_path)):
+                if not f.endswith(".apk"): continue
+                fp = os.path.join(self.apk_monitor_path, f)
+                try: pkg, ver, split = self._parse_apk(fp)
+                except Exception as e: print(f"Rollout skips {f}: {e}"); continue
+                entry = found.get(pkg)
+                if entry is None or ver > entry[0]: entry = found[pkg] = [ver, None, []]
+                if ver < entry[0]: continue
+                if split: entry[2].append(fp)
+                elif entry[1] is None: entry[1] = fp
+                else: print(f"Rollout skips {f}: same build as {os.path.basename(entry[1])}")
+            if not found: self.master.after(0, lambda: messagebox.showwarning("Rollout", "No valid APKs to roll out.")); return
+            try: hubs = {serial: FleetRollout.hub_of(info) for serial, _, info in self.adb.devices_long()}
+            except (AdbError, OSError): hubs = {}
+            packages = [(pkg, ver, ([base] if base else []) + splits) for pkg, (ver, base, splits) in found.items()]
+            rollout = FleetRollout(self.adb, self.device_packages, packages, devices, hubs, self.rollout_hub_mb_s, self.rollout_device_mb_s, self.rollout_retries)
+            # The monitor's queued installs for these devices wait until the rollout is done, then skip what it installed.
+            self.apk_scheduler.pause(devices)
+            try:
+                self.rollout = rollout.start()
+                self.master.after(0, self._open_rollout_window)
+                rollout.wait()
+            finally: self.apk_scheduler.resume(devices)
+            s = rollout.stats()
+            print(f"Rollout: {len(packages)} package(s) on {s['done']} device(s) in {s['elapsed']:.1f}s ({s['devices_per_min']:.1f} devices/min), "
+                  f"{s['ok']} installed, {s['skipped']} up to date, {s['failed']} failed, {s['retried']} retries, {s['pushed_mb']:.1f} MB pushed, "
+                  f"{rollout.slots_per_hub} push(es) per hub on {len(set(hubs.get(d, 'usb') for d in devices))} hub(s)")
+        finally: self.rollout_busy = False
+    def _open_rollout_window(self):
+        import tkinter as tk
+        from tkinter import ttk
+        r = self.rollout
+        if not r: return
+        if self.rollout_window and self.rollout_window.winfo_exists(): self.rollout_window.destroy()
+        win = tk.Toplevel(self.master); win.title("APK Rollout"); win.geometry("760x360"); win.configure(bg=self.COLOR_BG)
+        self.rollout_window = win
+        top = tk.Frame(win, bg=self.COLOR_BG); top.pack(fill='x', padx=10, pady=(10, 5))
+        summary = tk.Label(top, text="", font=('Segoe UI', 9, 'bold'), bg=self.COLOR_BG, fg=self.COLOR_TEXT); summary.pack(side='left')
+        ttk.Button(top, text="Cancel", style='Raised.TButton', command=r.cancel).pack(side='right')
+        cols = ['device', 'status'] + [f"p{i}" for i in range(len(r.packages))]
+        tree = ttk.Treeview(win, columns=cols, show='headings')
+        tree.heading('device', text='DEVICE', anchor='w'); tree.column('device', width=130, stretch=False)
+        tree.heading('status', text='STATUS', anchor='w'); tree.column('status', width=80, stretch=False)
+        for i, (pkg, ver, paths) in enumerate(r.packages):
+            tree.heading(f"p{i}", text=os.path.basename(paths[0])[:-4][:14], anchor='w'); tree.column(f"p{i}", width=95, stretch=False)
+        xs = ttk.Scrollbar(win, orient='horizontal', command=tree.xview); tree.configure(xscrollcommand=xs.set)
+        tree.pack(fill='both', expand=True, padx=10); xs.pack(fill='x', padx=10)
+        detail = tk.Label(win, text="", font=('Segoe UI', 8), bg=self.COLOR_BG, fg=self.COLOR_DANGER, anchor='w', justify='left')
+        detail.pack(fill='x', padx=10, pady=(5, 10))
+        tree.tag_configure('processing', foreground=self.COLOR_WARNING)
+        tree.tag_configure('done', foreground=self.COLOR_SUCCESS, font=('Segoe UI', 9, 'bold'))
+        tree.tag_configure('error', foreground=self.COLOR_DANGER, font=('Segoe UI', 9, 'bold'))
+        for serial in r.devices: tree.insert('', 'end', iid=serial, values=[serial, ''] + [''] * len(r.packages))
+        def show(event=None):
+            serial = tree.focus()
+            errors = [f"{r.packages[i][0]}: {r.errors[(serial, i)]}" for i in range(len(r.packages)) if (serial, i) in r.errors]
+            detail.config(text='\n'.join(errors[:3]))
+        def refresh():
+            if not win.winfo_exists(): return
+            running = r.running  # read first, so the last pass shows the final cells
+            for serial in r.devices:
+                cells = [r.cells[(serial, i)] for i in range(len(r.packages))]
+                failed = cells.count('failed')
+                if serial in r.finished: status, tag = (f"{failed} failed", 'error') if failed else ("Done", 'done')
+                else: status, tag = f"{sum(c in r.DONE for c in cells)}/{len(cells)}", 'processing'
+                tree.item(serial, values=[serial, status] + cells, tags=(tag,))
+            s = r.stats()
+            summary.config(text=f"{s['done']}/{s['devices']} devices | {s['devices_per_min']:.1f} devices/min | {s['pushed_mb']:.0f} MB | {s['retried']} retries")
+            show()
+            if running: win.after(500, refresh)
+        tree.bind('<<TreeviewSelect>>', show)
+        refresh()
     def _remove_from_apk_processing_list(self, fp): 
         if fp in self.apk_processing_files: self.apk_processing_files.remove(fp)
 
@@ -670,55 +3444,69 @@ class App:
     def update_tray_status(self):
         if not self.tray_icon: return
         t = f"HHT Connect v{self.APP_VERSION}\n"
-        if self.connected_device: t += f"Device: {self.connected_device}\n"
+        devs = sorted(self.connected_devices)
+        if len(devs) == 1: t += f"Device: {devs[0]}\n"
+        elif devs: t += f"Devices: {len(devs)} connected\n"
         else: t += "Device: Disconnected\n"
         t += f"API: {self.api_status}"
-        self.tray_icon.title = t
+        if self.api_status_detail: t += f" ({self.api_status_detail})"
+        n, (p50, p99) = self.api_latency.percentiles(window='1m', qs=(0.5, 0.99))
+        if n: t += f"\n1m p50/p99: {self._format_latency(p50)}/{self._format_latency(p99)} ms"
+        self.tray_icon.title = t[:127]
 
     def device_monitor_loop(self):
+        # One long-lived host:track-devices subscription; the adb server pushes every attach/detach/state change.
+        backoff = 1
         while self.is_running:
             try:
-                res = subprocess.run([self.ADB_PATH, "devices"], capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW)
-                curr_devs = []
-                for line in res.stdout.splitlines()[1:]:
-                    if line.strip():
-                        p = line.split('\t')
-                        if len(p) >= 2 and p[1] == 'device': curr_devs.append(p[0])
-                
-                # Case 1: Handle Disconnect
-                if self.connected_device:
-                    if self.connected_device not in curr_devs:
-                        if not self.is_disconnecting:
-                            self.is_disconnecting = True
-                            self.master.after(0, self.show_notification, f"Lost connection: {self.connected_device}", False)
-                            self.connected_device = None
-                            self.master.after(0, self.disconnect_button.config, {'state':'disabled'})
-                            self.master.after(0, self.refresh_devices)
-                            self.master.after(0, self.update_tray_status)
-                            self.master.after(0, self._clear_apk_monitor)
-                            
-                # Case 2: Auto Connect
-                elif curr_devs:
-                    target = curr_devs[0]
-                    # Call connection worker (it handles is_connecting check internally)
-                    threading.Thread(target=self._connect_worker, args=(target,), daemon=True).start()
-                    time.sleep(2) # Prevent rapid loops
+                for devs in self.adb.track_devices():
+                    if not self.is_running: return
+                    backoff = 1
+                    self._on_devices_changed(devs)
+            except Exception as e:
+                if not self.is_running: return
+                print(f"adb track-devices lost ({e}), resubscribing in {backoff} s")
+            time.sleep(backoff); backoff = min(backoff * 2, 10)
+            self.start_adb_server()
 
-            except Exception: pass
-            time.sleep(3)
+    def _on_devices_changed(self, devs):
+        states, now = dict(devs), time.monotonic()
+        for serial in states:
+            if serial not in self.device_states: self._device_seen_at[serial] = now
+            if states[serial] == 'unauthorized' and self.device_states.get(serial) != 'unauthorized':
+                self.master.after(0, self.show_notification, f"Allow USB debugging on {serial}", False)
+        for serial in set(self._device_seen_at) - set(states): del self._device_seen_at[serial]
+        self.device_states = states
+        curr_devs = [serial for serial, state in devs if state == 'device']
+        self.master.after(0, self._update_device_ui, curr_devs)
+
+        with self._devices_lock: connected = list(self.connected_devices)  # connect workers add and drop entries meanwhile
+
+        # Case 1: Handle Disconnect (detached, or dropped to offline/unauthorized)
+        for serial in [d for d in connected if d not in curr_devs]:
+            self._drop_device(serial, f"Lost connection: {serial}")
+
+        # Case 2: Auto Connect every ready device (the worker skips ones already connected or connecting)
+        for serial in curr_devs:
+            if serial not in connected and serial not in self.connecting_devices:
+                threading.Thread(target=self._connect_worker, args=(serial,), daemon=True).start()
 
     # --- Exit ---
     def on_app_quit(self):
         self.is_running = False
-        try:
-            c = self.api_log_text.get("1.0", "end-1c")
-            threading.Thread(target=self._save_log_to_file_worker, args=(c,), daemon=True).start()
-        except: pass
         if self.tray_icon: self.tray_icon.stop()
+        if self.api_supervisor: self.api_supervisor.stop()
+        if self.api_prober: self.api_prober.stop()
+        if self.apk_scheduler: self.apk_scheduler.stop()
+        if self.rollout: self.rollout.cancel()
         if self.api_process: self.api_process.terminate()
-        if self.connected_device:
-            subprocess.run([self.ADB_PATH, "-s", self.connected_device, "reverse", "--remove", "tcp:8000"], creationflags=subprocess.CREATE_NO_WINDOW)
-        try: subprocess.run([self.ADB_PATH, "kill-server"], creationflags=subprocess.CREATE_NO_WINDOW)
+        if self.api_log_writer: self.api_log_writer.close()
+        if self.api_log_index: self.api_log_index.stop()
+        if self.api_request_store: self.api_request_store.close()
+        for dev in list(self.connected_devices):
+            try: self.adb.reverse_remove(dev, "tcp:8000")
+            except: pass
+        try: self.adb.kill_server()
         except: pass
         if os.path.exists(self.lock_file_path):
             try: os.remove(self.lock_file_path)
@@ -15,6 +15,7 @@ from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from tkinter import filedialog, messagebox
 from pyaxmlparser import APK
+from sql_log_formatter import SqlLogFormatter
 
 # --- Image Generation for UI ---
 def create_android_icon(color):
@@ -99,6 +100,7 @@ class App:
         self.log_filepath = None
         self.log_dir = None # Store log directory
         self.current_log_date = None # Track current log date
+        self._sql_log_cache = ("", "", None) # (raw text already formatted, its formatted form, formatter)
         self.zip_monitor_path = None
         self.apk_monitor_path = None
         self.zip_file_observer = None
@@ -504,21 +506,17 @@ class App:
             self.master.after(30000, self._periodic_log_save)
 
     def _format_sql_log(self, raw_content):
-        formatted_lines = []
-        sql_keywords = [
-            ' FROM ', ' WHERE ', ' INSERT INTO ', ' UPDATE ', ' SET ', ' VALUES ',
-            ' LEFT JOIN ', ' INNER JOIN ', ' GROUP BY ', ' ORDER BY ', ' DELETE FROM '
-        ]
-        for line in raw_content.splitlines():
-            if 'SELECT ' in line or 'INSERT INTO ' in line or 'UPDATE ' in line or 'DELETE FROM ' in line:
-                formatted_lines.append("--- SQL Query ---")
-                for keyword in sql_keywords:
-                    line = line.replace(keyword, f'\n  {keyword.strip()} ')
-                formatted_lines.append(line)
-                formatted_lines.append("-" * 17 + "\n")
-            else:
-                formatted_lines.append(line)
-        return "\n".join(formatted_lines)
+        # Only complete lines appended since the last save are formatted; the formatted text of
+        # everything before them is reused. The formatter is idempotent, so content reloaded by
+        # _load_log_for_today passes through unchanged.
+        done, formatted, formatter = self._sql_log_cache
+        if not done or not raw_content.startswith(done): done, formatted, formatter = "", "", SqlLogFormatter()
+        cut = raw_content.rfind('\n') + 1
+        if cut > len(done):
+            formatted += "".join(formatter.format_lines(raw_content[len(done):cut].splitlines(True)))
+            done = raw_content[:cut]
+        self._sql_log_cache = (done, formatted, formatter)
+        return formatted + raw_content[len(done):]
 
     # --- UI Helper Methods ---
     def create_neumorphic_button(self, parent, text, command, is_accent=False):